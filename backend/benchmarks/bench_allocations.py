@@ -0,0 +1,149 @@
+"""
+Allocation benchmark of the agent read and agent listing paths, measured with tracemalloc.
+
+Compares the previous paths (plain __dict__ entities, validated GetAgentByIdResponse plus model_dump for
+the cache; listing through AgentResumeEntity, GetAllAgentsResponse and a rendered list) with the current
+ones (slotted entities, one dict for cache and response; rows mapped to items and streamed in chunks).
+Rows are plain dicts standing in for asyncpg Records, the same in both paths.
+Run from the backend folder: python benchmarks/bench_allocations.py
+"""
+
+import asyncio
+import gc
+import json
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from controllers.responses import _json_array_chunks, _dumps
+from models.entity.agent_entity import AgentEntity
+from models.entity.tools_entity import ToolsEntity
+from models.ui.agents.manage_agents import FallbackModelConfig, GetAgentByIdResponse, GetAllAgentsResponse
+from services.manager_agents import ManagerAgentsService
+
+REQUESTS = int(os.getenv("BENCH_REQUESTS", 200))
+LIST_ROWS = int(os.getenv("BENCH_LIST_ROWS", 5000))
+
+AGENT_ROWS = [
+    {
+        "id": 42, "name": "support-agent", "description": "Answers support questions about the product catalog. " * 8,
+        "model": 2, "reasoning": False, "type_model": "claude-sonnet-4-5", "output_parser": None,
+        "instructions": "Always answer in the language of the question and cite the source. " * 20,
+        "has_storage": True, "knowledge_collection_name": "catalog", "knowledge_description": "Product catalog",
+        "knowledge_top_k": 5, "context_token_ceiling": 8000, "timeout_seconds": 60.0,
+        "fallback_models": '[{"model": 1, "type_model": "gemini-2.5-flash"}]',
+        "tool_id": tool_id, "tool_name": f"tool_{tool_id}", "tool_description": "Looks up data in the catalog " * 3,
+        "function_caller": "tools.catalog:lookup", "created_at": None, "updated_at": None,
+    }
+    for tool_id in range(6)
+]
+LIST_ROWS_DATA = [{"id": agent_id, "name": f"agent-{agent_id}"} for agent_id in range(LIST_ROWS)]
+
+
+class LegacyToolsEntity:
+    def __init__(self, id, name, description, function_caller, timeout_seconds=30, result_ttl_seconds=0, has_side_effects=True):
+        self.id = id
+        self.name = name
+        self.description = description
+        self.function_caller = function_caller
+        self.timeout_seconds = timeout_seconds
+        self.result_ttl_seconds = result_ttl_seconds
+        self.has_side_effects = has_side_effects
+
+
+class LegacyAgentEntity:
+    def __init__(self, **fields):
+        for name, value in fields.items():
+            setattr(self, name, value)
+
+
+class LegacyAgentResumeEntity:
+    def __init__(self, id, name):
+        self.id = id
+        self.name = name
+
+
+def _agent_fields(rows, tools):
+    first = rows[0]
+    return dict(
+        id=first["id"], name=first["name"], description=first["description"], model=first["model"], tools=tools,
+        reasoning=first["reasoning"], type_model=first["type_model"], output_parser=first["output_parser"],
+        instructions=first["instructions"], has_storage=first["has_storage"],
+        knowledge_collection_name=first["knowledge_collection_name"], knowledge_description=first["knowledge_description"],
+        knowledge_top_k=first["knowledge_top_k"], context_token_ceiling=first["context_token_ceiling"],
+        timeout_seconds=first["timeout_seconds"], fallback_models=json.loads(first["fallback_models"]),
+        created_at=first["created_at"], updated_at=first["updated_at"],
+    )
+
+
+def previous_agent_read(rows):
+    tools = [LegacyToolsEntity(row["tool_id"], row["tool_name"], row["tool_description"], row["function_caller"]) for row in rows]
+    entity = LegacyAgentEntity(**_agent_fields(rows, tools))
+    response = GetAgentByIdResponse(
+        id=entity.id, name=entity.name, description=entity.description, model=entity.model,
+        tools=[{"id": tool.id, "name": tool.name, "description": tool.description} for tool in entity.tools],
+        reasoning=entity.reasoning, type_model=entity.type_model, output_parser=entity.output_parser,
+        instructions=entity.instructions, has_storage=entity.has_storage,
+        knowledge_collection_name=entity.knowledge_collection_name, knowledge_description=entity.knowledge_description,
+        knowledge_top_k=entity.knowledge_top_k, context_token_ceiling=entity.context_token_ceiling,
+        timeout_seconds=entity.timeout_seconds, fallback_models=entity.fallback_models,
+    )
+    return response, response.model_dump()
+
+
+def current_agent_read(rows):
+    tools = [ToolsEntity(row["tool_id"], row["tool_name"], row["tool_description"], row["function_caller"]) for row in rows]
+    entity = AgentEntity(**_agent_fields(rows, tools))
+    data = ManagerAgentsService._agent_response_data(entity)
+    return ManagerAgentsService._trusted_agent_response(data), data
+
+
+def previous_listing(rows):
+    entities = [LegacyAgentResumeEntity(id=row["id"], name=row["name"]) for row in rows]
+    responses = list(map(lambda entity: GetAllAgentsResponse.model_construct(id=entity.id, name=entity.name), entities))
+    return _dumps([response.model_dump(mode="json") for response in responses])
+
+
+def current_listing(rows):
+    async def items():
+        for row in rows:
+            yield {"id": row["id"], "name": row["name"]}
+
+    async def drain():
+        return sum([len(chunk) async for chunk in _json_array_chunks(items(), 100)])
+    return asyncio.run(drain())
+
+
+def measure(function, argument, requests):
+    """Returns the allocated blocks and bytes still alive per request and the peak bytes of one request."""
+    function(argument)
+    gc.collect()
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    before_current, _ = tracemalloc.get_traced_memory()
+    function(argument)
+    _, peak = tracemalloc.get_traced_memory()
+    before = tracemalloc.take_snapshot()
+    kept = [function(argument) for _ in range(requests)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    stats = after.compare_to(before, "filename")
+    blocks = sum(stat.count_diff for stat in stats)
+    size = sum(stat.size_diff for stat in stats)
+    del kept
+    return blocks / requests, size / requests, peak - before_current
+
+
+def report(name, previous, current):
+    print(f"{name}")
+    print(f"  previous: {previous[0]:8.1f} live blocks, {previous[1]:10.0f} live bytes, {previous[2]:10d} peak bytes per request")
+    print(f"  current:  {current[0]:8.1f} live blocks, {current[1]:10.0f} live bytes, {current[2]:10d} peak bytes per request")
+
+
+if __name__ == "__main__":
+    # The ui model import fills the pydantic caches before measuring
+    FallbackModelConfig.model_construct(model=1, type_model="x")
+    report("GET /agents/{id} (cache miss)", measure(previous_agent_read, AGENT_ROWS, REQUESTS), measure(current_agent_read, AGENT_ROWS, REQUESTS))
+    report(f"GET /agents/ ({LIST_ROWS} rows)", measure(previous_listing, LIST_ROWS_DATA, 5), measure(current_listing, LIST_ROWS_DATA, 5))
@@ -0,0 +1,86 @@
+"""
+Microbenchmark of the per request CPU spent on GET /agents/{id} cache hits.
+
+Compares the previous path (stdlib json cache entry, full model validation, response_model
+validation and stdlib JSON rendering) with the current one (serializer cache entry, model_construct
+and direct rendering). Run from the backend folder: python benchmarks/bench_serialization.py
+"""
+
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from pydantic import TypeAdapter
+from config.database.serializer import JsonSerializer, get_default_serializer, msgpack, orjson
+from models.ui.agents.manage_agents import GetAgentByIdResponse, FallbackModelConfig
+
+ITERATIONS = int(os.getenv("BENCH_ITERATIONS", 20000))
+
+AGENT = {
+    "id": 42,
+    "name": "support-agent",
+    "description": "Answers support questions about the product catalog. " * 8,
+    "model": 2,
+    "tools": [{"id": i, "name": f"tool_{i}", "description": "Looks up data in the catalog " * 3} for i in range(6)],
+    "reasoning": False,
+    "type_model": "claude-sonnet-4-5",
+    "output_parser": None,
+    "instructions": "Always answer in the language of the question and cite the source. " * 20,
+    "has_storage": True,
+    "knowledge_collection_name": "catalog",
+    "knowledge_description": "Product catalog",
+    "knowledge_top_k": 5,
+    "context_token_ceiling": 8000,
+    "timeout_seconds": 60.0,
+    "fallback_models": [{"model": 1, "type_model": "gemini-2.5-flash"}, {"model": 6, "type_model": "llama-3.3-70b"}],
+}
+
+response_adapter = TypeAdapter(GetAgentByIdResponse)
+serializer = get_default_serializer()
+legacy_entry = json.dumps(AGENT).encode()
+entry = serializer.dumps(AGENT)
+
+
+def render(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, separators=(",", ":")).encode()
+
+
+def previous_path() -> bytes:
+    response = GetAgentByIdResponse(**json.loads(legacy_entry))
+    validated = response_adapter.validate_python(response.model_dump())
+    return json.dumps(response_adapter.dump_python(validated, mode="json")).encode()
+
+
+def current_path() -> bytes:
+    data = serializer.loads(entry)
+    response = GetAgentByIdResponse.model_construct(**{
+        **data,
+        "fallback_models": [FallbackModelConfig.model_construct(**fallback) for fallback in data["fallback_models"]]
+    })
+    return render(response.model_dump(mode="json"))
+
+
+def measure(name: str, fn) -> float:
+    seconds = min(timeit.repeat(fn, number=ITERATIONS, repeat=3)) / ITERATIONS
+    print(f"{name:<42}{seconds * 1e6:>10.2f} us")
+    return seconds
+
+
+if __name__ == "__main__":
+    print(f"serializer={type(serializer).__name__} msgpack={msgpack is not None} orjson={orjson is not None}")
+    print(f"entry size: stdlib json {len(legacy_entry)} bytes, serializer {len(entry)} bytes")
+    measure("encode cache entry (stdlib json)", lambda: json.dumps(AGENT).encode())
+    measure("encode cache entry (serializer)", lambda: serializer.dumps(AGENT))
+    measure("decode cache entry (stdlib json)", lambda: json.loads(legacy_entry))
+    measure("decode cache entry (serializer)", lambda: serializer.loads(entry))
+    if not isinstance(serializer, JsonSerializer):
+        json_entry = JsonSerializer().dumps(AGENT)
+        measure("decode cache entry (json serializer)", lambda: JsonSerializer().loads(json_entry))
+    previous = measure("GET /agents/{id} cache hit, previous", previous_path)
+    current = measure("GET /agents/{id} cache hit, current", current_path)
+    print(f"CPU saved per request: {(previous - current) * 1e6:.2f} us ({(1 - current / previous) * 100:.1f}%)")
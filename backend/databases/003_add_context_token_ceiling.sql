@@ -0,0 +1,2 @@
+-- Per agent token ceiling for history and memories sent to the model by stateful agents
+ALTER TABLE agents ADD COLUMN IF NOT EXISTS context_token_ceiling INT;
@@ -0,0 +1,3 @@
+-- Per tool execution settings used by the tool registry
+ALTER TABLE tools ADD COLUMN IF NOT EXISTS timeout_seconds REAL DEFAULT 30;
+ALTER TABLE tools ADD COLUMN IF NOT EXISTS result_ttl_seconds INT DEFAULT 0;
@@ -0,0 +1,2 @@
+-- Per agent execution deadline, used when the request doesn't send X-Request-Timeout
+ALTER TABLE agents ADD COLUMN IF NOT EXISTS timeout_seconds REAL;
@@ -0,0 +1,4 @@
+-- Ordered provider fallback chain of an agent, e.g. [{"model": 6, "type_model": "llama-3.3-70b-versatile"}]
+ALTER TABLE agents ADD COLUMN IF NOT EXISTS fallback_models JSONB NOT NULL DEFAULT '[]'::jsonb;
+-- Tools are assumed to have side effects unless declared otherwise, hedged requests are only sent for agents without them
+ALTER TABLE tools ADD COLUMN IF NOT EXISTS has_side_effects BOOLEAN NOT NULL DEFAULT TRUE;
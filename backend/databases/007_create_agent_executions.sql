@@ -0,0 +1,61 @@
+-- Execution log written in batches by the API (write-behind), partitioned by month
+CREATE TABLE IF NOT EXISTS agent_executions (
+    executed_at TIMESTAMPTZ NOT NULL,
+    agent_id INT NOT NULL,
+    user_id VARCHAR(255),
+    session_id VARCHAR(255),
+    llm INT NOT NULL,
+    type_model VARCHAR(255) NOT NULL,
+    status VARCHAR(32) NOT NULL,
+    latency_ms INT NOT NULL,
+    total_tokens INT NOT NULL DEFAULT 0
+) PARTITION BY RANGE (executed_at);
+
+CREATE INDEX IF NOT EXISTS idx_agent_executions_agent_executed_at ON agent_executions (agent_id, executed_at);
+
+-- Rows outside every monthly partition land here instead of failing the batch
+CREATE TABLE IF NOT EXISTS agent_executions_default PARTITION OF agent_executions DEFAULT;
+
+-- Creates the monthly partition parent_name_YYYY_MM of the month containing month_start. Rows of that month
+-- already in the DEFAULT partition (the partition was missing when they were written) would make the creation
+-- fail forever, so the default is detached, the partition created, the rows moved to it and the default
+-- reattached, in one transaction. Partition creation failures are counted by the API (execution_log_partition_errors).
+CREATE OR REPLACE FUNCTION create_monthly_partition(parent_name TEXT, month_start DATE) RETURNS void AS $$
+DECLARE
+    first_day DATE := date_trunc('month', month_start)::date;
+    next_day DATE := (date_trunc('month', month_start) + INTERVAL '1 month')::date;
+    partition_name TEXT := format('%s_%s', parent_name, to_char(first_day, 'YYYY_MM'));
+    default_name TEXT := parent_name || '_default';
+    key_column TEXT := substring(pg_get_partkeydef(parent_name::regclass) FROM '\((\w+)\)');
+    has_default_rows BOOLEAN;
+    moved BIGINT;
+BEGIN
+    -- Every worker calls it at startup, concurrent creations of the same parent wait for each other
+    PERFORM pg_advisory_xact_lock(hashtext('create_monthly_partition:' || parent_name));
+    IF to_regclass(partition_name) IS NOT NULL THEN
+        RETURN;
+    END IF;
+    EXECUTE format('SELECT EXISTS (SELECT 1 FROM %I WHERE %I >= %L AND %I < %L)', default_name, key_column, first_day, key_column, next_day)
+        INTO has_default_rows;
+    IF NOT has_default_rows THEN
+        EXECUTE format('CREATE TABLE IF NOT EXISTS %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)', partition_name, parent_name, first_day, next_day);
+        RETURN;
+    END IF;
+    EXECUTE format('ALTER TABLE %I DETACH PARTITION %I', parent_name, default_name);
+    EXECUTE format('CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)', partition_name, parent_name, first_day, next_day);
+    EXECUTE format(
+        'WITH moved AS (DELETE FROM %I WHERE %I >= %L AND %I < %L RETURNING *) INSERT INTO %I SELECT * FROM moved',
+        default_name, key_column, first_day, key_column, next_day, partition_name
+    );
+    GET DIAGNOSTICS moved = ROW_COUNT;
+    EXECUTE format('ALTER TABLE %I ATTACH PARTITION %I DEFAULT', parent_name, default_name);
+    RAISE WARNING 'Moved % rows of % from % to %', moved, parent_name, default_name, partition_name;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Creates the partition of the month containing month_start, the API calls it on startup for the current and next months
+CREATE OR REPLACE FUNCTION create_agent_executions_partition(month_start DATE) RETURNS void AS $$
+BEGIN
+    PERFORM create_monthly_partition('agent_executions', month_start);
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,44 @@
+-- Hourly rollups of agent_executions, maintained incrementally by the API background rollup job
+CREATE TABLE IF NOT EXISTS agent_executions_hourly (
+    bucket_start TIMESTAMPTZ NOT NULL,
+    agent_id INT NOT NULL,
+    llm INT NOT NULL,
+    type_model VARCHAR(255) NOT NULL,
+    executions BIGINT NOT NULL DEFAULT 0,
+    errors BIGINT NOT NULL DEFAULT 0,
+    timeouts BIGINT NOT NULL DEFAULT 0,
+    total_tokens BIGINT NOT NULL DEFAULT 0,
+    latency_ms_sum BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (bucket_start, agent_id, llm, type_model)
+);
+
+CREATE INDEX IF NOT EXISTS idx_agent_executions_hourly_agent ON agent_executions_hourly (agent_id, bucket_start);
+
+-- Mergeable latency sketch: executions per logarithmic latency bucket (bucket i holds latencies up to gamma^i ms),
+-- summing the counts of any set of rows gives the sketch of their union
+CREATE TABLE IF NOT EXISTS agent_executions_latency_sketch (
+    bucket_start TIMESTAMPTZ NOT NULL,
+    agent_id INT NOT NULL,
+    llm INT NOT NULL,
+    type_model VARCHAR(255) NOT NULL,
+    sketch_index INT NOT NULL,
+    executions BIGINT NOT NULL,
+    PRIMARY KEY (bucket_start, agent_id, llm, type_model, sketch_index)
+);
+
+CREATE INDEX IF NOT EXISTS idx_agent_executions_latency_sketch_agent ON agent_executions_latency_sketch (agent_id, bucket_start);
+
+-- Insert time of the raw rows, the rollup watermark follows it so rows written late by the write-behind log are
+-- still rolled up. Rows written before the column existed take their execution time, the watermark was on it.
+ALTER TABLE agent_executions ADD COLUMN IF NOT EXISTS inserted_at TIMESTAMPTZ;
+ALTER TABLE agent_executions ALTER COLUMN inserted_at SET DEFAULT clock_timestamp();
+UPDATE agent_executions SET inserted_at = executed_at WHERE inserted_at IS NULL;
+ALTER TABLE agent_executions ALTER COLUMN inserted_at SET NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_agent_executions_inserted_at ON agent_executions (inserted_at);
+
+-- Raw rows inserted before processed_until are already in the rollups
+CREATE TABLE IF NOT EXISTS rollup_watermarks (
+    name VARCHAR(255) PRIMARY KEY,
+    processed_until TIMESTAMPTZ NOT NULL
+);
@@ -0,0 +1,59 @@
+-- Definition version of each agent, the ETag of GET /agents/{id}. Bumped with updated_at on every update of the agent,
+-- of its tool links or of one of its tools
+ALTER TABLE agents ADD COLUMN IF NOT EXISTS version BIGINT NOT NULL DEFAULT 1;
+
+CREATE OR REPLACE FUNCTION agents_bump_version() RETURNS TRIGGER AS $$
+BEGIN
+    NEW.version := OLD.version + 1;
+    NEW.updated_at := CURRENT_TIMESTAMP;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS agents_bump_version ON agents;
+CREATE TRIGGER agents_bump_version BEFORE UPDATE ON agents
+    FOR EACH ROW EXECUTE FUNCTION agents_bump_version();
+
+CREATE OR REPLACE FUNCTION agents_tools_touch_agent() RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE agents SET updated_at = CURRENT_TIMESTAMP
+    WHERE id = CASE WHEN TG_OP = 'DELETE' THEN OLD.agent_id ELSE NEW.agent_id END;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS agents_tools_touch_agent ON agents_tools;
+CREATE TRIGGER agents_tools_touch_agent AFTER INSERT OR UPDATE OR DELETE ON agents_tools
+    FOR EACH ROW EXECUTE FUNCTION agents_tools_touch_agent();
+
+CREATE OR REPLACE FUNCTION tools_touch_agents() RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE agents SET updated_at = CURRENT_TIMESTAMP
+    WHERE id IN (SELECT agent_id FROM agents_tools WHERE tool_id = NEW.id);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS tools_touch_agents ON tools;
+CREATE TRIGGER tools_touch_agents AFTER UPDATE ON tools
+    FOR EACH ROW EXECUTE FUNCTION tools_touch_agents();
+
+-- Table level change counters, the ETag of listings
+CREATE TABLE IF NOT EXISTS table_versions (
+    name VARCHAR(255) PRIMARY KEY,
+    version BIGINT NOT NULL
+);
+
+INSERT INTO table_versions (name, version) VALUES ('agents', 1) ON CONFLICT (name) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION bump_table_version() RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO table_versions (name, version) VALUES (TG_TABLE_NAME, 1)
+    ON CONFLICT (name) DO UPDATE SET version = table_versions.version + 1;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS agents_bump_table_version ON agents;
+CREATE TRIGGER agents_bump_table_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON agents
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version();
@@ -0,0 +1,66 @@
+-- Where a stateful agent keeps its sessions and memories: 'redis' (RedisDb) or 'postgres' (the tables below)
+ALTER TABLE agents ADD COLUMN IF NOT EXISTS storage_backend VARCHAR(32) NOT NULL DEFAULT 'redis';
+
+-- Sessions and memories of the agents stored in Postgres, partitioned by month of their last update.
+-- An update moves the row to the current partition, so a partition only holds rows not updated since its month
+-- and retention drops whole partitions. The ids are not unique across partitions, the API serializes the writes
+-- of an id with an advisory lock.
+CREATE TABLE IF NOT EXISTS agent_sessions (
+    session_id VARCHAR(255) NOT NULL,
+    agent_name VARCHAR(255) NOT NULL,
+    user_id VARCHAR(255),
+    session_type VARCHAR(32) NOT NULL,
+    component_id VARCHAR(255),
+    session_name VARCHAR(255),
+    data JSONB NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL
+) PARTITION BY RANGE (updated_at);
+
+CREATE INDEX IF NOT EXISTS idx_agent_sessions_agent_user_updated_at ON agent_sessions (agent_name, user_id, updated_at);
+CREATE INDEX IF NOT EXISTS idx_agent_sessions_session_id ON agent_sessions (session_id);
+
+CREATE TABLE IF NOT EXISTS agent_memories (
+    memory_id VARCHAR(255) NOT NULL,
+    agent_name VARCHAR(255) NOT NULL,
+    user_id VARCHAR(255),
+    topics JSONB NOT NULL DEFAULT '[]'::jsonb,
+    data JSONB NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL
+) PARTITION BY RANGE (updated_at);
+
+CREATE INDEX IF NOT EXISTS idx_agent_memories_agent_user_updated_at ON agent_memories (agent_name, user_id, updated_at);
+CREATE INDEX IF NOT EXISTS idx_agent_memories_memory_id ON agent_memories (memory_id);
+
+CREATE TABLE IF NOT EXISTS agent_sessions_default PARTITION OF agent_sessions DEFAULT;
+CREATE TABLE IF NOT EXISTS agent_memories_default PARTITION OF agent_memories DEFAULT;
+
+-- Creates the partitions of the month containing month_start, the API calls it for the current and next months.
+-- create_monthly_partition (007) moves the rows of the month that landed in the DEFAULT partitions.
+CREATE OR REPLACE FUNCTION create_agent_memory_store_partitions(month_start DATE) RETURNS void AS $$
+BEGIN
+    PERFORM create_monthly_partition('agent_sessions', month_start);
+    PERFORM create_monthly_partition('agent_memories', month_start);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Drops the monthly partitions of parent ('agent_sessions' or 'agent_memories') ending at or before cutoff,
+-- returns their names
+CREATE OR REPLACE FUNCTION drop_agent_memory_store_partitions(parent_name TEXT, cutoff TIMESTAMPTZ) RETURNS SETOF TEXT AS $$
+DECLARE
+    partition_name TEXT;
+BEGIN
+    FOR partition_name IN
+        SELECT child.relname
+        FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = parent_name
+          AND child.relname ~ '_\d{4}_\d{2}$'
+          AND to_date(right(child.relname, 7), 'YYYY_MM') + INTERVAL '1 month' <= cutoff
+    LOOP
+        EXECUTE format('DROP TABLE IF EXISTS %I', partition_name);
+        RETURN NEXT partition_name;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,106 @@
+"""
+Multi-core serving mode: gunicorn master with pre-forked uvicorn workers.
+Run from the backend folder: gunicorn -c gunicorn.conf.py
+
+The app (agno, provider SDKs, pydantic models) is imported once by the master and shared by the workers
+copy-on-write. Pools are only opened in the lifespan, so every worker creates its own asyncpg, Redis and
+provider clients after the fork. Worker count and pool sizes are derived from the CPUs available to the
+container and the connection budgets:
+    WEB_CONCURRENCY            workers, defaults to the available CPUs
+    DB_CONNECTION_BUDGET       PostgreSQL connections the whole pod may open (per server: primary and each replica)
+    REDIS_CONNECTION_BUDGET    Redis connections the whole pod may open
+Explicit DB_POOL_MAX_SIZE / REDIS_POOL_MAX_SIZE are per pool and are lowered to fit the budgets.
+"""
+
+import gc
+import logging
+import math
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from load_env import load_env
+from uvicorn_worker import UvicornWorker
+
+load_env()
+
+logger = logging.getLogger("Gunicorn")
+
+MIN_DB_CONNECTIONS_PER_WORKER = 2
+# Text and binary pools, sync (agno storage) and asyncio (cache)
+REDIS_POOLS_PER_WORKER = 4
+
+
+def available_cpus() -> int:
+    """CPUs this process may use: the affinity mask, capped by the cgroup v2 CPU quota of the container."""
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as cpu_max:
+            quota, period = cpu_max.read().split()
+        if quota != "max":
+            cpus = min(cpus, math.ceil(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    return max(1, cpus)
+
+
+def _pool_size(budget_name: str, size_name: str, default_size: int, pools: int) -> int:
+    """Per pool size fitting the pod budget shared by the pools of every worker."""
+    size = int(os.getenv(size_name, default_size))
+    budget = os.getenv(budget_name)
+    if budget:
+        fitting = int(budget) // pools
+        size = min(size, fitting) if os.getenv(size_name) else fitting
+    return max(1, size)
+
+
+def _workers(cpus: int) -> int:
+    workers = int(os.getenv("WEB_CONCURRENCY", cpus))
+    db_budget = os.getenv("DB_CONNECTION_BUDGET")
+    if db_budget:
+        workers = min(workers, int(db_budget) // MIN_DB_CONNECTIONS_PER_WORKER)
+    return max(1, workers)
+
+
+class AppUvicornWorker(UvicornWorker):
+    """Uvicorn worker on uvloop and httptools (falls back to asyncio / h11 when they are not installed)."""
+
+    CONFIG_KWARGS = {
+        **UvicornWorker.CONFIG_KWARGS,
+        "loop": os.getenv("SERVER_LOOP", "auto"),
+        "http": os.getenv("SERVER_HTTP", "auto"),
+        "lifespan": "on",
+    }
+
+
+workers = _workers(available_cpus())
+
+# Read by the workers when their pools are created in the lifespan
+db_pool_max_size = _pool_size("DB_CONNECTION_BUDGET", "DB_POOL_MAX_SIZE", 10, workers)
+os.environ["DB_POOL_MAX_SIZE"] = str(db_pool_max_size)
+os.environ["DB_POOL_MIN_SIZE"] = str(min(int(os.getenv("DB_POOL_MIN_SIZE", 2)), db_pool_max_size))
+os.environ["REDIS_POOL_MAX_SIZE"] = str(_pool_size("REDIS_CONNECTION_BUDGET", "REDIS_POOL_MAX_SIZE", 20, workers * REDIS_POOLS_PER_WORKER))
+
+wsgi_app = "main:app"
+worker_class = AppUvicornWorker
+preload_app = True
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', 8000)}"
+timeout = int(os.getenv("SERVER_WORKER_TIMEOUT", 120))
+graceful_timeout = int(os.getenv("SERVER_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.getenv("SERVER_KEEPALIVE", 5))
+max_requests = int(os.getenv("SERVER_MAX_REQUESTS", 0))
+max_requests_jitter = int(os.getenv("SERVER_MAX_REQUESTS_JITTER", 0))
+
+
+def when_ready(server):
+    logger.info(
+        f"Serving with {workers} workers, PostgreSQL pool {os.environ['DB_POOL_MIN_SIZE']}-{os.environ['DB_POOL_MAX_SIZE']} "
+        f"and {REDIS_POOLS_PER_WORKER} Redis pools of {os.environ['REDIS_POOL_MAX_SIZE']} per worker"
+    )
+
+
+def pre_fork(server, worker):
+    # Objects loaded by the master are moved out of the collector, so collections in the workers
+    # do not write to (and copy) the shared pages
+    gc.freeze()
@@ -1,9 +1,10 @@
 
 """Simple pluggable cache manager.
 
-Provides a small async-compatible in-memory cache backend with TTL and
-an easy-to-replace backend interface so the implementation can be swapped
-for Redis or another distributed cache later.
+Provides a small async-compatible in-memory cache backend with TTL, a Redis
+backend shared by every worker, and an easy-to-replace backend interface.
+Backends encode values with a pluggable serializer (see serializer.py);
+CACHE_BACKEND=redis selects the Redis backend.
 
 Usage:
 	from .config.database.cache_manager import cache_manager
@@ -16,10 +17,14 @@ Usage:
 from __future__ import annotations
 
 import asyncio
+import contextlib
+import os
 import time
 from abc import ABC, abstractmethod
 from typing import Any, Dict, Optional, Tuple
 
+from .serializer import PassthroughSerializer, Serializer, get_default_serializer
+
 
 class CacheBackend(ABC):
 	@abstractmethod
@@ -48,7 +53,8 @@ class CacheBackend(ABC):
 
 
 class InMemoryCacheBackend(CacheBackend):
-	def __init__(self, cleanup_interval: float = 5.0) -> None:
+	def __init__(self, cleanup_interval: float = 5.0, serializer: Optional[Serializer] = None) -> None:
+		self._serializer = serializer or PassthroughSerializer()
 		self._store: Dict[str, Tuple[Any, Optional[float]]] = {}
 		self._lock = asyncio.Lock()
 		self._cleanup_interval = cleanup_interval
@@ -79,14 +85,15 @@ class InMemoryCacheBackend(CacheBackend):
 			if expire_at is not None and expire_at <= time.time():
 				del self._store[key]
 				return {}
-			return value
+		return self._serializer.loads(value) or {}
 
 	async def set(self, key: str, value: dict, ttl: Optional[float] = None) -> None:
 		expire_at = None
 		if ttl is not None:
 			expire_at = time.time() + float(ttl)
+		encoded = self._serializer.dumps(value)
 		async with self._lock:
-			self._store[key] = (value, expire_at)
+			self._store[key] = (encoded, expire_at)
 
 	async def delete(self, key: str) -> None:
 		async with self._lock:
@@ -109,7 +116,37 @@ class InMemoryCacheBackend(CacheBackend):
 			return
 
 
-import contextlib
+class RedisCacheBackend(CacheBackend):
+	"""Cache shared by every worker, values are stored as serializer bytes under a key prefix."""
+
+	def __init__(self, serializer: Optional[Serializer] = None, prefix: str = "cache:") -> None:
+		self._serializer = serializer or get_default_serializer()
+		self._prefix = prefix
+		self._client = None
+
+	async def connect(self) -> None:
+		from .redis_manager import redis_manager
+		self._client = redis_manager.get_async_binary_redis_client()
+
+	async def disconnect(self) -> None:
+		self._client = None
+
+	async def get(self, key: str) -> dict:
+		data = await self._client.get(self._prefix + key)
+		if data is None:
+			return {}
+		return self._serializer.loads(data) or {}
+
+	async def set(self, key: str, value: dict, ttl: Optional[float] = None) -> None:
+		px = int(float(ttl) * 1000) if ttl is not None else None
+		await self._client.set(self._prefix + key, self._serializer.dumps(value), px=px)
+
+	async def delete(self, key: str) -> None:
+		await self._client.delete(self._prefix + key)
+
+	async def clear(self) -> None:
+		async for key in self._client.scan_iter(match=f"{self._prefix}*", count=500):
+			await self._client.delete(key)
 
 
 class CacheManager:
@@ -141,7 +178,13 @@ class CacheManager:
 		await self._backend.clear()
 
 
-# Default process-local cache instance. Swap the backend later to use Redis.
-cache_manager = CacheManager(InMemoryCacheBackend())
+def _build_default_backend() -> CacheBackend:
+	if os.getenv("CACHE_BACKEND", "memory").lower() == "redis":
+		return RedisCacheBackend()
+	return InMemoryCacheBackend()
+
+
+# Default cache instance, process-local unless CACHE_BACKEND=redis.
+cache_manager = CacheManager(_build_default_backend())
 
-__all__ = ["CacheBackend", "InMemoryCacheBackend", "CacheManager", "cache_manager"]
+__all__ = ["CacheBackend", "InMemoryCacheBackend", "RedisCacheBackend", "CacheManager", "cache_manager"]
@@ -0,0 +1,131 @@
+import functools
+import hashlib
+import inspect
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from agno.vectordb.qdrant import Qdrant
+from config.monitory.metrics import metrics
+
+
+class RetrievalCache:
+    """
+    Short lived cache of search results per (collection, query, limit, filters). Every collection has a
+    generation, part of the keys, bumped when this process writes to it: older entries are never read
+    again and age out of the LRU. Writes made by other processes are bounded by the TTL.
+    """
+
+    def __init__(self, max_size: int = 2048, ttl_seconds: float = 60):
+        self._max_size = max_size
+        self._ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[str, tuple[list, float]] = OrderedDict()
+        self._generations: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def key(self, collection: str, query: str, limit: int, filters: Any) -> str:
+        normalized = " ".join(query.split()).casefold()
+        digest = hashlib.sha1(f"{normalized}|{limit}|{filters!r}".encode()).hexdigest()
+        return f"{collection}:{self._generations.get(collection, 0)}:{digest}"
+
+    def get(self, key: str) -> Optional[list]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[1] > self._ttl_seconds:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return list(entry[0])
+
+    def put(self, key: str, documents: list) -> None:
+        with self._lock:
+            self._entries[key] = (list(documents), time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, collection: str) -> None:
+        with self._lock:
+            self._generations[collection] = self._generations.get(collection, 0) + 1
+
+    def hit_rates(self) -> dict:
+        counters = metrics.snapshot_counters("knowledge_result_cache_hits", "knowledge_result_cache_misses")
+        hits, misses = counters["knowledge_result_cache_hits"], counters["knowledge_result_cache_misses"]
+        return {
+            collection: round(hits.get(collection, 0) / (hits.get(collection, 0) + misses.get(collection, 0)), 4)
+            for collection in set(hits) | set(misses)
+        }
+
+
+class CachedQdrant(Qdrant):
+    """
+    Qdrant collection whose searches go through the retrieval cache. On a miss the query embedding is
+    requested through the async (batched and cached) embedder first, so the dense search finds it cached.
+    Inserts, upserts, deletes and drops invalidate the collection results.
+    """
+
+    def __init__(self, *args, retrieval_cache: RetrievalCache, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.retrieval_cache = retrieval_cache
+
+    def search(self, query: str, limit: int = 5, filters: Optional[Any] = None) -> list:
+        key = self.retrieval_cache.key(self.collection, query, limit, filters)
+        cached = self._cached(key)
+        if cached is not None:
+            return cached
+        started_at = time.perf_counter()
+        documents = super().search(query, limit=limit, filters=filters)
+        self._store(key, documents, started_at)
+        return documents
+
+    async def async_search(self, query: str, limit: int = 5, filters: Optional[Any] = None) -> list:
+        key = self.retrieval_cache.key(self.collection, query, limit, filters)
+        cached = self._cached(key)
+        if cached is not None:
+            return cached
+        started_at = time.perf_counter()
+        await self.embedder.async_get_embedding(query)
+        documents = await super().async_search(query, limit=limit, filters=filters)
+        self._store(key, documents, started_at)
+        return documents
+
+    def _cached(self, key: str) -> Optional[list]:
+        cached = self.retrieval_cache.get(key)
+        metrics.increment("knowledge_result_cache_hits" if cached is not None else "knowledge_result_cache_misses", self.collection)
+        return cached
+
+    def _store(self, key: str, documents: list, started_at: float) -> None:
+        metrics.observe("knowledge_retrieval_seconds", time.perf_counter() - started_at, self.collection)
+        self.retrieval_cache.put(key, documents)
+
+
+def _invalidating(method):
+    if inspect.iscoroutinefunction(method):
+        @functools.wraps(method)
+        async def async_wrapper(self, *args, **kwargs):
+            try:
+                return await method(self, *args, **kwargs)
+            finally:
+                self.retrieval_cache.invalidate(self.collection)
+        return async_wrapper
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self.retrieval_cache.invalidate(self.collection)
+    return wrapper
+
+
+_WRITE_METHODS = (
+    "insert", "async_insert", "upsert", "async_upsert", "delete", "delete_by_id", "delete_by_name",
+    "delete_by_metadata", "delete_by_content_id", "drop", "async_drop",
+)
+
+for _name in _WRITE_METHODS:
+    if hasattr(Qdrant, _name):
+        setattr(CachedQdrant, _name, _invalidating(getattr(Qdrant, _name)))
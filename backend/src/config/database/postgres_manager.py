@@ -1,59 +1,155 @@
+import asyncio
 import asyncpg
+import contextlib
+import itertools
+import time
 from typing import Optional, AsyncGenerator
 import logging
 import os
 from contextlib import asynccontextmanager
+from config.monitory.metrics import metrics
 
 class PostgresManager:
     """
-    Manages the PostgreSQL connection pool using asyncpg.
+    Manages the PostgreSQL connection pools using asyncpg.
+    A primary pool receives writes, read-only work is spread across the replica pools
+    (DATABASE_REPLICA_URLS, comma separated) and falls back to the primary when there are no replicas,
+    a replica is unavailable or a write happened inside the read-your-writes window.
     """
     _pool: Optional[asyncpg.Pool] = None
+    _replica_pools: list[asyncpg.Pool] = []
     _logger = logging.getLogger(__name__)
 
+    def __init__(self):
+        self._replica_cycle = itertools.cycle([])
+        self._primary_reads_until = 0.0
+        self._recycle_task: Optional[asyncio.Task] = None
+        self.read_your_writes_window = float(os.getenv("DB_READ_YOUR_WRITES_WINDOW", 5))
+        self.max_connection_lifetime = float(os.getenv("DB_POOL_MAX_LIFETIME", 1800))
+        metrics.register_gauge("postgres_pools", self.get_pool_stats)
+
+    @staticmethod
+    def _pool_options() -> dict:
+        return {
+            "min_size": int(os.getenv("DB_POOL_MIN_SIZE", 2)),
+            "max_size": int(os.getenv("DB_POOL_MAX_SIZE", 10)),
+            "timeout": float(os.getenv("DB_POOL_TIMEOUT", 30)),
+            "max_inactive_connection_lifetime": float(os.getenv("DB_POOL_MAX_IDLE", 300)),
+            "max_queries": int(os.getenv("DB_POOL_MAX_QUERIES", 50000)),
+            "statement_cache_size": int(os.getenv("DB_STATEMENT_CACHE_SIZE", 100)),
+            "max_cached_statement_lifetime": int(os.getenv("DB_STATEMENT_CACHE_LIFETIME", 300)),
+        }
+
     async def connect(self):
         """
-        Establishes the PostgreSQL connection pool.
+        Establishes the PostgreSQL connection pools.
         """
         if self._pool is None:
             db_url = os.getenv("DATABASE_URL")
             host = db_url.split('@')[-1] if db_url else "UNKNOWN"
             self._logger.info(f"Attempting to connect to PostgreSQL at {host}...")
             try:
-                self._pool = await asyncpg.create_pool(
-                    dsn=db_url,
-                    min_size=int(os.getenv("DB_POOL_MIN_SIZE", 10)),
-                    max_size=int(os.getenv("DB_POOL_MAX_SIZE", 10)),
-                    timeout=float(os.getenv("DB_POOL_TIMEOUT", 30)),
-                )
+                self._pool = await asyncpg.create_pool(dsn=db_url, **self._pool_options())
                 self._logger.info("PostgreSQL connection pool established successfully.")
             except Exception as e:
                 self._logger.exception(f"Failed to connect to PostgreSQL: {e}")
                 raise
+            await self._connect_replicas()
+            if self.max_connection_lifetime > 0:
+                self._recycle_task = asyncio.create_task(self._recycle_connections_loop())
+
+    async def _connect_replicas(self):
+        replica_urls = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+        replica_pools = []
+        for replica_url in replica_urls:
+            host = replica_url.split('@')[-1]
+            try:
+                replica_pools.append(await asyncpg.create_pool(dsn=replica_url, **self._pool_options()))
+                self._logger.info(f"PostgreSQL replica pool established at {host}.")
+            except Exception as e:
+                self._logger.warning(f"Failed to connect to PostgreSQL replica at {host}, reads will skip it: {e}")
+        self._replica_pools = replica_pools
+        self._replica_cycle = itertools.cycle(range(len(replica_pools)))
+
+    async def _recycle_connections_loop(self):
+        """Expires pooled connections periodically so none outlives DB_POOL_MAX_LIFETIME; they are replaced on release."""
+        while True:
+            await asyncio.sleep(self.max_connection_lifetime)
+            for pool in self._all_pools():
+                await pool.expire_connections()
+
+    def _all_pools(self) -> list[asyncpg.Pool]:
+        return ([self._pool] if self._pool else []) + self._replica_pools
 
     async def disconnect(self):
         """
-        Closes the PostgreSQL connection pool.
+        Closes the PostgreSQL connection pools.
         """
+        if self._recycle_task:
+            self._recycle_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._recycle_task
+            self._recycle_task = None
         if self._pool:
-            self._logger.info("Closing PostgreSQL connection pool...")
-            await self._pool.close()
+            self._logger.info("Closing PostgreSQL connection pools...")
+            for pool in self._all_pools():
+                await pool.close()
             self._pool = None
-            self._logger.info("PostgreSQL connection pool closed.")
+            self._replica_pools = []
+            self._logger.info("PostgreSQL connection pools closed.")
+
+    def has_replicas(self) -> bool:
+        return bool(self._replica_pools)
+
+    def mark_write(self):
+        """Routes reads to the primary for the read-your-writes window after a write."""
+        self._primary_reads_until = time.monotonic() + self.read_your_writes_window
+
+    def _choose_read_pool(self) -> tuple[str, asyncpg.Pool]:
+        if not self._replica_pools or time.monotonic() < self._primary_reads_until:
+            return "primary", self._pool
+        index = next(self._replica_cycle)
+        return f"replica-{index}", self._replica_pools[index]
 
     @asynccontextmanager
-    async def get_connection(self) -> AsyncGenerator[asyncpg.Connection, None]:
+    async def get_connection(self, read_only: bool = False) -> AsyncGenerator[asyncpg.Connection, None]:
         """
-        Provides a connection from the pool.
+        Provides a connection from the primary pool, or from a replica pool when read_only is set.
         Usage:
             async with postgres_manager.get_connection() as conn:
                 await conn.fetch(...)
         """
         if self._pool is None:
             raise RuntimeError("PostgreSQL pool is not initialized. Call connect() first.")
-        
-        async with self._pool.acquire() as connection:
+
+        pool_name, pool = self._choose_read_pool() if read_only else ("primary", self._pool)
+        started_at = time.perf_counter()
+        try:
+            connection = await pool.acquire()
+        except (OSError, asyncpg.PostgresError, asyncio.TimeoutError) as e:
+            if pool is self._pool:
+                raise
+            self._logger.warning(f"PostgreSQL {pool_name} unavailable, reading from primary: {e}")
+            pool_name, pool = "primary", self._pool
+            connection = await pool.acquire()
+        metrics.observe("postgres_pool_wait_seconds", time.perf_counter() - started_at, pool_name)
+        try:
             yield connection
+        finally:
+            await pool.release(connection)
+
+    def get_pool_stats(self) -> dict:
+        stats = {}
+        for name, pool in [("primary", self._pool)] + [(f"replica-{i}", p) for i, p in enumerate(self._replica_pools)]:
+            if pool is None:
+                continue
+            stats[name] = {
+                "size": pool.get_size(),
+                "idle": pool.get_idle_size(),
+                "min_size": pool.get_min_size(),
+                "max_size": pool.get_max_size(),
+            }
+        return stats
 
 postgres_manager = PostgresManager()
 
@@ -62,4 +158,4 @@ async def get_db_connection() -> AsyncGenerator[asyncpg.Connection, None]:
     FastAPI dependency that yields an asyncpg connection from the pool.
     """
     async with postgres_manager.get_connection() as connection:
-        yield connection
\ No newline at end of file
+        yield connection
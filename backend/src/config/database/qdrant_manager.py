@@ -1,11 +1,13 @@
-from agno.vectordb.qdrant import Qdrant
 from agno.vectordb.search import SearchType
+from config.database.cached_qdrant import CachedQdrant, RetrievalCache
+from config.llm.caching_embedder import build_caching_embedder
+from config.monitory.metrics import metrics
 import os
+import threading
 
 class QdrantManager:
     
     _instance = None
-    vector_db = None
     timeout = 20
 
     def __new__(cls):
@@ -19,17 +21,49 @@ class QdrantManager:
         if self._initialized:
             return
         
-        self.vector_db = Qdrant(
-            url=os.getenv("QDRANT_URL", "http://localhost:6333"),
-            api_key=os.getenv("QDRANT_API_KEY", None),
-            search_type=SearchType.hybrid,
-            timeout=self.timeout,
+        self.embedder = build_caching_embedder(self._build_embedder())
+        self.retrieval_cache = RetrievalCache(
+            max_size=int(os.getenv("KNOWLEDGE_RESULT_CACHE_SIZE", 2048)),
+            ttl_seconds=float(os.getenv("KNOWLEDGE_RESULT_CACHE_TTL", 60)),
         )
+        self._collections: dict[str, CachedQdrant] = {}
+        self._lock = threading.Lock()
+        metrics.register_gauge("knowledge_result_cache_hit_rate", self.retrieval_cache.hit_rates)
 
         self._initialized = True
 
-    def get_vector_db(self):
-        """returns a Qdrant vector db instance"""
-        return self.vector_db
+    @staticmethod
+    def _build_embedder():
+        """KNOWLEDGE_EMBEDDER=ollama embeds through the local Ollama hosts, otherwise agno's default embedder is used."""
+        if os.getenv("KNOWLEDGE_EMBEDDER", "").lower() != "ollama":
+            from agno.knowledge.embedder.openai import OpenAIEmbedder
+            return OpenAIEmbedder()
+        from config.llm.ollama_embedder import OllamaBatchEmbedder
+        return OllamaBatchEmbedder(
+            id=os.getenv("OLLAMA_EMBED_MODEL", "nomic-embed-text"),
+            dimensions=int(os.getenv("OLLAMA_EMBED_DIMENSIONS", 768)),
+        )
+
+    def get_vector_db(self, collection: str) -> CachedQdrant:
+        """returns the Qdrant vector db of the collection, one shared instance per collection"""
+        vector_db = self._collections.get(collection)
+        if vector_db is None:
+            with self._lock:
+                vector_db = self._collections.get(collection)
+                if vector_db is None:
+                    vector_db = self._collections[collection] = CachedQdrant(
+                        collection=collection,
+                        url=os.getenv("QDRANT_URL", "http://localhost:6333"),
+                        api_key=os.getenv("QDRANT_API_KEY", None),
+                        search_type=SearchType.hybrid,
+                        timeout=self.timeout,
+                        embedder=self.embedder,
+                        retrieval_cache=self.retrieval_cache,
+                    )
+        return vector_db
+
+    def invalidate_collection(self, collection: str) -> None:
+        """Drops the cached search results of a collection written to outside of this process."""
+        self.retrieval_cache.invalidate(collection)
 
 qdrant_manager = QdrantManager()
\ No newline at end of file
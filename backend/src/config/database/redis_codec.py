@@ -0,0 +1,303 @@
+import json
+import logging
+import os
+import struct
+import threading
+from typing import Any, Callable, Optional
+
+import redis
+from config.monitory.metrics import metrics
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional dependency
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+logger = logging.getLogger("RedisCodec")
+
+# Rolled out in two releases: every worker must read the codec format (REDIS_CODEC_READ_ENABLED) before
+# any writes it (REDIS_CODEC_ENABLED), otherwise workers of the previous build fail on the new values
+REDIS_CODEC_ENABLED = os.getenv("REDIS_CODEC_ENABLED", "false").lower() == "true"
+REDIS_CODEC_READ_ENABLED = REDIS_CODEC_ENABLED or os.getenv("REDIS_CODEC_READ_ENABLED", "true").lower() == "true"
+
+# 0xFF can't start UTF-8 text, so values written before the codec (plain JSON) are told apart by the first byte
+MAGIC = b"\xffSC"
+VERSION = 1
+FLAG_MSGPACK = 1
+FLAG_ZSTD = 2
+FLAG_DICTIONARY = 4
+
+DICTIONARY_KEY = "codec:zstd_dict"
+
+
+def _to_text(value: Any) -> Any:
+    if isinstance(value, bytes):
+        return value.decode()
+    if isinstance(value, (list, tuple)):
+        return type(value)(_to_text(item) for item in value)
+    if isinstance(value, set):
+        return {_to_text(item) for item in value}
+    if isinstance(value, dict):
+        return {_to_text(key): _to_text(item) for key, item in value.items()}
+    return value
+
+
+class PayloadCodec:
+    """
+    Compact encoding of the JSON documents agno stores in Redis: the document is re-encoded with msgpack
+    and, above compress_threshold bytes, compressed with zstd, using a shared dictionary once one was
+    trained from the first payloads. The header (magic, version, flags and dictionary id) keeps every
+    format readable, including plain JSON values written before the codec. Without msgpack or zstandard
+    installed the matching step is skipped.
+    """
+
+    def __init__(self, compress_threshold: int = 512, level: int = 3, dictionary_samples: int = 200, dictionary_size: int = 16384):
+        self.compress_threshold = compress_threshold
+        self.level = level
+        self.dictionary_samples = dictionary_samples if zstandard is not None else 0
+        self.dictionary_size = dictionary_size
+        self._dictionaries: dict[int, Any] = {}
+        self._current_dictionary: Optional[Any] = None
+        self._samples: list[bytes] = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "PayloadCodec":
+        return cls(
+            compress_threshold=int(os.getenv("REDIS_CODEC_COMPRESS_THRESHOLD", 512)),
+            level=int(os.getenv("REDIS_CODEC_ZSTD_LEVEL", 3)),
+            dictionary_samples=int(os.getenv("REDIS_CODEC_DICT_SAMPLES", 200)),
+            dictionary_size=int(os.getenv("REDIS_CODEC_DICT_SIZE", 16384)),
+        )
+
+    def add_dictionary(self, dictionary_data: bytes, current: bool = False) -> int:
+        dictionary = zstandard.ZstdCompressionDict(dictionary_data)
+        dictionary.precompute_compress(level=self.level)
+        dictionary_id = dictionary.dict_id()
+        with self._lock:
+            self._dictionaries[dictionary_id] = dictionary
+            if current:
+                self._current_dictionary = dictionary
+        return dictionary_id
+
+    def has_dictionary(self, dictionary_id: int) -> bool:
+        return dictionary_id in self._dictionaries
+
+    def train_if_ready(self) -> Optional[tuple[int, bytes]]:
+        """Trains the shared dictionary once enough samples were seen, returns its id and content to publish."""
+        with self._lock:
+            if self._current_dictionary is not None or len(self._samples) < self.dictionary_samples:
+                return None
+            samples, self._samples = self._samples, []
+        try:
+            dictionary = zstandard.train_dictionary(self.dictionary_size, samples, level=self.level)
+        except zstandard.ZstdError as e:
+            logger.warning(f"Could not train the zstd dictionary: {e}")
+            self.dictionary_samples = 0
+            return None
+        dictionary_data = dictionary.as_bytes()
+        return self.add_dictionary(dictionary_data, current=True), dictionary_data
+
+    def encode(self, value: Any) -> bytes:
+        text = value if isinstance(value, (str, bytes)) else str(value)
+        body = text.encode() if isinstance(text, str) else text
+        flags = 0
+        if msgpack is not None:
+            try:
+                body = msgpack.packb(json.loads(body), use_bin_type=True)
+                flags |= FLAG_MSGPACK
+            except (ValueError, TypeError, OverflowError):
+                # Not JSON, or integers msgpack can't hold (over 64 bits): kept as JSON text
+                pass
+        header_extra = b""
+        if zstandard is not None and len(body) >= self.compress_threshold:
+            dictionary = self._current_dictionary
+            if dictionary is None and len(self._samples) < self.dictionary_samples:
+                self._samples.append(body)
+            compressor = zstandard.ZstdCompressor(level=self.level, dict_data=dictionary) if dictionary is not None else zstandard.ZstdCompressor(level=self.level)
+            compressed = compressor.compress(body)
+            if len(compressed) < len(body):
+                body = compressed
+                flags |= FLAG_ZSTD
+                if dictionary is not None:
+                    flags |= FLAG_DICTIONARY
+                    header_extra = struct.pack(">I", dictionary.dict_id())
+        return MAGIC + bytes((VERSION, flags)) + header_extra + body
+
+    @staticmethod
+    def dictionary_id(data: bytes) -> Optional[int]:
+        if not data.startswith(MAGIC) or not data[len(MAGIC) + 1] & FLAG_DICTIONARY:
+            return None
+        return struct.unpack(">I", data[len(MAGIC) + 2:len(MAGIC) + 6])[0]
+
+    def decode(self, data: bytes) -> str:
+        if not data.startswith(MAGIC):
+            return data.decode()
+        flags = data[len(MAGIC) + 1]
+        offset = len(MAGIC) + 2
+        dictionary = None
+        if flags & FLAG_DICTIONARY:
+            dictionary = self._dictionaries[struct.unpack(">I", data[offset:offset + 4])[0]]
+            offset += 4
+        body = data[offset:]
+        if flags & FLAG_ZSTD:
+            decompressor = zstandard.ZstdDecompressor(dict_data=dictionary) if dictionary is not None else zstandard.ZstdDecompressor()
+            body = decompressor.decompress(body)
+        if flags & FLAG_MSGPACK:
+            return json.dumps(msgpack.unpackb(body, raw=False))
+        return body.decode()
+
+
+class _CodecPipeline:
+    """Pipeline encoding queued writes and decoding queued reads of values, other replies are turned into text."""
+
+    def __init__(self, client: "CodecRedisClient", pipeline):
+        self._client = client
+        self._pipeline = pipeline
+        self._decoders: list[Optional[Callable[[Any], Any]]] = []
+
+    def get(self, name):
+        self._pipeline.get(name)
+        self._decoders.append(self._client._decode)
+        return self
+
+    def set(self, name, value, *args, **kwargs):
+        self._pipeline.set(name, self._client._encode(name, value), *args, **kwargs)
+        self._decoders.append(None)
+        return self
+
+    def setex(self, name, time, value):
+        self._pipeline.setex(name, time, self._client._encode(name, value))
+        self._decoders.append(None)
+        return self
+
+    def __getattr__(self, name):
+        command = getattr(self._pipeline, name)
+
+        def queued(*args, **kwargs):
+            command(*args, **kwargs)
+            self._decoders.append(_to_text)
+            return self
+        return queued
+
+    def execute(self, *args, **kwargs):
+        results = self._pipeline.execute(*args, **kwargs)
+        decoders, self._decoders = self._decoders, []
+        return [decoder(result) if decoder is not None and result is not None else result for decoder, result in zip(decoders, results)]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._pipeline.reset()
+        self._decoders = []
+
+
+class CodecRedisClient:
+    """
+    Redis client handed to agno's RedisDb: values are written and read through the PayloadCodec on a
+    binary connection, every other command goes to the regular text client. Stored and raw sizes are
+    counted per key kind (the table segment of agno keys) in the metrics registry.
+    With write_encoded=False values are written as plain JSON and only read through the codec.
+    A value compressed with a dictionary missing from Redis is read as a miss, never as an error.
+    Creating the client does no I/O, the current dictionary is loaded by load_current_dictionary.
+    """
+
+    def __init__(self, text_client: redis.Redis, binary_client: redis.Redis, codec: PayloadCodec, write_encoded: bool = True):
+        self._text_client = text_client
+        self._binary_client = binary_client
+        self._codec = codec
+        self._write_encoded = write_encoded
+        self._missing_dictionaries: set[int] = set()
+        metrics.register_gauge("redis_payload_savings", self.savings)
+
+    def __getattr__(self, name):
+        return getattr(self._text_client, name)
+
+    @staticmethod
+    def _kind(name) -> str:
+        parts = (name.decode() if isinstance(name, bytes) else str(name)).split(":")
+        return parts[1] if len(parts) > 2 else "other"
+
+    def load_current_dictionary(self) -> None:
+        """Loads the dictionary new values are compressed with, blocking: called off the event loop at startup."""
+        if zstandard is None:
+            return
+        try:
+            dictionary_id = self._binary_client.get(f"{DICTIONARY_KEY}:current")
+            if dictionary_id is not None:
+                self._load_dictionary(int(dictionary_id), current=True)
+        except Exception as e:
+            logger.warning(f"Could not load the zstd dictionary: {e}")
+
+    def _load_dictionary(self, dictionary_id: int, current: bool = False) -> None:
+        dictionary_data = self._binary_client.get(f"{DICTIONARY_KEY}:{dictionary_id}")
+        if dictionary_data is None:
+            raise KeyError(f"zstd dictionary {dictionary_id} not found")
+        self._codec.add_dictionary(dictionary_data, current=current)
+
+    def _publish_dictionary(self) -> None:
+        if not self._write_encoded:
+            return
+        trained = self._codec.train_if_ready()
+        if trained is None:
+            return
+        dictionary_id, dictionary_data = trained
+        # Dictionaries never expire: every value compressed with one needs it to be read
+        self._binary_client.set(f"{DICTIONARY_KEY}:{dictionary_id}", dictionary_data)
+        self._binary_client.set(f"{DICTIONARY_KEY}:current", str(dictionary_id))
+        logger.info(f"Published zstd dictionary {dictionary_id} ({len(dictionary_data)} bytes).")
+
+    def _encode(self, name, value):
+        if not self._write_encoded:
+            return value
+        encoded = self._codec.encode(value)
+        kind = self._kind(name)
+        metrics.increment("redis_payload_raw_bytes", kind, len(value) if isinstance(value, (str, bytes)) else len(str(value)))
+        metrics.increment("redis_payload_stored_bytes", kind, len(encoded))
+        metrics.observe("redis_payload_bytes", len(encoded), kind)
+        return encoded
+
+    def _decode(self, data: bytes) -> Optional[str]:
+        dictionary_id = self._codec.dictionary_id(data)
+        try:
+            if dictionary_id is not None and not self._codec.has_dictionary(dictionary_id):
+                self._load_dictionary(dictionary_id)
+            return self._codec.decode(data)
+        except KeyError as e:
+            metrics.increment("redis_codec_missing_dictionary")
+            if dictionary_id not in self._missing_dictionaries:
+                self._missing_dictionaries.add(dictionary_id)
+                logger.error(f"Values compressed with a missing zstd dictionary are read as misses: {e}")
+            return None
+
+    def get(self, name):
+        data = self._binary_client.get(name)
+        return self._decode(data) if data is not None else None
+
+    def mget(self, keys, *args):
+        return [self._decode(data) if data is not None else None for data in self._binary_client.mget(keys, *args)]
+
+    def set(self, name, value, *args, **kwargs):
+        result = self._binary_client.set(name, self._encode(name, value), *args, **kwargs)
+        self._publish_dictionary()
+        return result
+
+    def setex(self, name, time, value):
+        result = self._binary_client.setex(name, time, self._encode(name, value))
+        self._publish_dictionary()
+        return result
+
+    def pipeline(self, transaction: bool = True, shard_hint=None) -> _CodecPipeline:
+        return _CodecPipeline(self, self._binary_client.pipeline(transaction=transaction, shard_hint=shard_hint))
+
+    @staticmethod
+    def savings() -> dict:
+        counters = metrics.snapshot_counters("redis_payload_raw_bytes", "redis_payload_stored_bytes")
+        raw, stored = counters["redis_payload_raw_bytes"], counters["redis_payload_stored_bytes"]
+        return {kind: round(1 - stored.get(kind, 0) / total, 4) for kind, total in raw.items() if total}
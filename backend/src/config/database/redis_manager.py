@@ -1,16 +1,23 @@
+import asyncio
 import redis
+import redis.asyncio
 import os
 from redis.backoff import ExponentialBackoff
 from redis.retry import Retry
+from redis.asyncio.retry import Retry as AsyncRetry
 
 class RedisManager:
     REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
     REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
     REDIS_DB = int(os.getenv("REDIS_DB", 0))
     REDIS_PASSWORD = os.getenv("REDIS_PASSWORD", None)
+    REDIS_POOL_MAX_SIZE = int(os.getenv("REDIS_POOL_MAX_SIZE", 20))
+
+    pool: redis.ConnectionPool
+    binary_pool: redis.ConnectionPool
+    async_pool: redis.asyncio.ConnectionPool | None = None
+    async_binary_pool: redis.asyncio.ConnectionPool | None = None
 
-    pool: redis.ConnectionPool\
-    
     _instance = None
 
     def __new__(cls):
@@ -23,23 +30,85 @@ class RedisManager:
     def __init__(self):
         if self._initialized:
             return
-        retry_strategy = Retry(ExponentialBackoff(cap=10, base=1), 3)
-        self.pool = redis.ConnectionPool(
+        self.pool = self._build_pool(decode_responses=True)
+        self.binary_pool = self._build_pool(decode_responses=False)
+        self._codec_client = None
+        self._initialized = True
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def _reset_after_fork(self):
+        """a forked worker never reuses the parent's sockets, its pools reconnect on first use"""
+        self.pool.reset()
+        self.binary_pool.reset()
+        self.async_pool = None
+        self.async_binary_pool = None
+
+    def _build_pool(self, decode_responses: bool) -> redis.ConnectionPool:
+        return redis.ConnectionPool(
             host=self.REDIS_HOST,
             port=self.REDIS_PORT,
             password=self.REDIS_PASSWORD,
             db=self.REDIS_DB,
-            decode_responses=True,
-            max_connections=20,
+            decode_responses=decode_responses,
+            max_connections=self.REDIS_POOL_MAX_SIZE,
             socket_timeout=5,
             socket_connect_timeout=5,
-            retry=retry_strategy,
+            retry=Retry(ExponentialBackoff(cap=10, base=1), 3),
             retry_on_timeout=True
         )
-        self._initialized = True
 
     def get_redis_client(self):
         """returns a Redis client instance"""
         return redis.Redis(connection_pool=self.pool)
-    
+
+    def get_binary_redis_client(self) -> redis.Redis:
+        """returns a Redis client that reads and writes raw bytes"""
+        return redis.Redis(connection_pool=self.binary_pool)
+
+    def get_codec_redis_client(self):
+        """returns the shared Redis client storing values through the compact payload codec, used by the agents storage"""
+        if self._codec_client is None:
+            from .redis_codec import REDIS_CODEC_ENABLED, CodecRedisClient, PayloadCodec
+            self._codec_client = CodecRedisClient(self.get_redis_client(), self.get_binary_redis_client(), PayloadCodec.from_env(), write_encoded=REDIS_CODEC_ENABLED)
+        return self._codec_client
+
+    async def load_codec_dictionary(self) -> None:
+        """loads the zstd dictionary of the codec client in a thread at startup, so no request waits on that Redis read"""
+        await asyncio.to_thread(self.get_codec_redis_client().load_current_dictionary)
+
+    def _build_async_pool(self, decode_responses: bool) -> redis.asyncio.ConnectionPool:
+        return redis.asyncio.ConnectionPool(
+            host=self.REDIS_HOST,
+            port=self.REDIS_PORT,
+            password=self.REDIS_PASSWORD,
+            db=self.REDIS_DB,
+            decode_responses=decode_responses,
+            max_connections=self.REDIS_POOL_MAX_SIZE,
+            socket_timeout=5,
+            socket_connect_timeout=5,
+            retry=AsyncRetry(ExponentialBackoff(cap=10, base=1), 3),
+            retry_on_timeout=True
+        )
+
+    def get_async_redis_client(self) -> redis.asyncio.Redis:
+        """returns an asyncio Redis client instance, the pool is created lazily inside the running loop"""
+        if self.async_pool is None:
+            self.async_pool = self._build_async_pool(decode_responses=True)
+        return redis.asyncio.Redis(connection_pool=self.async_pool)
+
+    def get_async_binary_redis_client(self) -> redis.asyncio.Redis:
+        """returns an asyncio Redis client that reads and writes raw bytes, used for serialized payloads"""
+        if self.async_binary_pool is None:
+            self.async_binary_pool = self._build_async_pool(decode_responses=False)
+        return redis.asyncio.Redis(connection_pool=self.async_binary_pool)
+
+    async def disconnect(self):
+        """closes the asyncio pools, sync pool connections are released by redis-py itself"""
+        for pool in (self.async_pool, self.async_binary_pool):
+            if pool is not None:
+                await pool.disconnect()
+        self.async_pool = None
+        self.async_binary_pool = None
+
 redis_manager = RedisManager()
\ No newline at end of file
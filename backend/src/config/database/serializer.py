@@ -0,0 +1,122 @@
+"""Serializers used by the cache backends.
+
+Every serialized value starts with a two bytes header: the format id and the schema version.
+Values written with another schema version are treated as cache misses, so changing the shape
+of cached data only requires bumping CACHE_SCHEMA_VERSION.
+
+msgpack and orjson are optional (performance extra); the JSON serializer falls back to the
+standard library when orjson isn't installed.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from abc import ABC, abstractmethod
+from typing import Any, Optional
+
+try:
+	import msgpack
+except ImportError:  # pragma: no cover - optional dependency
+	msgpack = None
+
+try:
+	import orjson
+except ImportError:  # pragma: no cover - optional dependency
+	orjson = None
+
+
+CACHE_SCHEMA_VERSION = 1
+
+
+class SerializationError(Exception):
+	pass
+
+
+class Serializer(ABC):
+	format_id: int = 0
+
+	def dumps(self, value: Any) -> bytes:
+		try:
+			return bytes((self.format_id, CACHE_SCHEMA_VERSION)) + self._encode(value)
+		except (TypeError, ValueError) as e:
+			raise SerializationError(str(e)) from e
+
+	def loads(self, data: bytes) -> Optional[Any]:
+		"""Returns None when the payload was written by another format or schema version."""
+		if len(data) < 2 or data[0] != self.format_id or data[1] != CACHE_SCHEMA_VERSION:
+			return None
+		return self._decode(memoryview(data)[2:])
+
+	@abstractmethod
+	def _encode(self, value: Any) -> bytes:
+		raise NotImplementedError
+
+	@abstractmethod
+	def _decode(self, data: memoryview) -> Any:
+		raise NotImplementedError
+
+
+def _default(value: Any) -> Any:
+	if hasattr(value, "isoformat"):
+		return value.isoformat()
+	if hasattr(value, "value"):
+		return value.value
+	raise SerializationError(f"Type {type(value).__name__} is not serializable")
+
+
+class MsgpackSerializer(Serializer):
+	format_id = 1
+
+	def __init__(self) -> None:
+		if msgpack is None:
+			raise SerializationError("msgpack is not installed")
+
+	def _encode(self, value: Any) -> bytes:
+		return msgpack.packb(value, default=_default, use_bin_type=True)
+
+	def _decode(self, data: memoryview) -> Any:
+		return msgpack.unpackb(data, raw=False)
+
+
+class JsonSerializer(Serializer):
+	format_id = 2
+
+	def _encode(self, value: Any) -> bytes:
+		if orjson is not None:
+			return orjson.dumps(value, default=_default)
+		return json.dumps(value, default=_default, separators=(",", ":")).encode()
+
+	def _decode(self, data: memoryview) -> Any:
+		if orjson is not None:
+			return orjson.loads(data)
+		return json.loads(bytes(data))
+
+
+class PassthroughSerializer:
+	"""Keeps values as Python objects, for process-local backends where no bytes are needed."""
+
+	def dumps(self, value: Any) -> Any:
+		return value
+
+	def loads(self, data: Any) -> Any:
+		return data
+
+
+def get_default_serializer() -> Serializer:
+	"""Compact binary format when msgpack is available, JSON otherwise (CACHE_SERIALIZER overrides)."""
+	name = os.getenv("CACHE_SERIALIZER", "msgpack" if msgpack is not None else "json").lower()
+	if name == "msgpack":
+		return MsgpackSerializer()
+	return JsonSerializer()
+
+
+__all__ = [
+	"CACHE_SCHEMA_VERSION",
+	"Serializer",
+	"SerializationError",
+	"MsgpackSerializer",
+	"JsonSerializer",
+	"PassthroughSerializer",
+	"get_default_serializer",
+]
@@ -0,0 +1,104 @@
+import asyncio
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from config.llm.micro_batcher import MicroBatcher
+from config.monitory.metrics import metrics
+
+
+class CachingEmbedder:
+    """
+    Wraps an agno embedder with a bounded LRU of query embeddings keyed by (embedder, normalized text):
+    case and whitespace differences share one entry, while the original text is what gets embedded.
+    Async misses are micro-batched, so concurrent queries are embedded in one call (the embedder's batch
+    API when it has one) and identical concurrent queries only once. Documents (the *_and_usage and batch
+    methods agno uses on insert) and everything else go straight to the wrapped embedder.
+    """
+
+    def __init__(self, embedder: Any, max_size: int = 4096, max_batch_size: int = 16, max_wait: float = 0.005):
+        self.embedder = embedder
+        self._max_size = max_size
+        self._entries: OrderedDict[str, List[float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._batcher: MicroBatcher[str, List[float]] = MicroBatcher(self._embed_batch, max_batch_size=max_batch_size, max_wait=max_wait)
+
+    def __getattr__(self, name: str) -> Any:
+        if name == "embedder":
+            raise AttributeError(name)
+        return getattr(self.embedder, name)
+
+    def __deepcopy__(self, memo: dict) -> "CachingEmbedder":
+        # Agent copies share the cache
+        return self
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return " ".join(text.split()).casefold()
+
+    def _key(self, normalized: str) -> str:
+        digest = hashlib.sha1(normalized.encode()).hexdigest()
+        return f"{getattr(self.embedder, 'id', type(self.embedder).__name__)}:{getattr(self.embedder, 'dimensions', '')}:{digest}"
+
+    def _get(self, normalized: str) -> Optional[List[float]]:
+        key = self._key(normalized)
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is not None:
+                self._entries.move_to_end(key)
+        metrics.increment("knowledge_embedding_cache_hits" if embedding is not None else "knowledge_embedding_cache_misses")
+        return embedding
+
+    def _put(self, normalized: str, embedding: List[float]) -> None:
+        with self._lock:
+            self._entries[self._key(normalized)] = embedding
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def get_embedding(self, text: str) -> List[float]:
+        normalized = self.normalize(text)
+        embedding = self._get(normalized)
+        if embedding is None:
+            embedding = self.embedder.get_embedding(text)
+            self._put(normalized, embedding)
+        return embedding
+
+    def get_embedding_and_usage(self, text: str) -> Tuple[List[float], Optional[Dict]]:
+        return self.embedder.get_embedding_and_usage(text)
+
+    async def async_get_embedding(self, text: str) -> List[float]:
+        embedding = self._get(self.normalize(text))
+        if embedding is None:
+            embedding = await self._batcher.submit(text)
+        return embedding
+
+    async def async_get_embedding_and_usage(self, text: str) -> Tuple[List[float], Optional[Dict]]:
+        return await self.embedder.async_get_embedding_and_usage(text)
+
+    async def _embed_batch(self, texts: list[str]) -> list[List[float]]:
+        # One text per normalized key, the first one asked for
+        unique = {}
+        for text in texts:
+            unique.setdefault(self.normalize(text), text)
+        originals = list(unique.values())
+        metrics.observe("knowledge_embedding_batch_size", len(originals))
+        embed_batch = getattr(self.embedder, "async_get_embeddings_batch_and_usage", None)
+        if len(originals) > 1 and callable(embed_batch):
+            embeddings, _ = await embed_batch(originals)
+        else:
+            embeddings = await asyncio.gather(*(self.embedder.async_get_embedding(text) for text in originals))
+        by_key = dict(zip(unique, embeddings))
+        for normalized, embedding in by_key.items():
+            self._put(normalized, embedding)
+        return [by_key[self.normalize(text)] for text in texts]
+
+
+def build_caching_embedder(embedder: Any) -> CachingEmbedder:
+    return CachingEmbedder(
+        embedder,
+        max_size=int(os.getenv("KNOWLEDGE_EMBEDDING_CACHE_SIZE", 4096)),
+        max_batch_size=int(os.getenv("KNOWLEDGE_EMBED_BATCH_SIZE", 16)),
+        max_wait=float(os.getenv("KNOWLEDGE_EMBED_BATCH_WAIT", 0.005)),
+    )
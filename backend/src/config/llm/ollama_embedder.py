@@ -0,0 +1,14 @@
+from typing import Dict, List, Optional, Tuple
+
+from agno.knowledge.embedder.ollama import OllamaEmbedder
+from config.llm.ollama_manager import ollama_manager
+
+
+class OllamaBatchEmbedder(OllamaEmbedder):
+    """Ollama embedder whose async calls are micro-batched by the OllamaManager."""
+
+    async def async_get_embedding(self, text: str) -> List[float]:
+        return await ollama_manager.embed(self.id, text)
+
+    async def async_get_embedding_and_usage(self, text: str) -> Tuple[List[float], Optional[Dict]]:
+        return await self.async_get_embedding(text), None
@@ -0,0 +1,124 @@
+import asyncio
+import contextlib
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator, Optional
+
+from ollama import AsyncClient
+from config.llm.micro_batcher import MicroBatcher
+from config.monitory.metrics import metrics
+
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+
+
+class OllamaManager:
+    """
+    Execution backend for the local Ollama hosts.
+    Models listed in OLLAMA_RESIDENT_MODELS are preloaded at startup and kept loaded with keep_alive,
+    generations are capped per model and queued in arrival order, and embedding calls are micro-batched.
+    Load/unload transitions seen on the host and queue times are exported through the metrics registry.
+    """
+
+    _logger = logging.getLogger(__name__)
+
+    def __init__(self):
+        self.host = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+        self.resident_models = [model.strip() for model in os.getenv("OLLAMA_RESIDENT_MODELS", "").split(",") if model.strip()]
+        self.max_concurrency = int(os.getenv("OLLAMA_MAX_CONCURRENCY_PER_MODEL", 2))
+        self.monitor_interval = float(os.getenv("OLLAMA_MONITOR_INTERVAL", 15))
+        self._client: Optional[AsyncClient] = None
+        self._slots: dict[str, asyncio.Semaphore] = {}
+        self._waiting: dict[str, int] = {}
+        self._running: dict[str, int] = {}
+        self._embedding_batchers: dict[str, MicroBatcher[str, list[float]]] = {}
+        self._loaded_models: set[str] = set()
+        self._monitor_task: Optional[asyncio.Task] = None
+        metrics.register_gauge("ollama", self.get_stats)
+
+    def get_client(self) -> AsyncClient:
+        if self._client is None:
+            self._client = AsyncClient(host=self.host)
+        return self._client
+
+    async def start(self):
+        if not self.resident_models:
+            return
+        results = await asyncio.gather(*(self._preload(model) for model in self.resident_models), return_exceptions=True)
+        for model, result in zip(self.resident_models, results):
+            if isinstance(result, Exception):
+                self._logger.warning(f"Could not preload Ollama model {model}: {result}")
+        self._monitor_task = asyncio.create_task(self._monitor_loop())
+
+    async def close(self):
+        if self._monitor_task is not None:
+            self._monitor_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._monitor_task
+            self._monitor_task = None
+
+    async def _preload(self, model: str):
+        started_at = time.perf_counter()
+        await self.get_client().generate(model=model, prompt="", keep_alive=OLLAMA_KEEP_ALIVE)
+        self._logger.info(f"Ollama model {model} preloaded in {time.perf_counter() - started_at:.2f}s.")
+
+    async def _monitor_loop(self):
+        while True:
+            try:
+                response = await self.get_client().ps()
+                loaded = {model.model for model in response.models}
+                for model in loaded - self._loaded_models:
+                    metrics.increment("ollama_model_loads", model)
+                    self._logger.info(f"Ollama model {model} loaded.")
+                for model in self._loaded_models - loaded:
+                    metrics.increment("ollama_model_unloads", model)
+                    self._logger.warning(f"Ollama model {model} unloaded.")
+                    if model in self.resident_models:
+                        await self._preload(model)
+                self._loaded_models = loaded
+            except Exception as e:
+                self._logger.warning(f"Could not poll Ollama loaded models: {e}")
+            await asyncio.sleep(self.monitor_interval)
+
+    @asynccontextmanager
+    async def generation_slot(self, model: str) -> AsyncGenerator[None, None]:
+        """Waits, in arrival order, for one of the max_concurrency generation slots of the model."""
+        slots = self._slots.setdefault(model, asyncio.Semaphore(self.max_concurrency))
+        self._waiting[model] = self._waiting.get(model, 0) + 1
+        started_at = time.perf_counter()
+        try:
+            await slots.acquire()
+        finally:
+            self._waiting[model] -= 1
+        metrics.observe("ollama_queue_seconds", time.perf_counter() - started_at, model)
+        self._running[model] = self._running.get(model, 0) + 1
+        try:
+            yield
+        finally:
+            self._running[model] -= 1
+            slots.release()
+
+    async def embed(self, model: str, text: str) -> list[float]:
+        batcher = self._embedding_batchers.get(model)
+        if batcher is None:
+            async def embed_batch(texts: list[str]) -> list[list[float]]:
+                metrics.observe("ollama_embedding_batch_size", len(texts), model)
+                response = await self.get_client().embed(model=model, input=texts, keep_alive=OLLAMA_KEEP_ALIVE)
+                return list(response.embeddings)
+            batcher = self._embedding_batchers[model] = MicroBatcher(
+                embed_batch,
+                max_batch_size=int(os.getenv("OLLAMA_EMBED_BATCH_SIZE", 32)),
+                max_wait=float(os.getenv("OLLAMA_EMBED_BATCH_WAIT", 0.005)),
+            )
+        return await batcher.submit(text)
+
+    def get_stats(self) -> dict:
+        return {
+            "loaded_models": sorted(self._loaded_models),
+            "waiting": dict(self._waiting),
+            "running": dict(self._running),
+        }
+
+
+ollama_manager = OllamaManager()
@@ -0,0 +1,43 @@
+import math
+from typing import Optional
+
+SKETCH_GAMMA = 1.05
+
+
+class LatencySketch:
+    """
+    Logarithmic bucket histogram of latencies in milliseconds, bucket i counting the latencies in
+    (gamma^(i-1), gamma^i]. Quantiles have a relative error under (gamma - 1) / 2 and sketches of
+    disjoint periods merge by adding their counts, which the Postgres rollups rely on.
+    """
+
+    def __init__(self, counts: Optional[dict[int, int]] = None, gamma: float = SKETCH_GAMMA):
+        self.gamma = gamma
+        self.counts: dict[int, int] = dict(counts or {})
+
+    @staticmethod
+    def index(latency_ms: float, gamma: float = SKETCH_GAMMA) -> int:
+        return math.ceil(math.log(max(latency_ms, 1)) / math.log(gamma))
+
+    def add(self, index: int, count: int) -> None:
+        self.counts[index] = self.counts.get(index, 0) + count
+
+    def merge(self, other: "LatencySketch") -> "LatencySketch":
+        for index, count in other.counts.items():
+            self.add(index, count)
+        return self
+
+    def total(self) -> int:
+        return sum(self.counts.values())
+
+    def quantile(self, q: float) -> Optional[float]:
+        total = self.total()
+        if total == 0:
+            return None
+        rank = q * (total - 1)
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen > rank:
+                return round(2 * self.gamma ** index / (self.gamma + 1), 2)
+        return None
@@ -0,0 +1,196 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+from config.monitory.metrics import metrics
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+try:
+    from opentelemetry import trace
+except ImportError:  # pragma: no cover - optional dependency
+    trace = None
+
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "trace_id", "span_id"}
+_REDIRECTED_LOGGERS = ("uvicorn", "uvicorn.error", "uvicorn.access", "gunicorn.error", "gunicorn.access")
+
+
+def _dumps(document: dict) -> str:
+    if orjson is not None:
+        return orjson.dumps(document, default=str).decode()
+    return json.dumps(document, default=str)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON document per record, with the trace ids and the extra fields given to the logging call."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        document = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "trace_id", None):
+            document["trace_id"] = record.trace_id
+            document["span_id"] = record.span_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                document[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            document["exception"] = record.exc_text
+        return _dumps(document)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps only a fraction of the records at or below max_level for the configured loggers (and their
+    children), records above it are always kept. Sampled out records are counted per logger.
+    """
+
+    def __init__(self, rates: dict[str, float], max_level: int = logging.DEBUG):
+        super().__init__()
+        self.rates = rates
+        self.max_level = max_level
+        self._resolved: dict[str, Optional[float]] = {}
+
+    @staticmethod
+    def parse(value: str) -> dict[str, float]:
+        rates = {}
+        for item in filter(None, (item.strip() for item in value.split(","))):
+            name, _, rate = item.partition("=")
+            rates[name.strip()] = float(rate)
+        return rates
+
+    def _rate(self, name: str) -> Optional[float]:
+        if name not in self._resolved:
+            rate, candidate = None, name
+            while candidate:
+                if candidate in self.rates:
+                    rate = self.rates[candidate]
+                    break
+                candidate = candidate.rpartition(".")[0]
+            self._resolved[name] = rate
+        return self._resolved[name]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > self.max_level:
+            return True
+        rate = self._rate(record.name)
+        if rate is None or random.random() < rate:
+            return True
+        metrics.increment("log_records_sampled_out", record.name)
+        return False
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Handler of the root logger: it only adds the trace ids of the current span and puts the record in a
+    bounded queue, the listener thread formats and writes it. When the queue is full the record is
+    dropped and counted instead of blocking the caller (usually the event loop).
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if trace is not None:
+            span_context = trace.get_current_span().get_span_context()
+            if span_context.is_valid:
+                record.trace_id = format(span_context.trace_id, "032x")
+                record.span_id = format(span_context.span_id, "016x")
+        record.message = record.getMessage()
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg, record.args, record.exc_info = record.message, None, None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.increment("log_records_dropped", record.levelname)
+
+
+_listener: Optional[QueueListener] = None
+_fork_hook_registered = False
+
+
+def configure_logging() -> None:
+    """
+    Routes every logger (uvicorn's included) through the non-blocking queue handler. Records are written
+    to stdout as JSON, or as text with LOG_FORMAT=text, by a single listener thread.
+    Configured with LOG_LEVEL, LOG_QUEUE_SIZE and LOG_SAMPLE_RATES ("agno=0.1,httpx=0.01", applied to
+    records at or below LOG_SAMPLE_MAX_LEVEL). The listener is paused while the process forks (pre-forked
+    server workers) and started again in the parent and in the child, the thread does not survive the fork.
+    """
+    global _listener, _fork_hook_registered
+    if _listener is not None:
+        return
+    output = logging.StreamHandler(sys.stdout)
+    if os.getenv("LOG_FORMAT", "json").lower() == "text":
+        output.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    else:
+        output.setFormatter(JsonFormatter())
+
+    records: queue.Queue = queue.Queue(maxsize=int(os.getenv("LOG_QUEUE_SIZE", 10000)))
+    handler = NonBlockingQueueHandler(records)
+    rates = SamplingFilter.parse(os.getenv("LOG_SAMPLE_RATES", ""))
+    if rates:
+        handler.addFilter(SamplingFilter(rates, logging.getLevelName(os.getenv("LOG_SAMPLE_MAX_LEVEL", "DEBUG").upper())))
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    for name in _REDIRECTED_LOGGERS:
+        redirected = logging.getLogger(name)
+        redirected.handlers.clear()
+        redirected.propagate = True
+
+    _listener = QueueListener(records, output, respect_handler_level=True)
+    _listener.start()
+    if not _fork_hook_registered:
+        atexit.register(shutdown_logging)
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(before=_pause_listener, after_in_parent=_resume_listener, after_in_child=_start_listener_in_child)
+        _fork_hook_registered = True
+    metrics.register_gauge("logging", lambda: {"queued": records.qsize(), "capacity": records.maxsize})
+
+
+def _pause_listener() -> None:
+    if _listener is not None and _listener._thread is not None:
+        try:
+            _listener.stop()
+        except queue.Full:
+            pass
+
+
+def _resume_listener() -> None:
+    if _listener is not None and _listener._thread is None:
+        _listener.start()
+
+
+def _start_listener_in_child() -> None:
+    # The parent's thread, still set when it could not be paused, does not exist in the child
+    if _listener is not None:
+        _listener._thread = None
+        _listener.start()
+
+
+def shutdown_logging() -> None:
+    """Stops the listener thread after it wrote the records still in the queue."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,90 @@
+import threading
+from collections import deque
+from typing import Callable, Optional
+
+
+class LatencyStats:
+    """Keeps count/sum/max and a bounded reservoir of recent samples to estimate percentiles."""
+
+    def __init__(self, reservoir_size: int = 1024):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._samples: deque[float] = deque(maxlen=reservoir_size)
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+        self._samples.append(value)
+
+    def percentile(self, percentile: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(round(percentile / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "avg": self.total / self.count if self.count else None,
+            "max": self.max,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+        }
+
+
+class MetricsRegistry:
+    """
+    In-process metrics registry exported as JSON by the /metrics endpoint.
+    Counters and latencies are keyed by name plus an optional label, gauges are read on export.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: dict[str, dict[str, float]] = {}
+        self._latencies: dict[str, dict[str, LatencyStats]] = {}
+        self._gauges: dict[str, Callable[[], object]] = {}
+
+    def increment(self, name: str, label: str = "", value: float = 1) -> None:
+        with self._lock:
+            counters = self._counters.setdefault(name, {})
+            counters[label] = counters.get(label, 0) + value
+
+    def observe(self, name: str, value: float, label: str = "") -> None:
+        with self._lock:
+            stats = self._latencies.setdefault(name, {}).get(label)
+            if stats is None:
+                stats = self._latencies[name][label] = LatencyStats()
+            stats.observe(value)
+
+    def get_latency(self, name: str, label: str = "") -> Optional[LatencyStats]:
+        return self._latencies.get(name, {}).get(label)
+
+    def snapshot_counters(self, *names: str) -> dict[str, dict[str, float]]:
+        with self._lock:
+            return {name: dict(self._counters.get(name, {})) for name in names}
+
+    def register_gauge(self, name: str, callback: Callable[[], object]) -> None:
+        self._gauges[name] = callback
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = {name: dict(values) for name, values in self._counters.items()}
+            latencies = {
+                name: {label: stats.snapshot() for label, stats in values.items()}
+                for name, values in self._latencies.items()
+            }
+        gauges = {}
+        for name, callback in self._gauges.items():
+            try:
+                gauges[name] = callback()
+            except Exception as e:
+                gauges[name] = {"error": str(e)}
+        return {"counters": counters, "latencies": latencies, "gauges": gauges}
+
+
+metrics = MetricsRegistry()
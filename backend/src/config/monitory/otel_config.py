@@ -108,7 +108,7 @@ class OpenTelemetryConfig:
 
         if self.enable_logging_instrumentation:
 
-            LoggingInstrumentor().instrument(set_logging_format=False) # We manage format in core/logging.py
+            LoggingInstrumentor().instrument(set_logging_format=False) # Format is managed in config/monitory/logging_config.py
             logger.info("OpenTelemetry: Logging instrumentation enabled.")
 
     def initialize(self, app=None):
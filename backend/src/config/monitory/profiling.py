@@ -0,0 +1,192 @@
+import asyncio
+import contextlib
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+from config.monitory.metrics import metrics
+
+logger = logging.getLogger("Profiling")
+
+
+class StageTimings:
+    """Wall time spent per execution stage of one request, exported as a Server-Timing header."""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.stages: dict[str, float] = {}
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.stages[stage] = self.stages.get(stage, 0) + seconds
+
+    def server_timing(self) -> str:
+        entries = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in self.stages.items()]
+        entries.append(f"total;dur={(time.perf_counter() - self.started_at) * 1000:.1f}")
+        return ", ".join(entries)
+
+
+_current_timings: ContextVar[Optional[StageTimings]] = ContextVar("current_stage_timings", default=None)
+
+
+def start_stage_timings() -> StageTimings:
+    """Collects the stages of the current request, and of the tasks it starts afterwards."""
+    timings = StageTimings()
+    _current_timings.set(timings)
+    return timings
+
+
+def record_stage(stage: str, seconds: float) -> None:
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.add(stage, seconds)
+
+
+@contextlib.contextmanager
+def stage_timer(stage: str) -> Iterator[None]:
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - started_at)
+
+
+def _format_frame(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class LoopLagMonitor:
+    """
+    Measures the event loop lag with a task sleeping interval seconds and a watchdog thread. When the
+    loop did not tick for threshold seconds the watchdog samples the stack of the loop thread (up to
+    stack_samples times per block), and once the loop is back the block is logged with its stacks and
+    kept in the recent reports.
+    """
+
+    def __init__(self, interval: float, threshold: float, stack_samples: int = 3, stack_depth: int = 30, max_reports: int = 50):
+        self.interval = interval
+        self.threshold = threshold
+        self.stack_samples = stack_samples
+        self.stack_depth = stack_depth
+        self.reports: deque[dict] = deque(maxlen=max_reports)
+        self.loop_thread_id: Optional[int] = None
+        self._heartbeat = time.monotonic()
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        metrics.register_gauge("event_loop", lambda: {"blocks_reported": len(self.reports)})
+
+    def start(self) -> None:
+        self.loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._tick())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-lag-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def close(self) -> None:
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        if self._watchdog is not None:
+            await asyncio.to_thread(self._watchdog.join, 1)
+            self._watchdog = None
+
+    async def _tick(self) -> None:
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            metrics.observe("event_loop_lag_seconds", max(now - expected, 0))
+            self._heartbeat = now
+
+    def _sample_loop_stack(self) -> Optional[str]:
+        frame = sys._current_frames().get(self.loop_thread_id)
+        if frame is None:
+            return None
+        return "".join(traceback.format_stack(frame, limit=self.stack_depth))
+
+    def _watch(self) -> None:
+        blocked_since: Optional[float] = None
+        stacks: list[str] = []
+        while not self._stopped.wait(self.threshold / 2):
+            heartbeat = self._heartbeat
+            if blocked_since is not None and heartbeat != blocked_since:
+                self._report(heartbeat - blocked_since - self.interval, stacks)
+                blocked_since, stacks = None, []
+            if time.monotonic() - heartbeat - self.interval >= self.threshold:
+                if blocked_since is None:
+                    blocked_since = heartbeat
+                if len(stacks) < self.stack_samples:
+                    stack = self._sample_loop_stack()
+                    if stack is not None:
+                        stacks.append(stack)
+
+    def _report(self, blocked_seconds: float, stacks: list[str]) -> None:
+        metrics.increment("event_loop_blocked")
+        metrics.observe("event_loop_blocked_seconds", blocked_seconds)
+        self.reports.append({"at": time.time(), "blocked_seconds": round(blocked_seconds, 4), "stacks": stacks})
+        logger.warning(
+            f"Event loop blocked for {blocked_seconds:.3f}s",
+            extra={"blocked_seconds": round(blocked_seconds, 4), "stacks": stacks},
+        )
+
+
+class ProfilerBusy(Exception):
+    pass
+
+
+class SamplingProfiler:
+    """
+    Wall clock sampling profiler of the running worker: the stacks of every thread (or only the event
+    loop thread) are sampled every interval seconds, in a separate thread, and returned in the collapsed
+    format read by flamegraph.pl and speedscope. One capture at a time.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def capture(self, seconds: float, interval: float, thread_id: Optional[int] = None) -> str:
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy("A profile is already being captured")
+        try:
+            own_id = threading.get_ident()
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            counts: Counter[str] = Counter()
+            finish_at = time.monotonic() + seconds
+            while time.monotonic() < finish_at:
+                for ident, frame in sys._current_frames().items():
+                    if ident == own_id or (thread_id is not None and ident != thread_id):
+                        continue
+                    counts[self._collapse(names.get(ident, str(ident)), frame)] += 1
+                time.sleep(interval)
+            return "\n".join(f"{stack} {count}" for stack, count in counts.most_common())
+        finally:
+            self._lock.release()
+
+    @staticmethod
+    def _collapse(thread_name: str, frame) -> str:
+        frames = []
+        while frame is not None:
+            frames.append(_format_frame(frame))
+            frame = frame.f_back
+        return ";".join([thread_name, *reversed(frames)])
+
+
+LOOP_LAG_MONITOR_ENABLED = os.getenv("LOOP_LAG_MONITOR_ENABLED", "true").lower() == "true"
+
+loop_lag_monitor = LoopLagMonitor(
+    interval=float(os.getenv("LOOP_LAG_INTERVAL", 0.05)),
+    threshold=float(os.getenv("LOOP_LAG_THRESHOLD", 0.1)),
+    stack_samples=int(os.getenv("LOOP_LAG_STACK_SAMPLES", 3)),
+)
+sampling_profiler = SamplingProfiler()
@@ -0,0 +1,37 @@
+import asyncio
+import time
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse
+from config.monitory.metrics import metrics
+from config.monitory.profiling import ProfilerBusy, loop_lag_monitor, sampling_profiler
+from controllers.dependencies import require_admin
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["admin"],
+    dependencies=[Depends(require_admin)],
+)
+
+@router.get("/profile", response_class=PlainTextResponse)
+async def capture_profile(
+    seconds: float = Query(default=10, gt=0, le=60),
+    interval_ms: float = Query(default=10, ge=1, le=1000),
+    loop_only: bool = False
+):
+    """Samples this worker for the given seconds, returns the stacks collapsed for flamegraph.pl or speedscope."""
+    thread_id: Optional[int] = loop_lag_monitor.loop_thread_id if loop_only else None
+    try:
+        profile = await asyncio.to_thread(sampling_profiler.capture, seconds, interval_ms / 1000, thread_id)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    return PlainTextResponse(profile, headers={"Content-Disposition": f"attachment; filename=profile-{int(time.time())}.folded"})
+
+@router.get("/event-loop")
+async def get_event_loop_report():
+    lag = metrics.get_latency("event_loop_lag_seconds")
+    return {
+        "lag_seconds": lag.snapshot() if lag is not None else None,
+        "threshold_seconds": loop_lag_monitor.threshold,
+        "blocks": list(loop_lag_monitor.reports),
+    }
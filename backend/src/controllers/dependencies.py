@@ -0,0 +1,95 @@
+import hashlib
+import hmac
+import ipaddress
+import os
+from typing import Optional
+from fastapi import Header, HTTPException, Request, status
+from config.monitory.profiling import StageTimings, start_stage_timings
+from core.agets.deadline import Deadline
+from core.traffic.admission import PriorityClass
+
+BATCH_API_KEYS = {key.strip() for key in os.getenv("ADMISSION_BATCH_API_KEYS", "").split(",") if key.strip()}
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+# Keys that identify their caller (own user id and bucket), any other key is treated like an anonymous call
+RATE_LIMIT_API_KEYS = BATCH_API_KEYS | {key.strip() for key in os.getenv("RATE_LIMIT_API_KEYS", "").split(",") if key.strip()}
+# Identity header set by the gateway once it authenticated the caller, only read on requests coming from the gateway
+GATEWAY_IDENTITY_HEADER = os.getenv("GATEWAY_IDENTITY_HEADER", "").strip().lower()
+GATEWAY_TRUSTED_NETWORKS = [
+    ipaddress.ip_network(network.strip(), strict=False)
+    for network in os.getenv("GATEWAY_TRUSTED_NETWORKS", "").split(",") if network.strip()
+]
+
+
+async def request_deadline(x_request_timeout: Optional[float] = Header(default=None, gt=0)) -> Deadline:
+    return Deadline(x_request_timeout)
+
+
+def _from_gateway(host: Optional[str]) -> bool:
+    if not host or not GATEWAY_TRUSTED_NETWORKS:
+        return False
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(address in network for network in GATEWAY_TRUSTED_NETWORKS)
+
+
+def _gateway_identity(request: Request) -> Optional[str]:
+    if not GATEWAY_IDENTITY_HEADER or not _from_gateway(request.client.host if request.client else None):
+        return None
+    identity = request.headers.get(GATEWAY_IDENTITY_HEADER)
+    return identity[:255] if identity else None
+
+
+def _caller(request: Request, x_api_key: Optional[str]) -> str:
+    """A registered API key (hashed), else the client address. Headers the client is free to change never pick it."""
+    if x_api_key and x_api_key in RATE_LIMIT_API_KEYS:
+        return f"key:{hashlib.sha256(x_api_key.encode()).hexdigest()[:16]}"
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+
+async def request_user_id(
+    request: Request,
+    x_api_key: Optional[str] = Header(default=None)
+) -> str:
+    """
+    User the sessions and memories belong to: the identity verified by the gateway, else the API key or the
+    client address. X-User-Id is never trusted, it would let any caller read another user's memories.
+    """
+    return _gateway_identity(request) or _caller(request, x_api_key)
+
+
+async def rate_limit_subject(
+    request: Request,
+    x_api_key: Optional[str] = Header(default=None)
+) -> str:
+    """Caller the per-user limits apply to, resolved like request_user_id."""
+    identity = _gateway_identity(request)
+    return f"id:{identity}" if identity else _caller(request, x_api_key)
+
+
+async def request_priority(
+    x_priority: Optional[str] = Header(default=None),
+    x_api_key: Optional[str] = Header(default=None)
+) -> PriorityClass:
+    """API keys registered as batch are always batch, otherwise the X-Priority header decides (interactive by default)."""
+    if x_api_key and x_api_key in BATCH_API_KEYS:
+        return PriorityClass.BATCH
+    if x_priority and x_priority.strip().lower() == "batch":
+        return PriorityClass.BATCH
+    return PriorityClass.INTERACTIVE
+
+
+async def request_stage_timings(x_debug_timing: Optional[str] = Header(default=None)) -> Optional[StageTimings]:
+    """Stage timings collected for the request when the client sent X-Debug-Timing: 1."""
+    if x_debug_timing and x_debug_timing.strip().lower() in ("1", "true"):
+        return start_stage_timings()
+    return None
+
+
+async def require_admin(x_admin_token: Optional[str] = Header(default=None)) -> None:
+    """Admin endpoints only exist when ADMIN_TOKEN is set, and need it in the X-Admin-Token header."""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid admin token")
@@ -1,9 +1,30 @@
-from fastapi import APIRouter, Depends
-from models.dto.agents.agentLLM import AgentExecuteOutput
+import os
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from core.agets.deadline import ClientDisconnected, Deadline, DeadlineExceeded, run_with_deadline
+from core.traffic.admission import AdmissionRejected, AdmissionTicket, PriorityClass, admission_controller
+from core.traffic.rate_limiter import RateLimitExceeded, rate_limiter
+from config.monitory.profiling import StageTimings, stage_timer
+from controllers.dependencies import rate_limit_subject, request_deadline, request_priority, request_stage_timings, request_user_id
+from core.agets.session_cache import session_routing_key
+from controllers.responses import etag_matches, not_modified, streamed_json_array, trusted_response
+from core.agets.output_schema import OutputValidationError, output_schema_registry
+from models.dto.agents.agentLLM import AgentExecuteOutput, StreamEventType
 from services.manager_agents import ManagerAgentsService
 from repository.agents_repository import AgentsRepository
+from repository.agents_usage_repository import AgentsUsageRepository
+from repository.tools_repository import ToolsRepository
 from typing import List, Optional
 from models.ui.agents.manage_agents import GetAllAgentsResponse, GetAgentByIdResponse, CreateAgentRequest, CreateAgentResponse, ExecuteAgentRequest
+from models.ui.agents.manage_agents import FanoutExecuteRequest, FanoutExecuteResponse
+
+SESSION_ROUTE_KEY_HEADER = "X-Session-Route-Key"
+SERVER_TIMING_HEADER = "Server-Timing"
+# Non-standard status (nginx) of the requests whose client went away before the answer, never counted as a success
+CLIENT_CLOSED_REQUEST = 499
+# Lets clients and the CDN reuse agent definitions and listings for a few seconds, then revalidate them with If-None-Match
+AGENTS_CACHE_CONTROL = os.getenv("AGENTS_CACHE_CONTROL", "public, max-age=5, stale-while-revalidate=30")
+AGENTS_LIST_MAX_LIMIT = int(os.getenv("AGENTS_LIST_MAX_LIMIT", 1000))
 
 router = APIRouter(
     prefix="/agents",
@@ -13,23 +34,133 @@ router = APIRouter(
 
 async def get_manage_agents_service() -> ManagerAgentsService:
     repository = AgentsRepository()
-    return ManagerAgentsService(repository)
+    return ManagerAgentsService(repository, AgentsUsageRepository(), ToolsRepository())
 
 @router.get("/", response_model=List[GetAllAgentsResponse])
 async def get_all_agents(
     name_part: Optional[str] = None,
-    skip: int = 0,
-    limit: int = 100,
+    skip: int = Query(default=0, ge=0),
+    limit: int = Query(default=100, ge=1, le=AGENTS_LIST_MAX_LIMIT),
+    if_none_match: Optional[str] = Header(default=None),
+    service: ManagerAgentsService = Depends(get_manage_agents_service)
+):
+    headers = {"ETag": await service.get_agents_list_etag(), "Cache-Control": AGENTS_CACHE_CONTROL}
+    if etag_matches(if_none_match, headers["ETag"]):
+        return not_modified(headers)
+    response = await streamed_json_array(service.stream_all_agents(name_part, skip, limit))
+    response.headers.update(headers)
+    return response
+
+@router.post("/execute/fanout", response_model=Optional[FanoutExecuteResponse])
+async def execute_agents_fanout(
+    request: FanoutExecuteRequest,
+    http_request: Request,
+    user_id: str = Depends(request_user_id),
+    subject: str = Depends(rate_limit_subject),
+    deadline: Deadline = Depends(request_deadline),
+    priority: PriorityClass = Depends(request_priority),
     service: ManagerAgentsService = Depends(get_manage_agents_service)
 ):
-    return await service.get_all_agents(name_part, skip, limit)
+    """Runs the prompt on several agents at once, streamed as NDJSON (one result per line) when request.stream is set."""
+    headers = await _check_rate_limit(subject, request.agent_ids)
+    if request.session_id:
+        headers[SESSION_ROUTE_KEY_HEADER] = session_routing_key(request.session_id)
+    try:
+        ticket = await admission_controller.acquire(priority, deadline, weight=len(request.agent_ids))
+    except AdmissionRejected as e:
+        rate_limiter.refund(subject, request.agent_ids)
+        raise _overloaded(e)
+    streaming = False
+    try:
+        results = await run_with_deadline(
+            service.execute_agents_fanout(request.agent_ids, request.prompt, user_id, request.session_id, request.policy, deadline),
+            deadline,
+            http_request.is_disconnected,
+        )
+        results = _record_fanout_tokens(results, subject)
+        if request.stream:
+            streaming = True
+            return StreamingResponse(
+                _stream_fanout_lines(results, ticket),
+                media_type="application/x-ndjson",
+                headers=headers,
+            )
+        collected = await run_with_deadline(
+            _collect(results),
+            deadline,
+            http_request.is_disconnected,
+        )
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail=str(e))
+    except ClientDisconnected as e:
+        raise _client_closed(e)
+    finally:
+        if not streaming:
+            admission_controller.release(ticket)
+    response = trusted_response(FanoutExecuteResponse.model_construct(results=collected))
+    response.headers.update(headers)
+    return response
+
+async def _stream_fanout_lines(results, ticket: AdmissionTicket):
+    # Released here rather than in a background task, which is skipped on client disconnects and errors
+    try:
+        async for result in results:
+            yield result.model_dump_json() + "\n"
+    finally:
+        try:
+            await results.aclose()
+        finally:
+            admission_controller.release(ticket)
+
+async def _collect(results):
+    return [result async for result in results]
+
+async def _record_fanout_tokens(results, subject: str):
+    try:
+        async for result in results:
+            if result.result is not None:
+                rate_limiter.record_tokens(subject, result.agent_id, result.result.total_tokens)
+            yield result
+    finally:
+        await results.aclose()
+
+async def _check_rate_limit(subject: str, agent_ids: list[int]) -> dict[str, str]:
+    try:
+        decision = await rate_limiter.check(subject, agent_ids)
+    except RateLimitExceeded as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e),
+            headers=e.decision.headers(),
+        )
+    return decision.headers() if decision is not None else {}
+
+def _client_closed(e: ClientDisconnected) -> HTTPException:
+    return HTTPException(status_code=CLIENT_CLOSED_REQUEST, detail=str(e))
+
+def _overloaded(e: AdmissionRejected) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail=str(e),
+        headers={"Retry-After": str(e.retry_after)},
+    )
 
 @router.get("/{agent_id}", response_model=GetAgentByIdResponse)
 async def get_agent_by_id(
     agent_id: int,
+    if_none_match: Optional[str] = Header(default=None),
     service: ManagerAgentsService = Depends(get_manage_agents_service)
 ):
-    return await service.get_agent_by_id(agent_id)
+    """Answers If-None-Match with 304 from the cached definition, without rendering it again."""
+    agent_data = await service.get_agent_definition(agent_id)
+    if agent_data is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Agent not found")
+    headers = {"ETag": agent_data["etag"], "Cache-Control": AGENTS_CACHE_CONTROL}
+    if etag_matches(if_none_match, headers["ETag"]):
+        return not_modified(headers)
+    response = trusted_response({field: value for field, value in agent_data.items() if field != "etag"})
+    response.headers.update(headers)
+    return response
 
 
 
@@ -37,14 +168,106 @@ async def get_agent_by_id(
 async def execute_agent_action(
     agent_id: int,
     request: ExecuteAgentRequest,
+    http_request: Request,
+    response: Response,
+    user_id: str = Depends(request_user_id),
+    subject: str = Depends(rate_limit_subject),
+    deadline: Deadline = Depends(request_deadline),
+    priority: PriorityClass = Depends(request_priority),
+    timings: Optional[StageTimings] = Depends(request_stage_timings),
+    service: ManagerAgentsService = Depends(get_manage_agents_service)
+):
+    """With X-Debug-Timing: 1 the time spent in each stage is returned in the Server-Timing header."""
+    with stage_timer("rate_limit"):
+        response.headers.update(await _check_rate_limit(subject, [agent_id]))
+    try:
+        async with admission_controller.admit(priority, deadline):
+            result = await run_with_deadline(
+                service.execute_agent_action(agent_id, request.prompt, user_id, request.session_id),
+                deadline,
+                http_request.is_disconnected,
+            )
+    except AdmissionRejected as e:
+        rate_limiter.refund(subject, [agent_id])
+        raise _overloaded(e)
+    except DeadlineExceeded as e:
+        headers = {SERVER_TIMING_HEADER: timings.server_timing()} if timings is not None else None
+        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail=str(e), headers=headers)
+    except ClientDisconnected as e:
+        raise _client_closed(e)
+    except OutputValidationError as e:
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=str(e))
+    if result is not None:
+        rate_limiter.record_tokens(subject, agent_id, result.total_tokens)
+        response.headers[SESSION_ROUTE_KEY_HEADER] = session_routing_key(result.session_id)
+    if timings is not None:
+        response.headers[SERVER_TIMING_HEADER] = timings.server_timing()
+    return result
+
+@router.post("/{agent_id}/execute/stream")
+async def stream_agent_action(
+    agent_id: int,
+    request: ExecuteAgentRequest,
+    http_request: Request,
+    user_id: str = Depends(request_user_id),
+    subject: str = Depends(rate_limit_subject),
+    deadline: Deadline = Depends(request_deadline),
+    priority: PriorityClass = Depends(request_priority),
     service: ManagerAgentsService = Depends(get_manage_agents_service)
 ):
-    #TODO: pass user_id from header or token
-    return await service.execute_agent_action(agent_id, request.prompt, "", request.session_id) 
+    """
+    Streams the execution as NDJSON events: output deltas, partial objects validated against the agent's
+    output schema (agents.output_parser) as they complete, then a final (or error) event.
+    """
+    headers = await _check_rate_limit(subject, [agent_id])
+    if request.session_id:
+        headers[SESSION_ROUTE_KEY_HEADER] = session_routing_key(request.session_id)
+    try:
+        ticket = await admission_controller.acquire(priority, deadline)
+    except AdmissionRejected as e:
+        rate_limiter.refund(subject, [agent_id])
+        raise _overloaded(e)
+    streaming = False
+    try:
+        events = await run_with_deadline(
+            service.stream_agent_action(agent_id, request.prompt, user_id, request.session_id, deadline),
+            deadline,
+            http_request.is_disconnected,
+        )
+        if events is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Agent not found")
+        streaming = True
+        return StreamingResponse(
+            (event.model_dump_json(exclude_none=True) + "\n" async for event in _record_stream_tokens(events, subject, agent_id, ticket)),
+            media_type="application/x-ndjson",
+            headers=headers,
+        )
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail=str(e))
+    except ClientDisconnected as e:
+        raise _client_closed(e)
+    finally:
+        if not streaming:
+            admission_controller.release(ticket)
+
+async def _record_stream_tokens(events, subject: str, agent_id: int, ticket: AdmissionTicket):
+    try:
+        async for event in events:
+            if event.type == StreamEventType.FINAL:
+                rate_limiter.record_tokens(subject, agent_id, event.total_tokens or 0)
+            yield event
+    finally:
+        try:
+            await events.aclose()
+        finally:
+            admission_controller.release(ticket)
 
 @router.post("/", response_model=CreateAgentResponse)
 async def create_agent(
     request: CreateAgentRequest,
     service: ManagerAgentsService = Depends(get_manage_agents_service)
 ):
+    output_parser_error = output_schema_registry.validation_error(request.output_parser)
+    if output_parser_error is not None:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=output_parser_error)
     return await service.create_agent(request)
\ No newline at end of file
@@ -0,0 +1,10 @@
+from fastapi import APIRouter
+from config.monitory.metrics import metrics
+
+router = APIRouter(
+    tags=["monitory"],
+)
+
+@router.get("/metrics")
+async def get_metrics():
+    return metrics.snapshot()
@@ -0,0 +1,87 @@
+import json
+from typing import Any, AsyncIterator, Iterable, Optional, Union
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel
+
+try:
+    import orjson
+    from fastapi.responses import ORJSONResponse
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+    ORJSONResponse = None
+
+DefaultJSONResponse = ORJSONResponse if orjson is not None else JSONResponse
+
+
+def trusted_response(content: Union[BaseModel, Iterable[BaseModel], dict, Any], status_code: int = 200) -> Response:
+    """
+    Renders data that was already validated (built from the database or the cache) straight to JSON,
+    skipping the second validation FastAPI runs against the route response_model.
+    """
+    if isinstance(content, BaseModel):
+        content = content.model_dump(mode="json")
+    elif isinstance(content, list):
+        content = [item.model_dump(mode="json") if isinstance(item, BaseModel) else item for item in content]
+    return DefaultJSONResponse(content=content, status_code=status_code)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of If-None-Match against the current ETag, as RFC 9110 requires for GET."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(candidate.strip().removeprefix("W/") == etag for candidate in if_none_match.split(","))
+
+
+def not_modified(headers: dict[str, str]) -> Response:
+    return Response(status_code=304, headers=headers)
+
+
+def _dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, separators=(",", ":")).encode()
+
+
+async def _json_array_chunks(items: AsyncIterator[Any], batch_size: int) -> AsyncIterator[bytes]:
+    try:
+        buffer = [b"["]
+        count = 0
+        async for item in items:
+            if count:
+                buffer.append(b",")
+            buffer.append(_dumps(item))
+            count += 1
+            if count % batch_size == 0:
+                yield b"".join(buffer)
+                buffer = []
+        buffer.append(b"]")
+        yield b"".join(buffer)
+    finally:
+        await items.aclose()
+
+
+async def streamed_json_array(items: AsyncIterator[Any], batch_size: int = 100) -> Response:
+    """
+    Streams a JSON array of trusted items as they are produced, batch_size items per chunk. The first
+    chunk is produced before the response starts, so a failure to start (e.g. the database is down)
+    still ends in a regular error response.
+    """
+    chunks = _json_array_chunks(items, batch_size)
+    try:
+        first_chunk = await anext(chunks)
+    except BaseException:
+        await chunks.aclose()
+        raise
+
+    async def body() -> AsyncIterator[bytes]:
+        # Closed on client disconnects, errors and cancellation, releasing what the items hold
+        try:
+            yield first_chunk
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            await chunks.aclose()
+
+    return StreamingResponse(body(), media_type="application/json")
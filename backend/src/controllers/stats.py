@@ -0,0 +1,29 @@
+from fastapi import APIRouter, Depends, Query
+from controllers.responses import trusted_response
+from models.ui.stats.agent_stats import AgentStatsResponse, StatsGranularity, StatsResponse
+from repository.agent_stats_repository import AgentStatsRepository
+from services.agent_stats import AgentStatsService
+
+router = APIRouter(
+    tags=["stats"],
+)
+
+async def get_agent_stats_service() -> AgentStatsService:
+    return AgentStatsService(AgentStatsRepository())
+
+@router.get("/agents/{agent_id}/stats", response_model=AgentStatsResponse)
+async def get_agent_stats(
+    agent_id: int,
+    hours: int = Query(default=24, ge=1, le=24 * 90),
+    granularity: StatsGranularity = StatsGranularity.HOUR,
+    service: AgentStatsService = Depends(get_agent_stats_service)
+):
+    return trusted_response(await service.get_agent_stats(agent_id, hours, granularity))
+
+@router.get("/stats", response_model=StatsResponse)
+async def get_stats(
+    hours: int = Query(default=24, ge=1, le=24 * 90),
+    granularity: StatsGranularity = StatsGranularity.HOUR,
+    service: AgentStatsService = Depends(get_agent_stats_service)
+):
+    return trusted_response(await service.get_stats(hours, granularity))
@@ -0,0 +1,48 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from agno.agent.agent import Agent
+from models.dto.agents.agentLLM import AgentFactoryInput
+
+
+class BuiltAgentCache:
+    """
+    Process-local LRU of built agno agents keyed by the agent definition fingerprint,
+    so a definition change produces a new entry instead of reusing a stale agent.
+    """
+
+    def __init__(self, max_size: int = 128):
+        self._max_size = max_size
+        self._agents: OrderedDict[str, Agent] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def fingerprint(agent_factory_input: AgentFactoryInput) -> str:
+        return hashlib.sha1(agent_factory_input.model_dump_json().encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Agent]:
+        with self._lock:
+            agent = self._agents.get(key)
+            if agent is not None:
+                self._agents.move_to_end(key)
+            return agent
+
+    def put(self, key: str, agent: Agent) -> None:
+        with self._lock:
+            self._agents[key] = agent
+            self._agents.move_to_end(key)
+            while len(self._agents) > self._max_size:
+                self._agents.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._agents.clear()
+
+    def __len__(self) -> int:
+        return len(self._agents)
+
+
+built_agent_cache = BuiltAgentCache(max_size=int(os.getenv("AGENT_CACHE_MAX_SIZE", 128)))
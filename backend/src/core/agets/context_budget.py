@@ -0,0 +1,227 @@
+import asyncio
+import copy
+import inspect
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from agno.agent import Agent
+from agno.db.base import SessionType
+from agno.models.message import Message
+from config.database.redis_manager import redis_manager
+from .session_cache import session_cache
+
+logger = logging.getLogger("ContextBudgeter")
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a conversation between a user and an assistant. "
+    "Merge the previous summary with the new turns into a single concise summary that keeps "
+    "facts, decisions, user preferences and open questions. Answer only with the summary."
+)
+
+
+@dataclass
+class ContextPlan:
+    num_history_runs: int
+    total_runs: int
+    summary: Optional[str]
+    summarized_runs: int
+    history_tokens: int
+    memory_tokens: int
+    # Set only when memories had to be dropped to fit the ceiling, the memories the run sees
+    memories: Optional[list] = None
+
+
+class _ScopedMemoryManager:
+    """Memory manager of a single run: reads return the memories kept by the plan, everything else (agentic updates) goes to the shared one."""
+
+    def __init__(self, memory_manager, memories: list):
+        self._memory_manager = memory_manager
+        self._memories = memories
+
+    def get_user_memories(self, user_id: Optional[str] = None) -> list:
+        return list(self._memories)
+
+    async def aget_user_memories(self, user_id: Optional[str] = None) -> list:
+        return list(self._memories)
+
+    def __getattr__(self, name):
+        return getattr(self._memory_manager, name)
+
+
+class ContextBudgeter:
+    """
+    Keeps the history and memories sent by stateful agents under a token ceiling.
+    The most recent runs are kept verbatim and older runs are replaced by a summary stored
+    beside the session in Redis, refreshed in background once a batch of runs has left the recent window.
+    Memories that don't fit the ceiling are left out of the run, oldest first.
+    """
+
+    def __init__(self):
+        self.default_token_ceiling = int(os.getenv("CONTEXT_TOKEN_CEILING", 8000))
+        self.max_recent_runs = int(os.getenv("CONTEXT_MAX_RECENT_RUNS", 5))
+        # Runs past the recent window folded into the summary per refresh, i.e. one summarization call every N runs
+        self.summary_batch_runs = max(1, int(os.getenv("CONTEXT_SUMMARY_BATCH_RUNS", 5)))
+        self.summary_ttl = int(os.getenv("CONTEXT_SUMMARY_TTL", 30 * 86400))
+        self._refreshing: set[str] = set()
+        self._background_tasks: set[asyncio.Task] = set()
+
+    @staticmethod
+    def count_tokens(text: Optional[str]) -> int:
+        """Cheap approximation (~4 characters per token), accurate enough to budget the context."""
+        if not text:
+            return 0
+        return len(text) // 4 + 1
+
+    @staticmethod
+    def _run_text(run) -> str:
+        run_input = getattr(run, "input", None)
+        input_content = getattr(run_input, "input_content", None) if run_input is not None else None
+        content = getattr(run, "content", None)
+        return f"user: {input_content if isinstance(input_content, str) else json.dumps(input_content, default=str)}\nassistant: {content if isinstance(content, str) else json.dumps(content, default=str)}"
+
+    @staticmethod
+    def _summary_key(agent: Agent, session_id: str) -> str:
+        return f"{getattr(agent.db, 'db_prefix', 'agno')}:session_summaries:{session_id}"
+
+    async def _get_summary(self, agent: Agent, session_id: str) -> dict:
+        key = self._summary_key(agent, session_id)
+        cached = session_cache.get(key, "summary")
+        if cached is not None:
+            return cached
+        raw = await redis_manager.get_async_redis_client().get(key)
+        summary_record = json.loads(raw) if raw else {}
+        session_cache.put(key, summary_record)
+        return summary_record
+
+    @staticmethod
+    async def _db_call(method, **kwargs):
+        """Awaits the async storages (PostgresAgentDb), runs the blocking ones (RedisDb) in a thread."""
+        if inspect.iscoroutinefunction(method):
+            return await method(**kwargs)
+        return await asyncio.to_thread(method, **kwargs)
+
+    async def _get_runs(self, agent: Agent, session_id: str) -> list:
+        session = await self._db_call(agent.db.get_session, session_id=session_id, session_type=SessionType.AGENT)
+        return list(getattr(session, "runs", None) or [])
+
+    @staticmethod
+    def _updated_at(memory) -> float:
+        updated_at = getattr(memory, "updated_at", None)
+        if isinstance(updated_at, datetime):
+            return updated_at.timestamp()
+        return float(updated_at or 0)
+
+    def _fit_memories(self, memories: list, budget: int) -> tuple[list, int]:
+        """Keeps the most recently updated memories within the budget, in their original order."""
+        kept = set()
+        tokens = 0
+        for index in sorted(range(len(memories)), key=lambda i: self._updated_at(memories[i]), reverse=True):
+            memory_tokens = self.count_tokens(getattr(memories[index], "memory", None))
+            if tokens + memory_tokens > budget:
+                continue
+            kept.add(index)
+            tokens += memory_tokens
+        return [memory for index, memory in enumerate(memories) if index in kept], tokens
+
+    async def plan(self, agent: Agent, session_id: str, user_id: str, token_ceiling: Optional[int]) -> ContextPlan:
+        ceiling = token_ceiling or self.default_token_ceiling
+        runs, memories, summary_record = await asyncio.gather(
+            self._get_runs(agent, session_id),
+            self._db_call(agent.db.get_user_memories, user_id=user_id),
+            self._get_summary(agent, session_id),
+        )
+        memories = list(memories or [])
+        summary = summary_record.get("summary")
+        summary_tokens = self.count_tokens(summary)
+        kept_memories, memory_tokens = self._fit_memories(memories, max(ceiling - summary_tokens, 0))
+        if len(kept_memories) < len(memories):
+            logger.warning(f"Left {len(memories) - len(kept_memories)} oldest memories of session {session_id} out of the {ceiling} tokens ceiling.")
+        remaining = ceiling - memory_tokens - summary_tokens
+
+        # Runs not summarized yet stay verbatim, at most a batch past the recent window until the next refresh
+        summarized_runs = min(int(summary_record.get("summarized_runs", 0)), len(runs))
+        window = self.max_recent_runs + self.summary_batch_runs - 1
+        num_history_runs = 0
+        history_tokens = 0
+        for run in reversed(runs[summarized_runs:][-window:]):
+            run_tokens = self.count_tokens(self._run_text(run))
+            if history_tokens + run_tokens > remaining:
+                break
+            history_tokens += run_tokens
+            num_history_runs += 1
+
+        return ContextPlan(
+            num_history_runs=num_history_runs,
+            total_runs=len(runs),
+            summary=summary if len(runs) > num_history_runs else None,
+            summarized_runs=summarized_runs,
+            history_tokens=history_tokens,
+            memory_tokens=memory_tokens,
+            memories=kept_memories if len(kept_memories) < len(memories) else None,
+        )
+
+    @staticmethod
+    def apply(agent: Agent, plan: ContextPlan) -> Agent:
+        """
+        Returns a run scoped copy of the shared agent with the planned history window, summary and memories.
+        A shallow copy: agno 2.3 arun takes no history size nor additional context per call, and the copy
+        shares the model, tools and storage exactly like concurrent runs of the shared agent do.
+        """
+        run_agent = copy.copy(agent)
+        run_agent.add_history_to_context = plan.num_history_runs > 0
+        run_agent.num_history_runs = plan.num_history_runs
+        if plan.summary:
+            summary_context = f"Summary of the earlier conversation:\n{plan.summary}"
+            run_agent.additional_context = f"{agent.additional_context}\n{summary_context}" if agent.additional_context else summary_context
+        if plan.memories is not None and agent.memory_manager is not None:
+            run_agent.memory_manager = _ScopedMemoryManager(agent.memory_manager, plan.memories)
+        return run_agent
+
+    def schedule_refresh(self, agent: Agent, session_id: str, plan: ContextPlan) -> None:
+        """Refreshes the session summary after the run so summarization never adds latency to a run."""
+        # The run just stored adds one to the session, a refresh is only due once a whole batch left the recent window
+        if plan.total_runs + 1 - min(plan.num_history_runs, self.max_recent_runs) - plan.summarized_runs < self.summary_batch_runs:
+            return
+        if session_id in self._refreshing:
+            return
+        self._refreshing.add(session_id)
+        task = asyncio.create_task(self._refresh_summary(agent, session_id, plan.num_history_runs))
+        self._background_tasks.add(task)
+        task.add_done_callback(lambda t: self._on_refresh_done(t, session_id))
+
+    def _on_refresh_done(self, task: asyncio.Task, session_id: str) -> None:
+        self._background_tasks.discard(task)
+        self._refreshing.discard(session_id)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Failed to refresh summary of session {session_id}: {task.exception()}")
+
+    async def _refresh_summary(self, agent: Agent, session_id: str, keep_recent_runs: int) -> None:
+        runs, summary_record = await asyncio.gather(
+            self._get_runs(agent, session_id),
+            self._get_summary(agent, session_id),
+        )
+        summarized_runs = int(summary_record.get("summarized_runs", 0))
+        summarize_until = len(runs) - min(keep_recent_runs, self.max_recent_runs)
+        if summarize_until - summarized_runs < self.summary_batch_runs:
+            return
+
+        new_turns = "\n\n".join(self._run_text(run) for run in runs[summarized_runs:summarize_until])
+        previous_summary = summary_record.get("summary") or "(empty)"
+        response = await agent.model.aresponse(messages=[
+            Message(role="system", content=SUMMARY_PROMPT),
+            Message(role="user", content=f"Previous summary:\n{previous_summary}\n\nNew turns:\n{new_turns}"),
+        ])
+        if not response.content:
+            return
+        summary_record = {"summary": response.content, "summarized_runs": summarize_until, "updated_at": int(time.time())}
+        key = self._summary_key(agent, session_id)
+        await redis_manager.get_async_redis_client().set(key, json.dumps(summary_record), ex=self.summary_ttl)
+        session_cache.put(key, summary_record)
+
+
+context_budgeter = ContextBudgeter()
@@ -0,0 +1,119 @@
+import asyncio
+import contextlib
+import contextvars
+import inspect
+import os
+import time
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Coroutine, Optional, TypeVar
+
+from config.monitory.metrics import metrics
+from config.monitory.profiling import stage_timer
+
+T = TypeVar("T")
+
+DEFAULT_TIMEOUT = float(os.getenv("AGENT_DEFAULT_TIMEOUT", 120))
+MAX_TIMEOUT = float(os.getenv("AGENT_MAX_TIMEOUT", 600))
+
+
+class DeadlineExceeded(Exception):
+    def __init__(self, stage: str):
+        super().__init__(f"Request deadline exceeded during {stage}")
+        self.stage = stage
+
+
+class ClientDisconnected(Exception):
+    def __init__(self):
+        super().__init__("Client closed the request")
+
+
+class Deadline:
+    """
+    Request deadline propagated through a ContextVar to every stage of an agent execution.
+    A deadline given by the client (explicit) wins over the agent's own timeout.
+    """
+
+    def __init__(self, seconds: Optional[float] = None):
+        self.explicit = seconds is not None
+        self.started_at = time.monotonic()
+        self.expires_at = self.started_at + min(seconds if seconds is not None else DEFAULT_TIMEOUT, MAX_TIMEOUT)
+
+    def apply_agent_timeout(self, seconds: Optional[float]) -> None:
+        if seconds and not self.explicit:
+            self.expires_at = self.started_at + min(seconds, MAX_TIMEOUT)
+
+    def remaining(self) -> float:
+        return self.expires_at - time.monotonic()
+
+
+_current_deadline: ContextVar[Optional[Deadline]] = ContextVar("current_deadline", default=None)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current_deadline.get()
+
+
+def remaining_time(default: Optional[float] = None) -> Optional[float]:
+    """Seconds left for the current request, bounded by default when given."""
+    deadline = _current_deadline.get()
+    if deadline is None:
+        return default
+    remaining = max(deadline.remaining(), 0)
+    return remaining if default is None else min(remaining, default)
+
+
+async def run_stage(stage: str, awaitable: Awaitable[T]) -> T:
+    """Awaits one stage of the execution bounded by the current deadline, counting timeouts and timing it per stage."""
+    timeout = remaining_time()
+    if timeout is not None and timeout <= 0:
+        if inspect.iscoroutine(awaitable):
+            awaitable.close()
+        metrics.increment("deadline_timeouts", stage)
+        raise DeadlineExceeded(stage)
+    try:
+        with stage_timer(stage):
+            return await asyncio.wait_for(awaitable, timeout=timeout)
+    except asyncio.TimeoutError:
+        metrics.increment("deadline_timeouts", stage)
+        raise DeadlineExceeded(stage)
+
+
+def start_in_deadline(coroutine: Coroutine[object, object, T], deadline: Deadline) -> asyncio.Task[T]:
+    """Starts the coroutine in a task bound to the deadline, for work outliving the caller's context."""
+    context = contextvars.copy_context()
+    context.run(_current_deadline.set, deadline)
+    return asyncio.create_task(coroutine, context=context)
+
+
+async def run_with_deadline(
+    awaitable: Awaitable[T],
+    deadline: Deadline,
+    is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+    poll_interval: float = 0.5,
+) -> T:
+    """
+    Runs the awaitable in a task scoped to the deadline and cancels it cooperatively when the
+    client disconnects, then raises ClientDisconnected.
+    """
+
+    async def scoped() -> T:
+        _current_deadline.set(deadline)
+        return await awaitable
+
+    task = asyncio.create_task(scoped())
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                return task.result()
+            if is_disconnected is not None and await is_disconnected():
+                metrics.increment("client_disconnects")
+                task.cancel()
+                with contextlib.suppress(asyncio.CancelledError, Exception):
+                    await task
+                raise ClientDisconnected()
+    finally:
+        if not task.done():
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError, Exception):
+                await task
@@ -1,33 +1,197 @@
+import asyncio
+import contextlib
 from datetime import datetime, timedelta
 from .factory_agent import FactoryAgent
+from .context_budget import context_budgeter
+from .deadline import Deadline, DeadlineExceeded, run_stage
+from .guardrails import AgentGuardrails
+from .postgres_agent_db import PostgresAgentDb
+from .output_schema import OutputSchema, PartialOutput, output_schema_registry
+from .provider_router import ProviderCandidate, provider_router
+from .prompt_cache import prompt_cache_manager
+from core.tools.tool_registry import tool_registry
+from config.llm.ollama_manager import ollama_manager
+from config.monitory.metrics import metrics
+from config.monitory.profiling import stage_timer
 from agno.agent import Agent, RunOutput
-from models.dto.agents.agentLLM import AgentFactoryInput, AgentExecuteOutput
+from agno.run.agent import RunCompletedEvent, RunContentEvent
+from models.dto.agents.agentLLM import AgentFactoryInput, AgentExecuteOutput, AgentStreamEvent, ModelLLM, StreamEventType
 from uuid import uuid4
-from typing import Optional
+from typing import AsyncIterator, Optional
+
+
+class PreparedRun:
+    """An agent execution past guardrails and memory preparation, ready to call the model."""
+
+    def __init__(self, agent: AgentFactoryInput, agent_instance: Agent, user_input: str, session_id: str, user_id: str, context_plan):
+        self.agent = agent
+        self.agent_instance = agent_instance
+        self.user_input = user_input
+        self.session_id = session_id
+        self.user_id = user_id
+        self.context_plan = context_plan
+
 
 class ExecuteAgent:
 
-    #TODO: verify content type case is not a string
     @staticmethod
-    async def run_agent(agent: AgentFactoryInput, user_input: str, session_id: Optional[str], user_id: str, prune_memory: bool = True) -> AgentExecuteOutput:
+    async def prepare_run(
+        agent: AgentFactoryInput,
+        user_input: str,
+        session_id: Optional[str],
+        user_id: str,
+        prune_memory: bool = True,
+        check_guardrails: bool = True
+    ) -> PreparedRun:
+        """check_guardrails=False when the caller already checked the input, e.g. once for a fan-out."""
         if session_id is None:
             session_id = str(uuid4())
-        agent_instance: Agent = FactoryAgent.build_agent(agent)
-        if prune_memory:
-            ExecuteAgent._prune_old_memories(agent_instance.db, user_id)
-
-        response: RunOutput = await agent_instance.arun(
-            user_input,
-            session_id=session_id,
-            user_id=user_id
-        )
-        agentExecuteOutput = AgentExecuteOutput(
-            response=response.content,
-            session_id=session_id,
-            content_type=response.content_type
-        )
+        with stage_timer("agent_build"):
+            agent_instance: Agent = FactoryAgent.get_or_build_agent(agent)
+        if check_guardrails:
+            await run_stage("guardrails", AgentGuardrails.check(user_input))
+
+        context_plan = None
+        if agent.has_storage and agent_instance.db is not None:
+            # PostgresAgentDb retention runs in the background (AgentMemoryRetentionService)
+            if prune_memory and not isinstance(agent_instance.db, PostgresAgentDb):
+                await run_stage("memory", asyncio.to_thread(ExecuteAgent._prune_old_memories, agent_instance.db, user_id))
+            context_plan = await run_stage("memory", context_budgeter.plan(agent_instance, session_id, user_id, agent.context_token_ceiling))
+        return PreparedRun(agent, agent_instance, user_input, session_id, user_id, context_plan)
+
+    #TODO: verify content type case is not a string
+    @staticmethod
+    async def run_agent(
+        agent: AgentFactoryInput,
+        user_input: str,
+        session_id: Optional[str],
+        user_id: str,
+        prune_memory: bool = True,
+        check_guardrails: bool = True
+    ) -> AgentExecuteOutput:
+        """check_guardrails=False when the caller already checked the input, e.g. once for a fan-out."""
+        run = await ExecuteAgent.prepare_run(agent, user_input, session_id, user_id, prune_memory, check_guardrails)
+        candidates = [
+            ExecuteAgent._provider_candidate(candidate_input, user_input, run.session_id, user_id, run.context_plan)
+            for candidate_input in ExecuteAgent._provider_chain(agent)
+        ]
+        response: RunOutput = await run_stage("llm", provider_router.run(candidates, hedge=ExecuteAgent._can_hedge(agent)))
+        ExecuteAgent._after_run(run, response.metrics)
+        schema = output_schema_registry.for_agent(agent)
+        with stage_timer("output"):
+            if schema is not None:
+                parsed, repaired = schema.parse(response.content)
+                return AgentExecuteOutput(
+                    response=parsed.model_dump_json(),
+                    session_id=run.session_id,
+                    content_type="json",
+                    total_tokens=getattr(response.metrics, "total_tokens", 0) or 0,
+                    parsed=parsed.model_dump(mode="json"),
+                    repaired=repaired
+                )
+            agentExecuteOutput = AgentExecuteOutput(
+                response=response.content,
+                session_id=run.session_id,
+                content_type=response.content_type,
+                total_tokens=getattr(response.metrics, "total_tokens", 0) or 0
+            )
         return agentExecuteOutput
+
+    @staticmethod
+    async def stream_agent(run: PreparedRun, deadline: Deadline) -> AsyncIterator[AgentStreamEvent]:
+        """
+        Streams the output of a prepared run on its primary provider (a stream can't fail over once started).
+        With an output schema, chunks completing values are followed by the partial object validated so far
+        (re-parsed as the output grows, see PartialOutput), and the final event carries the validated (or repaired) object.
+        """
+        schema = output_schema_registry.for_agent(run.agent)
+        run_instance = await ExecuteAgent._run_instance(run.agent, run.context_plan)
+        async with ExecuteAgent._generation_slot(run.agent):
+            stream = run_instance.arun(run.user_input, session_id=run.session_id, user_id=run.user_id, stream=True)
+            output = PartialOutput(schema)
+            completed = None
+            try:
+                while True:
+                    try:
+                        event = await asyncio.wait_for(anext(stream), timeout=max(deadline.remaining(), 0))
+                    except StopAsyncIteration:
+                        break
+                    except asyncio.TimeoutError:
+                        metrics.increment("deadline_timeouts", "llm")
+                        raise DeadlineExceeded("llm")
+                    if isinstance(event, RunCompletedEvent):
+                        completed = event
+                    elif isinstance(event, RunContentEvent) and isinstance(event.content, str) and event.content:
+                        yield AgentStreamEvent(type=StreamEventType.DELTA, content=event.content)
+                        partial = output.feed(event.content)
+                        if partial is not None:
+                            yield AgentStreamEvent(type=StreamEventType.PARTIAL, data=partial)
+            finally:
+                await stream.aclose()
+        yield ExecuteAgent._final_event(run, schema, output.text(), completed)
+
+    @staticmethod
+    def _final_event(run: PreparedRun, schema: Optional[OutputSchema], content: str, completed) -> AgentStreamEvent:
+        run_metrics = getattr(completed, "metrics", None)
+        ExecuteAgent._after_run(run, run_metrics)
+        total_tokens = getattr(run_metrics, "total_tokens", 0) or 0
+        if schema is None:
+            return AgentStreamEvent(type=StreamEventType.FINAL, content=content, session_id=run.session_id, total_tokens=total_tokens)
+        parsed, repaired = schema.parse(content)
+        return AgentStreamEvent(
+            type=StreamEventType.FINAL,
+            data=parsed.model_dump(mode="json"),
+            session_id=run.session_id,
+            repaired=repaired,
+            total_tokens=total_tokens
+        )
+
+    @staticmethod
+    def _after_run(run: PreparedRun, run_metrics) -> None:
+        prompt_cache_manager.record_usage(run.agent, run_metrics)
+        if run.context_plan is not None:
+            context_budgeter.schedule_refresh(run.agent_instance, run.session_id, run.context_plan)
     
+    @staticmethod
+    def _provider_chain(agent: AgentFactoryInput) -> list[AgentFactoryInput]:
+        chain = [agent]
+        for fallback in agent.fallback_models:
+            chain.append(agent.model_copy(update={"modelLLM": fallback.modelLLM, "typeModel": fallback.typeModel, "fallback_models": []}))
+        return chain
+
+    @staticmethod
+    def _provider_candidate(agent: AgentFactoryInput, user_input: str, session_id: str, user_id: str, context_plan) -> ProviderCandidate:
+        async def run() -> RunOutput:
+            run_instance = await ExecuteAgent._run_instance(agent, context_plan)
+            async with ExecuteAgent._generation_slot(agent):
+                return await run_instance.arun(user_input, session_id=session_id, user_id=user_id)
+        return ProviderCandidate(str(agent.modelLLM), agent.typeModel, run)
+
+    @staticmethod
+    async def _run_instance(agent: AgentFactoryInput, context_plan) -> Agent:
+        gemini_cached_content = await prompt_cache_manager.get_gemini_cached_content(agent)
+        run_instance = FactoryAgent.get_or_build_agent(agent, gemini_cached_content)
+        if context_plan is not None:
+            run_instance = context_budgeter.apply(run_instance, context_plan)
+        return run_instance
+
+    @staticmethod
+    def _generation_slot(agent: AgentFactoryInput):
+        if agent.modelLLM == ModelLLM.OLLAMA:
+            return ollama_manager.generation_slot(agent.typeModel)
+        return contextlib.nullcontext()
+
+    @staticmethod
+    def _can_hedge(agent: AgentFactoryInput) -> bool:
+        """Hedging duplicates the request, so it is off for stateful sessions and tools with side effects."""
+        if agent.has_storage or not agent.fallback_models:
+            return False
+        for tool_id in agent.tools or []:
+            settings = tool_registry.get_tool_settings(tool_id)
+            if settings is None or settings.has_side_effects:
+                return False
+        return True
+
     @staticmethod
     def _prune_old_memories(db, user_id, days=30):
         """Remove memories older than 30 days"""
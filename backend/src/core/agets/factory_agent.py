@@ -10,13 +10,19 @@ from agno.models.ollama import Ollama
 from agno.tools.toolkit import Toolkit
 from agno.tools.function import Function
 from agno.db.redis import RedisDb
+from agno.memory import MemoryManager
 from config.database.qdrant_manager import qdrant_manager
+from core.tools.tool_registry import tool_registry
 from agno.knowledge.knowledge import Knowledge
-from agno.guardrails import PIIDetectionGuardrail
-from agno.guardrails import PromptInjectionGuardrail
+from .agent_cache import built_agent_cache
+from .prompt_cache import PROMPT_CACHE_ENABLED
+from .session_cache import SESSION_CACHE_ENABLED, CachedRedisDb
+from .postgres_agent_db import PostgresAgentDb
+from .output_schema import output_schema_registry
+from config.llm.ollama_manager import OLLAMA_KEEP_ALIVE
 import logging
 
-from models.dto.agents.agentLLM import AgentFactoryInput, ModelLLM
+from models.dto.agents.agentLLM import AgentFactoryInput, ModelLLM, StorageBackend
 from typing import Optional, Union, Dict, List, Callable
 
 logger = logging.getLogger("FactoryAgent")
@@ -24,18 +30,44 @@ logger = logging.getLogger("FactoryAgent")
 class FactoryAgent:
 
     @staticmethod
-    def build_agent(agent_factory_input: AgentFactoryInput) -> Agent:
+    def get_or_build_agent(agent_factory_input: AgentFactoryInput, gemini_cached_content: Optional[str] = None) -> Agent:
+        key = built_agent_cache.fingerprint(agent_factory_input)
+        if gemini_cached_content:
+            key = f"{key}:{gemini_cached_content}"
+        agent = built_agent_cache.get(key)
+        if agent is None:
+            agent = FactoryAgent.build_agent(agent_factory_input, gemini_cached_content)
+            built_agent_cache.put(key, agent)
+        return agent
+
+    @staticmethod
+    def open_model_connections(agent: Agent) -> None:
+        """Instantiates the provider async client ahead of the first run so it is reused by later runs."""
+        get_async_client = getattr(agent.model, "get_async_client", None)
+        if not callable(get_async_client):
+            return
+        try:
+            get_async_client()
+        except Exception as e:
+            logger.warning(f"Could not open provider client for agent {agent.name}: {e}")
+
+    @staticmethod
+    def build_agent(agent_factory_input: AgentFactoryInput, gemini_cached_content: Optional[str] = None) -> Agent:
+        """
+        When gemini_cached_content is given the description and instructions already live in the
+        provider cache, so they are left out of the agent system message.
+        """
         model: Model
         if agent_factory_input.modelLLM == ModelLLM.GEMINI:
-            model = Gemini(agent_factory_input.typeModel)
+            model = Gemini(agent_factory_input.typeModel, cached_content=gemini_cached_content)
         elif agent_factory_input.modelLLM == ModelLLM.CLAUDE:
-            model = Claude(agent_factory_input.typeModel)
+            model = Claude(agent_factory_input.typeModel, cache_system_prompt=PROMPT_CACHE_ENABLED)
         elif agent_factory_input.modelLLM == ModelLLM.OPEANAI:
             model = OpenAIChat(agent_factory_input.typeModel)
         elif agent_factory_input.modelLLM == ModelLLM.XAI:
             model = xAI(agent_factory_input.typeModel)
         elif agent_factory_input.modelLLM == ModelLLM.OLLAMA:
-            model = Ollama(agent_factory_input.typeModel)
+            model = Ollama(agent_factory_input.typeModel, keep_alive=OLLAMA_KEEP_ALIVE)
         elif agent_factory_input.modelLLM == ModelLLM.GROQ:
             model = Groq(agent_factory_input.typeModel)
         elif agent_factory_input.modelLLM == ModelLLM.DEEPSEEK:
@@ -48,23 +80,22 @@ class FactoryAgent:
             name=agent_factory_input.name,
             tools=FactoryAgent._build_tools(agent_factory_input.tools),
             reasoning=agent_factory_input.reasoning,
-            description=agent_factory_input.description,
-            instructions=agent_factory_input.instructions,
+            description=None if gemini_cached_content else agent_factory_input.description,
+            instructions=None if gemini_cached_content else agent_factory_input.instructions,
             tool_call_limit=5,
         )
 
+        agent = FactoryAgent._build_knowledge(agent, agent_factory_input)
+        agent = FactoryAgent._build_output_schema(agent, agent_factory_input)
         agent = FactoryAgent._build_db_storage(agent, agent_factory_input)
-        agent = FactoryAgent._build_guard_rails(agent)
         return agent
     
     @staticmethod
     def _build_knowledge(agent: Agent, agent_factory_input: AgentFactoryInput) -> Agent:
         if not agent_factory_input.knowledge_collection_name:
             return agent
-        vector_db = qdrant_manager.get_vector_db()
-        vector_db.collection = agent_factory_input.knowledge_collection_name
         knowledge = Knowledge(
-            vector_db=vector_db,
+            vector_db=qdrant_manager.get_vector_db(agent_factory_input.knowledge_collection_name),
             description=agent_factory_input.knowledge_description or "",
             max_results=agent_factory_input.knowledge_top_k or 5,
             name=f"{agent.name}_knowledge",
@@ -73,31 +104,49 @@ class FactoryAgent:
         return agent
     
     @staticmethod
-    def _build_guard_rails(agent: Agent) -> Agent:
-        agent.pre_hooks = [PromptInjectionGuardrail(), PIIDetectionGuardrail()]
+    def _build_output_schema(agent: Agent, agent_factory_input: AgentFactoryInput) -> Agent:
+        """
+        Asks the provider for output matching the schema: native structured outputs when the model supports
+        them, JSON mode otherwise. agno returns the raw text, validated (and streamed) by ExecuteAgent.
+        """
+        schema = output_schema_registry.for_agent(agent_factory_input)
+        if schema is None:
+            return agent
+        agent.output_schema = schema.model
+        agent.parse_response = False
+        agent.use_json_mode = not (
+            getattr(agent.model, "supports_native_structured_outputs", False)
+            or getattr(agent.model, "supports_json_schema_outputs", False)
+        )
         return agent
 
     @staticmethod
     def _build_db_storage(agent: Agent, agent_factory_input: AgentFactoryInput) -> Agent:
         if agent_factory_input.has_storage:
             try:
-                from config.database.redis_manager import redis_manager
-                db = RedisDb(
-                    agent_name=agent.name,
-                    redis_client=redis_manager.get_redis_client()
-                )
+                if agent_factory_input.storage_backend == StorageBackend.POSTGRES:
+                    db = PostgresAgentDb(agent_name=agent.name)
+                else:
+                    from config.database.redis_manager import redis_manager
+                    from config.database.redis_codec import REDIS_CODEC_READ_ENABLED
+                    db_class = CachedRedisDb if SESSION_CACHE_ENABLED else RedisDb
+                    db = db_class(
+                        id=f"redis:{agent.name}",
+                        db_prefix=agent.name,
+                        redis_client=redis_manager.get_codec_redis_client() if REDIS_CODEC_READ_ENABLED else redis_manager.get_redis_client()
+                    )
                 agent.db = db
+                # Built here rather than lazily by agno on each run, so ContextBudgeter.apply can scope it per run
+                agent.memory_manager = MemoryManager(model=agent.model, db=db)
                 agent.enable_agentic_memory = True
                 agent.add_history_to_context = True
                 agent.num_history_sessions = 5
             except Exception as e:
-                logger.error(f"Error initializing Redis DB for agent {agent.name}: {e}")
+                logger.error(f"Error initializing {agent_factory_input.storage_backend.value} storage for agent {agent.name}: {e}")
         return agent
 
     @staticmethod
     def _build_tools(tools: Optional[list[int]]) -> Optional[List[Union[Toolkit, Callable, Function, Dict]]]:
         if not tools:
             return None
-        
-        #TODO: Add logic recovery tools
-        return []
\ No newline at end of file
+        return tool_registry.build_tools(tools)
\ No newline at end of file
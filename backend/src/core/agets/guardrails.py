@@ -0,0 +1,18 @@
+from agno.guardrails import PIIDetectionGuardrail
+from agno.guardrails import PromptInjectionGuardrail
+from agno.run.agent import RunInput
+
+
+class AgentGuardrails:
+    """
+    Input guardrails checked before the agent runs, outside of the agno run so they can be
+    bounded by the request deadline and shared by executions of the same prompt.
+    """
+
+    _guardrails = [PromptInjectionGuardrail(), PIIDetectionGuardrail()]
+
+    @staticmethod
+    async def check(user_input: str) -> None:
+        run_input = RunInput(input_content=user_input)
+        for guardrail in AgentGuardrails._guardrails:
+            await guardrail.async_check(run_input)
@@ -0,0 +1,227 @@
+import importlib
+import logging
+import os
+import re
+import threading
+from typing import Any, Optional
+
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError, create_model
+from pydantic_core import from_json
+
+from config.monitory.metrics import metrics
+from models.dto.agents.agentLLM import AgentFactoryInput
+
+logger = logging.getLogger("OutputSchemaRegistry")
+
+_CODE_FENCE = re.compile(r"^\s*```[a-zA-Z]*\s*|\s*```\s*$")
+_TRAILING_COMMA = re.compile(r",(\s*[}\]])")
+# Packages whose pydantic models agents may name by import path, nothing else is ever imported
+OUTPUT_SCHEMA_PACKAGES = tuple(package.strip() for package in os.getenv("OUTPUT_SCHEMA_PACKAGES", "").split(",") if package.strip())
+# Characters ending a value inside a document: a partial document only gains complete values with them
+_VALUE_BOUNDARIES = frozenset(",}]")
+# Output a streamed document must grow by before it is parsed again, besides a quarter of what was already parsed
+PARTIAL_PARSE_MIN_BYTES = int(os.getenv("OUTPUT_PARTIAL_PARSE_MIN_BYTES", 64))
+
+
+class OutputValidationError(Exception):
+    def __init__(self, schema_name: str, error: Exception):
+        super().__init__(f"Agent output does not match the '{schema_name}' schema: {error}")
+        self.schema_name = schema_name
+
+
+class OutputSchema:
+    """
+    Compiled validators of one output schema: the model itself for complete outputs and a copy with
+    every field optional, used to validate the partial documents seen while the output is streamed.
+    """
+
+    def __init__(self, name: str, model: type[BaseModel]):
+        self.name = name
+        self.model = model
+        self.adapter = TypeAdapter(model)
+        partial_fields = {
+            field_name: (Optional[field.annotation], Field(default=None, alias=field.alias))
+            for field_name, field in model.model_fields.items()
+        }
+        self.partial_adapter = TypeAdapter(create_model(f"Partial{model.__name__}", **partial_fields))
+
+    @staticmethod
+    def may_have_progressed(chunk: str) -> bool:
+        return any(character in _VALUE_BOUNDARIES for character in chunk)
+
+    def parse_partial(self, text: str) -> Optional[dict]:
+        """Fields complete so far in a streamed output, None while nothing valid can be read from it."""
+        try:
+            document = from_json(self._strip(text), allow_partial=True)
+            if not isinstance(document, dict):
+                return None
+            return self.partial_adapter.validate_python(document, experimental_allow_partial=True).model_dump(mode="json", exclude_none=True)
+        except (ValueError, ValidationError):
+            return None
+
+    def parse(self, content: Any) -> tuple[BaseModel, bool]:
+        """
+        Validates a complete output. Invalid JSON is repaired once (code fences, text around the
+        document, trailing commas, truncation) before giving up. Returns the model and whether it was repaired.
+        """
+        if isinstance(content, self.model):
+            return content, False
+        if isinstance(content, BaseModel):
+            content = content.model_dump()
+        try:
+            if isinstance(content, (str, bytes)):
+                return self.adapter.validate_json(content), False
+            return self.adapter.validate_python(content), False
+        except ValidationError as e:
+            error: Exception = e
+        repaired = self._repair(content) if isinstance(content, str) else None
+        if repaired is not None:
+            try:
+                result = self.adapter.validate_python(repaired)
+                metrics.increment("output_repaired", self.name)
+                return result, True
+            except ValidationError as e:
+                error = e
+        metrics.increment("output_validation_failed", self.name)
+        raise OutputValidationError(self.name, error)
+
+    @staticmethod
+    def _strip(text: str) -> str:
+        text = _CODE_FENCE.sub("", text)
+        starts = [index for index in (text.find("{"), text.find("[")) if index >= 0]
+        return text[min(starts):] if starts else text
+
+    @classmethod
+    def _repair(cls, text: str) -> Optional[Any]:
+        text = _TRAILING_COMMA.sub(r"\1", cls._strip(text))
+        end = max(text.rfind("}"), text.rfind("]"))
+        for candidate in (text, text[:end + 1] if end >= 0 else None):
+            if not candidate:
+                continue
+            try:
+                return from_json(candidate, allow_partial=True)
+            except ValueError:
+                continue
+        return None
+
+
+class PartialOutput:
+    """
+    Running buffer of a streamed output, validated against the schema when there is one. It is parsed again only after a value
+    boundary and once it grew by a quarter of what was parsed last (at least PARTIAL_PARSE_MIN_BYTES),
+    so parsing a whole output stays linear in its size instead of re-reading it on every chunk.
+    """
+
+    def __init__(self, schema: Optional[OutputSchema], min_bytes: int = PARTIAL_PARSE_MIN_BYTES):
+        self._schema = schema
+        self._min_bytes = min_bytes
+        self._chunks: list[str] = []
+        self._size = 0
+        self._parsed_size = 0
+        self._last: Optional[dict] = None
+
+    def feed(self, chunk: str) -> Optional[dict]:
+        """Adds a chunk, returns the partial object when it changed since the last one returned."""
+        self._chunks.append(chunk)
+        self._size += len(chunk)
+        if self._schema is None or not self._schema.may_have_progressed(chunk):
+            return None
+        if self._size - self._parsed_size < max(self._min_bytes, self._parsed_size // 4):
+            return None
+        self._parsed_size = self._size
+        partial = self._schema.parse_partial(self.text())
+        if not partial or partial == self._last:
+            return None
+        self._last = partial
+        return partial
+
+    def text(self) -> str:
+        text = "".join(self._chunks)
+        self._chunks = [text]
+        return text
+
+
+class OutputSchemaRegistry:
+    """
+    Output schemas selected by agents.output_parser: a name registered in code or an import path
+    ("package.module:Model" or "package.module.Model") of a pydantic model inside OUTPUT_SCHEMA_PACKAGES.
+    output_parser comes from the agent definitions, so any other value is refused before importing anything.
+    Schemas are compiled once per output_parser value and shared by every agent definition using it.
+    """
+
+    def __init__(self):
+        self._models: dict[str, type[BaseModel]] = {}
+        self._compiled: dict[str, OutputSchema] = {}
+        self._invalid: dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, model: type[BaseModel]) -> None:
+        with self._lock:
+            self._models[name] = model
+            self._compiled.pop(name, None)
+            self._invalid.pop(name, None)
+
+    @staticmethod
+    def _split(output_parser: str) -> tuple[str, str]:
+        module_path, _, attribute = output_parser.partition(":")
+        if not attribute:
+            module_path, _, attribute = output_parser.rpartition(".")
+        return module_path, attribute
+
+    def is_allowed(self, output_parser: str) -> bool:
+        """Registered name, or import path inside one of the OUTPUT_SCHEMA_PACKAGES."""
+        if output_parser in self._models:
+            return True
+        module_path, attribute = self._split(output_parser)
+        return bool(module_path and attribute) and any(
+            module_path == package or module_path.startswith(f"{package}.") for package in OUTPUT_SCHEMA_PACKAGES
+        )
+
+    def _import(self, output_parser: str) -> Any:
+        module_path, attribute = self._split(output_parser)
+        target = importlib.import_module(module_path)
+        for part in attribute.split("."):
+            target = getattr(target, part)
+        return target
+
+    def resolve(self, output_parser: Optional[str]) -> Optional[OutputSchema]:
+        if not output_parser:
+            return None
+        compiled = self._compiled.get(output_parser)
+        if compiled is not None or output_parser in self._invalid:
+            return compiled
+        if not self.is_allowed(output_parser):
+            logger.warning(f"output_parser '{output_parser}' is not registered nor in OUTPUT_SCHEMA_PACKAGES, agents using it answer in plain text.")
+            return None
+        try:
+            model = self._models.get(output_parser) or self._import(output_parser)
+            if not (isinstance(model, type) and issubclass(model, BaseModel)):
+                raise TypeError(f"output_parser '{output_parser}' is not a pydantic model")
+            compiled = OutputSchema(output_parser, model)
+        except Exception as e:
+            logger.warning(f"Invalid output_parser '{output_parser}', agents using it answer in plain text: {e}")
+            with self._lock:
+                self._invalid[output_parser] = str(e)
+            return None
+        with self._lock:
+            self._compiled[output_parser] = compiled
+        return compiled
+
+    def validation_error(self, output_parser: Optional[str]) -> Optional[str]:
+        """Why an agent definition can't use output_parser, None when it can (or has none)."""
+        if not output_parser:
+            return None
+        if not self.is_allowed(output_parser):
+            return f"output_parser '{output_parser}' is not a registered schema nor a model in {', '.join(OUTPUT_SCHEMA_PACKAGES) or 'an allowed package'}"
+        if self.resolve(output_parser) is None:
+            return f"output_parser '{output_parser}' is invalid: {self._invalid.get(output_parser)}"
+        return None
+
+    def for_agent(self, agent: AgentFactoryInput) -> Optional[OutputSchema]:
+        return self.resolve(agent.output_parser)
+
+    def invalid_schemas(self) -> dict[str, str]:
+        return dict(self._invalid)
+
+
+output_schema_registry = OutputSchemaRegistry()
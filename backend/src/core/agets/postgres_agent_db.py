@@ -0,0 +1,311 @@
+import logging
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import uuid4
+
+from agno.db.base import AsyncBaseDb, SessionType
+from agno.db.schemas.memory import UserMemory
+from agno.session import AgentSession, TeamSession, WorkflowSession
+from config.monitory.metrics import metrics
+from repository.agent_memory_repository import AgentMemoryRepository, IAgentMemoryRepository
+from .session_cache import SESSION_CACHE_ENABLED, session_cache
+
+logger = logging.getLogger("PostgresAgentDb")
+
+_SESSION_CLASSES = {
+    SessionType.AGENT: AgentSession,
+    SessionType.TEAM: TeamSession,
+    SessionType.WORKFLOW: WorkflowSession,
+}
+_COMPONENT_ID_FIELDS = {
+    SessionType.AGENT: "agent_id",
+    SessionType.TEAM: "team_id",
+    SessionType.WORKFLOW: "workflow_id",
+}
+_logged_features: set[str] = set()
+
+
+def _session_type(session: Any) -> SessionType:
+    for session_type, session_class in _SESSION_CLASSES.items():
+        if isinstance(session, session_class):
+            return session_type
+    raise TypeError(f"Unsupported session type {type(session).__name__}")
+
+
+class PostgresAgentDb(AsyncBaseDb):
+    """
+    agno async storage of an agent's sessions and memories in Postgres, on the shared asyncpg pool.
+    Selected per agent with agents.storage_backend = 'postgres'. Plain agent session and user memories
+    lookups go through the same hot session tier as CachedRedisDb, a hit is served only while its version
+    (the session updated_at, the count and last updated_at of the memories) still matches the table.
+    Retention is applied in the background by AgentMemoryRetentionService, so runs never prune memories themselves.
+    Metrics, evals, knowledge, culture and traces are not stored here, their writes are dropped.
+    """
+
+    def __init__(self, agent_name: str, repository: Optional[IAgentMemoryRepository] = None):
+        super().__init__(id=f"postgres:{agent_name}")
+        self.agent_name = agent_name
+        self.db_prefix = f"pg:{agent_name}"
+        self.repository = repository or AgentMemoryRepository()
+
+    def __deepcopy__(self, memo: dict) -> "PostgresAgentDb":
+        # Agent copies share the storage
+        return self
+
+    def _session_key(self, session_id: str) -> str:
+        return f"session:{self.db_prefix}:{session_id}"
+
+    def _memories_key(self, user_id: Optional[str]) -> str:
+        return f"memories:{self.db_prefix}:{user_id}"
+
+    @staticmethod
+    def _deserialize_session(session_type: SessionType, data: dict):
+        return _SESSION_CLASSES[session_type].from_dict(data)
+
+    # --- Sessions ---
+
+    async def get_session(self, session_id: str, session_type: SessionType, user_id: Optional[str] = None, deserialize: Optional[bool] = True):
+        cacheable = SESSION_CACHE_ENABLED and session_type == SessionType.AGENT and deserialize
+        key = self._session_key(session_id)
+        if cacheable:
+            cached = session_cache.get(key, "session")
+            if cached is not None:
+                data, version = cached
+                if await self.repository.get_session_version(self.agent_name, session_id) == version:
+                    if user_id is None or data.get("user_id") == user_id:
+                        return self._deserialize_session(session_type, data)
+                else:
+                    metrics.increment("session_cache_stale", "session")
+        stored = await self.repository.get_session(self.agent_name, session_id, session_type.value, user_id)
+        if stored is None:
+            return None
+        data, version = stored
+        if not deserialize:
+            return data
+        if cacheable:
+            session_cache.put(key, (data, version))
+        return self._deserialize_session(session_type, data)
+
+    async def get_sessions(
+        self,
+        session_type: Optional[SessionType] = None,
+        user_id: Optional[str] = None,
+        component_id: Optional[str] = None,
+        session_name: Optional[str] = None,
+        start_timestamp: Optional[int] = None,
+        end_timestamp: Optional[int] = None,
+        limit: Optional[int] = None,
+        page: Optional[int] = None,
+        sort_by: Optional[str] = None,
+        sort_order: Optional[str] = None,
+        deserialize: Optional[bool] = True,
+        **kwargs
+    ):
+        session_type = session_type or SessionType.AGENT
+        sessions, total = await self.repository.get_sessions(
+            self.agent_name, session_type.value, user_id, component_id, session_name,
+            start_timestamp, end_timestamp, limit, page, sort_by, sort_order
+        )
+        if not deserialize:
+            return sessions, total
+        return [session for session in (self._deserialize_session(session_type, data) for data in sessions) if session is not None]
+
+    async def upsert_session(self, session, deserialize: Optional[bool] = True):
+        session_type = _session_type(session)
+        data = session.to_dict()
+        stored, version = await self.repository.upsert_session(
+            self.agent_name, session_type.value, data.get(_COMPONENT_ID_FIELDS[session_type]), data
+        )
+        if SESSION_CACHE_ENABLED and session_type == SessionType.AGENT:
+            session_cache.put(self._session_key(session.session_id), (stored, version))
+        return self._deserialize_session(session_type, stored) if deserialize else stored
+
+    async def upsert_sessions(self, sessions: list, deserialize: Optional[bool] = True, **kwargs) -> list:
+        return [await self.upsert_session(session, deserialize=deserialize) for session in sessions]
+
+    async def rename_session(self, session_id: str, session_type: SessionType, session_name: str, deserialize: Optional[bool] = True):
+        session_cache.invalidate(self._session_key(session_id))
+        data = await self.repository.rename_session(self.agent_name, session_id, session_type.value, session_name)
+        if data is None or not deserialize:
+            return data
+        return self._deserialize_session(session_type, data)
+
+    async def delete_session(self, session_id: str) -> bool:
+        session_cache.invalidate(self._session_key(session_id))
+        return await self.repository.delete_sessions(self.agent_name, [session_id]) > 0
+
+    async def delete_sessions(self, session_ids: List[str]) -> None:
+        for session_id in session_ids:
+            session_cache.invalidate(self._session_key(session_id))
+        await self.repository.delete_sessions(self.agent_name, session_ids)
+
+    # --- Memories ---
+
+    async def get_user_memory(self, memory_id: str, deserialize: Optional[bool] = True, user_id: Optional[str] = None):
+        data = await self.repository.get_memory(self.agent_name, memory_id, user_id)
+        if data is None or not deserialize:
+            return data
+        return UserMemory.from_dict(data)
+
+    async def get_user_memories(
+        self,
+        user_id: Optional[str] = None,
+        agent_id: Optional[str] = None,
+        team_id: Optional[str] = None,
+        topics: Optional[List[str]] = None,
+        search_content: Optional[str] = None,
+        limit: Optional[int] = None,
+        page: Optional[int] = None,
+        sort_by: Optional[str] = None,
+        sort_order: Optional[str] = None,
+        deserialize: Optional[bool] = True,
+        **kwargs
+    ):
+        plain_lookup = SESSION_CACHE_ENABLED and deserialize and not any((agent_id, team_id, topics, search_content, limit, page, sort_by, sort_order))
+        if plain_lookup:
+            cached = session_cache.get(self._memories_key(user_id), "memories")
+            version = await self.repository.get_memories_version(self.agent_name, user_id)
+            if cached is not None:
+                if cached[1] == version:
+                    return [UserMemory.from_dict(memory) for memory in cached[0]]
+                metrics.increment("session_cache_stale", "memories")
+        memories, total = await self.repository.get_memories(
+            self.agent_name, user_id, agent_id, team_id, topics, search_content, limit, page, sort_by, sort_order
+        )
+        if not deserialize:
+            return memories, total
+        if plain_lookup:
+            session_cache.put(self._memories_key(user_id), (memories, version))
+        return [UserMemory.from_dict(memory) for memory in memories]
+
+    async def get_all_memory_topics(self, user_id: Optional[str] = None, **kwargs) -> List[str]:
+        return await self.repository.get_memory_topics(self.agent_name, user_id)
+
+    async def get_user_memory_stats(self, limit: Optional[int] = None, page: Optional[int] = None, user_id: Optional[str] = None, **kwargs):
+        return await self.repository.get_memory_stats(self.agent_name, user_id, limit, page)
+
+    async def upsert_user_memory(self, memory: UserMemory, deserialize: Optional[bool] = True):
+        if memory.memory_id is None:
+            memory.memory_id = str(uuid4())
+        stored = await self.repository.upsert_memory(self.agent_name, memory.to_dict())
+        session_cache.invalidate(self._memories_key(memory.user_id))
+        return UserMemory.from_dict(stored) if deserialize else stored
+
+    async def upsert_memories(self, memories: List[UserMemory], deserialize: Optional[bool] = True, **kwargs) -> list:
+        return [await self.upsert_user_memory(memory, deserialize=deserialize) for memory in memories]
+
+    async def delete_user_memory(self, memory_id: str, user_id: Optional[str] = None) -> None:
+        await self.repository.delete_memories(self.agent_name, [memory_id], user_id)
+        self._invalidate_memories(user_id)
+
+    async def delete_user_memories(self, memory_ids: List[str], user_id: Optional[str] = None) -> None:
+        await self.repository.delete_memories(self.agent_name, memory_ids, user_id)
+        self._invalidate_memories(user_id)
+
+    async def clear_memories(self) -> None:
+        await self.repository.delete_memories(self.agent_name)
+        self._invalidate_memories(None)
+
+    # --- Not stored: metrics, evals, knowledge, culture, traces ---
+    # Writes are dropped and reads are empty, in the shapes agno expects, so an agent enabling one of
+    # these features keeps running. Each feature is logged once per process.
+
+    def _not_stored(self, feature: str) -> None:
+        if feature not in _logged_features:
+            _logged_features.add(feature)
+            logger.warning(f"PostgresAgentDb only stores sessions and memories, {feature} of agent {self.agent_name} are not persisted.")
+
+    @staticmethod
+    def _empty(deserialize: Optional[bool]):
+        return [] if deserialize else ([], 0)
+
+    async def table_exists(self, table_name: str) -> bool:
+        return table_name in (self.session_table_name, self.memory_table_name)
+
+    async def get_latest_schema_version(self, table_name: str) -> str:
+        return ""
+
+    async def upsert_schema_version(self, table_name: str, version: str) -> None:
+        return None
+
+    async def calculate_metrics(self) -> Optional[Any]:
+        self._not_stored("metrics")
+        return None
+
+    async def get_metrics(self, starting_date: Optional[date] = None, ending_date: Optional[date] = None) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        return [], None
+
+    async def create_eval_run(self, eval_run):
+        self._not_stored("eval runs")
+        return None
+
+    async def get_eval_run(self, eval_run_id: str, deserialize: Optional[bool] = True):
+        return None
+
+    async def get_eval_runs(self, *args, deserialize: Optional[bool] = True, **kwargs):
+        return self._empty(deserialize)
+
+    async def rename_eval_run(self, eval_run_id: str, name: str, deserialize: Optional[bool] = True):
+        return None
+
+    async def delete_eval_runs(self, eval_run_ids: List[str]) -> None:
+        return None
+
+    async def get_knowledge_content(self, id: str):
+        return None
+
+    async def get_knowledge_contents(self, *args, **kwargs) -> Tuple[list, int]:
+        return [], 0
+
+    async def upsert_knowledge_content(self, knowledge_row):
+        self._not_stored("knowledge contents")
+        return None
+
+    async def delete_knowledge_content(self, id: str) -> None:
+        return None
+
+    async def get_cultural_knowledge(self, id: str, deserialize: Optional[bool] = True):
+        return None
+
+    async def get_all_cultural_knowledge(self, *args, deserialize: Optional[bool] = True, **kwargs):
+        return self._empty(deserialize)
+
+    async def upsert_cultural_knowledge(self, cultural_knowledge, deserialize: Optional[bool] = True):
+        self._not_stored("cultural knowledge")
+        return None
+
+    async def delete_cultural_knowledge(self, id: str) -> None:
+        return None
+
+    async def clear_cultural_knowledge(self) -> None:
+        return None
+
+    async def upsert_trace(self, trace) -> None:
+        self._not_stored("traces")
+
+    async def create_span(self, span) -> None:
+        self._not_stored("traces")
+
+    async def create_spans(self, spans: List) -> None:
+        self._not_stored("traces")
+
+    async def get_trace(self, *args, **kwargs):
+        return None
+
+    async def get_traces(self, *args, **kwargs) -> Tuple[list, int]:
+        return [], 0
+
+    async def get_trace_stats(self, *args, **kwargs) -> Tuple[List[Dict[str, Any]], int]:
+        return [], 0
+
+    async def get_span(self, span_id: str):
+        return None
+
+    async def get_spans(self, *args, **kwargs) -> List:
+        return []
+
+    def _invalidate_memories(self, user_id: Optional[str]) -> None:
+        if user_id is not None:
+            session_cache.invalidate(self._memories_key(user_id))
+        else:
+            session_cache.invalidate_prefix(f"memories:{self.db_prefix}:")
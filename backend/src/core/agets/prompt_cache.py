@@ -0,0 +1,166 @@
+import asyncio
+import contextlib
+import hashlib
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from config.monitory.metrics import metrics
+from models.dto.agents.agentLLM import AgentFactoryInput, ModelLLM
+
+logger = logging.getLogger("PromptCacheManager")
+
+PROMPT_CACHE_ENABLED = os.getenv("PROMPT_CACHE_ENABLED", "true").lower() == "true"
+
+
+@dataclass
+class GeminiCacheHandle:
+    name: str
+    fingerprint: str
+    expires_at: float
+    last_used_at: float
+
+
+class PromptCacheManager:
+    """
+    Provider side caching of the static prefix of each agent (description and instructions).
+    Claude and Ollama only need request flags (cache_system_prompt and keep_alive) set by the factory.
+    Gemini needs an explicit cached content per agent definition: it is created on first use,
+    its TTL is extended in background while the agent is in use, and it is replaced when the
+    definition changes. Gemini rejects cached contents combined with tools or a system instruction,
+    so only agents whose system prompt is exactly their description and instructions are eligible.
+    """
+
+    def __init__(self):
+        self.gemini_ttl = int(os.getenv("GEMINI_CACHE_TTL", 3600))
+        self.gemini_refresh_margin = int(os.getenv("GEMINI_CACHE_REFRESH_MARGIN", 300))
+        self.gemini_min_chars = int(os.getenv("GEMINI_CACHE_MIN_CHARS", 16000))
+        self._gemini_handles: dict[int, GeminiCacheHandle] = {}
+        self._gemini_client = None
+        self._locks: dict[int, asyncio.Lock] = {}
+        self._refresh_task: Optional[asyncio.Task] = None
+        metrics.register_gauge("prompt_cache_ratio", self.cached_token_ratios)
+
+    @staticmethod
+    def static_prefix(agent: AgentFactoryInput) -> str:
+        return "\n\n".join(part for part in [agent.description, agent.instructions] if part)
+
+    def _gemini_eligible(self, agent: AgentFactoryInput) -> bool:
+        return (
+            PROMPT_CACHE_ENABLED
+            and agent.id is not None
+            and agent.modelLLM == ModelLLM.GEMINI
+            and not agent.tools
+            and not agent.has_storage
+            and not agent.knowledge_collection_name
+            and len(self.static_prefix(agent)) >= self.gemini_min_chars
+        )
+
+    def _get_gemini_client(self):
+        if self._gemini_client is None:
+            from google import genai
+            self._gemini_client = genai.Client()
+        return self._gemini_client
+
+    async def get_gemini_cached_content(self, agent: AgentFactoryInput) -> Optional[str]:
+        """Returns the Gemini cached content name holding the agent prefix, or None when not cacheable."""
+        if not self._gemini_eligible(agent):
+            return None
+        fingerprint = hashlib.sha1(f"{agent.typeModel}\n{self.static_prefix(agent)}".encode()).hexdigest()
+        lock = self._locks.setdefault(agent.id, asyncio.Lock())
+        async with lock:
+            handle = self._gemini_handles.get(agent.id)
+            now = time.time()
+            if handle is not None and handle.fingerprint == fingerprint and handle.expires_at - now > self.gemini_refresh_margin:
+                handle.last_used_at = now
+                return handle.name
+            if handle is not None:
+                await self._delete_gemini_cache(agent.id)
+            try:
+                handle = await self._create_gemini_cache(agent, fingerprint)
+            except Exception as e:
+                logger.warning(f"Could not create Gemini cached content for agent {agent.id}: {e}")
+                return None
+            self._gemini_handles[agent.id] = handle
+            self._ensure_refresh_loop()
+            return handle.name
+
+    async def _create_gemini_cache(self, agent: AgentFactoryInput, fingerprint: str) -> GeminiCacheHandle:
+        from google.genai import types
+        cached_content = await self._get_gemini_client().aio.caches.create(
+            model=agent.typeModel,
+            config=types.CreateCachedContentConfig(
+                display_name=f"agent-{agent.id}-{fingerprint[:12]}",
+                system_instruction=self.static_prefix(agent),
+                ttl=f"{self.gemini_ttl}s",
+            ),
+        )
+        metrics.increment("prompt_cache_created", str(agent.id))
+        now = time.time()
+        return GeminiCacheHandle(cached_content.name, fingerprint, now + self.gemini_ttl, now)
+
+    async def _delete_gemini_cache(self, agent_id: int) -> None:
+        handle = self._gemini_handles.pop(agent_id, None)
+        if handle is None:
+            return
+        try:
+            await self._get_gemini_client().aio.caches.delete(name=handle.name)
+        except Exception as e:
+            logger.info(f"Gemini cached content {handle.name} was already gone: {e}")
+
+    def _ensure_refresh_loop(self) -> None:
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def _refresh_loop(self) -> None:
+        from google.genai import types
+        while self._gemini_handles:
+            await asyncio.sleep(max(self.gemini_refresh_margin / 2, 1))
+            now = time.time()
+            for agent_id, handle in list(self._gemini_handles.items()):
+                if handle.expires_at - now > self.gemini_refresh_margin:
+                    continue
+                if now - handle.last_used_at > self.gemini_ttl:
+                    self._gemini_handles.pop(agent_id, None)
+                    continue
+                try:
+                    await self._get_gemini_client().aio.caches.update(
+                        name=handle.name, config=types.UpdateCachedContentConfig(ttl=f"{self.gemini_ttl}s")
+                    )
+                    handle.expires_at = time.time() + self.gemini_ttl
+                except Exception as e:
+                    logger.warning(f"Could not refresh Gemini cached content {handle.name}: {e}")
+                    self._gemini_handles.pop(agent_id, None)
+
+    async def close(self) -> None:
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._refresh_task
+            self._refresh_task = None
+
+    @staticmethod
+    def record_usage(agent: AgentFactoryInput, run_metrics) -> None:
+        if run_metrics is None or agent.id is None:
+            return
+        label = str(agent.id)
+        input_tokens = getattr(run_metrics, "input_tokens", 0) or 0
+        cache_read_tokens = getattr(run_metrics, "cache_read_tokens", 0) or 0
+        if agent.modelLLM == ModelLLM.CLAUDE:
+            input_tokens += cache_read_tokens
+        metrics.increment("prompt_input_tokens", label, input_tokens)
+        metrics.increment("prompt_cache_read_tokens", label, cache_read_tokens)
+
+    @staticmethod
+    def cached_token_ratios() -> dict:
+        counters = metrics.snapshot_counters("prompt_input_tokens", "prompt_cache_read_tokens")
+        input_tokens, cache_read_tokens = counters["prompt_input_tokens"], counters["prompt_cache_read_tokens"]
+        return {
+            agent_id: round(cache_read_tokens.get(agent_id, 0) / total, 4)
+            for agent_id, total in input_tokens.items() if total
+        }
+
+
+prompt_cache_manager = PromptCacheManager()
@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Awaitable, Callable, Optional
+
+from config.monitory.metrics import metrics
+
+logger = logging.getLogger("ProviderRouter")
+
+
+class CircuitBreaker:
+    """
+    Per provider breaker: opens after consecutive failed or slow calls and lets a single
+    probe through once the cooldown has elapsed (half-open).
+    """
+
+    def __init__(self, failure_threshold: int, cooldown: float, slow_call_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.slow_call_seconds = slow_call_seconds
+        self._failures: dict[str, int] = {}
+        self._opened_at: dict[str, float] = {}
+        self._probing: set[str] = set()
+        self._lock = threading.Lock()
+
+    def allow(self, provider: str) -> bool:
+        with self._lock:
+            opened_at = self._opened_at.get(provider)
+            if opened_at is None:
+                return True
+            if time.monotonic() - opened_at < self.cooldown or provider in self._probing:
+                return False
+            self._probing.add(provider)
+            return True
+
+    def record(self, provider: str, success: bool, latency: float) -> None:
+        healthy = success and latency < self.slow_call_seconds
+        with self._lock:
+            self._probing.discard(provider)
+            if healthy:
+                self._failures.pop(provider, None)
+                self._opened_at.pop(provider, None)
+                return
+            failures = self._failures.get(provider, 0) + 1
+            self._failures[provider] = failures
+            if failures >= self.failure_threshold:
+                if provider not in self._opened_at:
+                    logger.warning(f"Circuit opened for provider {provider} after {failures} failed or slow calls.")
+                    metrics.increment("provider_circuit_opened", provider)
+                self._opened_at[provider] = time.monotonic()
+
+    def release(self, provider: str) -> None:
+        """Frees the half-open probe slot of a call cancelled before it had an outcome."""
+        with self._lock:
+            self._probing.discard(provider)
+
+    def state(self) -> dict:
+        with self._lock:
+            return {provider: "open" for provider in self._opened_at}
+
+
+class ProviderCandidate:
+    def __init__(self, provider: str, model: str, run: Callable[[], Awaitable]):
+        self.provider = provider
+        self.model = model
+        self.run = run
+
+    @property
+    def key(self) -> str:
+        return f"{self.provider}:{self.model}"
+
+
+class ProviderRouter:
+    """
+    Runs an agent over its ordered provider chain. Failed providers fail over to the next one and,
+    when hedging is allowed, a request still pending after the p95 latency of its model is raced
+    against the next provider: the first complete answer wins and the other one is cancelled.
+    """
+
+    def __init__(self):
+        self.default_hedge_delay = float(os.getenv("HEDGE_DEFAULT_DELAY", 8))
+        self.min_hedge_delay = float(os.getenv("HEDGE_MIN_DELAY", 1))
+        self.min_samples = int(os.getenv("HEDGE_MIN_SAMPLES", 20))
+        self.circuit_breaker = CircuitBreaker(
+            failure_threshold=int(os.getenv("PROVIDER_CIRCUIT_FAILURES", 5)),
+            cooldown=float(os.getenv("PROVIDER_CIRCUIT_COOLDOWN", 30)),
+            slow_call_seconds=float(os.getenv("PROVIDER_SLOW_CALL_SECONDS", 60)),
+        )
+        metrics.register_gauge("provider_circuits", self.circuit_breaker.state)
+
+    def hedge_delay(self, candidate: ProviderCandidate) -> float:
+        stats = metrics.get_latency("provider_latency_seconds", candidate.key)
+        if stats is None or stats.count < self.min_samples:
+            return self.default_hedge_delay
+        return max(stats.percentile(95) or self.default_hedge_delay, self.min_hedge_delay)
+
+    async def _run_candidate(self, candidate: ProviderCandidate):
+        started_at = time.perf_counter()
+        try:
+            result = await candidate.run()
+        except asyncio.CancelledError:
+            self.circuit_breaker.release(candidate.provider)
+            raise
+        except Exception:
+            self.circuit_breaker.record(candidate.provider, False, time.perf_counter() - started_at)
+            metrics.increment("provider_failures", candidate.key)
+            raise
+        latency = time.perf_counter() - started_at
+        self.circuit_breaker.record(candidate.provider, True, latency)
+        metrics.observe("provider_latency_seconds", latency, candidate.key)
+        return result
+
+    async def run(self, candidates: list[ProviderCandidate], hedge: bool):
+        pending: dict[asyncio.Task, ProviderCandidate] = {}
+        next_index = 0
+        last_launched = candidates[0]
+        last_error: Optional[BaseException] = None
+
+        def launch(force: bool = False) -> bool:
+            nonlocal next_index, last_launched
+            while next_index < len(candidates):
+                candidate = candidates[next_index]
+                next_index += 1
+                if force or self.circuit_breaker.allow(candidate.provider):
+                    pending[asyncio.create_task(self._run_candidate(candidate))] = candidate
+                    last_launched = candidate
+                    return True
+                metrics.increment("provider_skipped_by_circuit", candidate.key)
+            return False
+
+        if not launch():
+            next_index = 0
+            launch(force=True)
+            next_index = len(candidates)
+        try:
+            while pending:
+                timeout = self.hedge_delay(last_launched) if hedge and next_index < len(candidates) else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    if launch():
+                        metrics.increment("provider_hedged_requests", last_launched.key)
+                    continue
+                for task in done:
+                    candidate = pending.pop(task)
+                    if task.exception() is None:
+                        if candidate is not candidates[0]:
+                            metrics.increment("provider_fallback_wins", candidate.key)
+                        return task.result()
+                    last_error = task.exception()
+                    logger.warning(f"Provider {candidate.key} failed: {last_error}")
+                launch()
+            raise last_error
+        finally:
+            for task in pending:
+                task.cancel()
+
+
+provider_router = ProviderRouter()
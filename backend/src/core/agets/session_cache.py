@@ -0,0 +1,208 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from agno.db.base import SessionType
+from agno.db.redis import RedisDb
+from agno.db.schemas.memory import UserMemory
+from agno.session import AgentSession
+from config.monitory.metrics import metrics
+
+SESSION_CACHE_ENABLED = os.getenv("SESSION_CACHE_ENABLED", "true").lower() == "true"
+
+
+def session_routing_key(session_id: str) -> str:
+    """Stable key for the ingress consistent hash (e.g. nginx `hash $http_x_session_route_key consistent`)."""
+    return hashlib.sha1(session_id.encode()).hexdigest()[:16]
+
+
+class HotSessionCache:
+    """
+    Process-local LRU of the active sessions state (history, memories and summaries) with idle eviction.
+    Entries are plain dicts, rebuilt into agno objects on each hit, so a run mutating its session never
+    changes the cached copy before the store is written. The store stays authoritative: the storages keep
+    the version of each entry next to it and serve it only while the store still has that version, so
+    writes from another worker (scale-out, restart, rerouting) are never hidden nor overwritten.
+    """
+
+    def __init__(self, max_size: int = 1024, idle_seconds: float = 300):
+        self._max_size = max_size
+        self._idle_seconds = idle_seconds
+        self._entries: OrderedDict[str, tuple[Any, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        metrics.register_gauge("session_cache", lambda: {"size": len(self._entries)})
+
+    def get(self, key: str, kind: str) -> Optional[Any]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[1] > self._idle_seconds:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                metrics.increment("session_cache_misses", kind)
+                return None
+            self._entries[key] = (entry[0], now)
+            self._entries.move_to_end(key)
+        metrics.increment("session_cache_hits", kind)
+        return entry[0]
+
+    def put(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate_prefix(self, prefix: str) -> None:
+        with self._lock:
+            for key in [key for key in self._entries if key.startswith(prefix)]:
+                del self._entries[key]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+session_cache = HotSessionCache(
+    max_size=int(os.getenv("SESSION_CACHE_MAX_SIZE", 1024)),
+    idle_seconds=float(os.getenv("SESSION_CACHE_IDLE_SECONDS", 300)),
+)
+
+
+class CachedRedisDb(RedisDb):
+    """
+    RedisDb with a write-through hot tier for agent sessions and user memories.
+    Only the plain lookups used by agent runs are cached, filtered or paginated queries go to Redis.
+    Every write bumps a version counter kept in Redis, a cached copy is served only after a GET of its
+    version counter still matches, otherwise it is reloaded.
+    """
+
+    def _session_key(self, session_id: str) -> str:
+        return f"session:{self.db_prefix}:{session_id}"
+
+    def _memories_key(self, user_id: Optional[str]) -> str:
+        return f"memories:{self.db_prefix}:{user_id}"
+
+    def _version_key(self, kind: str, record_id: Optional[str] = None) -> str:
+        # Outside the sessions and memories keyspaces, which agno scans for listings
+        return f"{self.db_prefix}:cache_versions:{kind}" + (f":{record_id}" if record_id is not None else "")
+
+    def _bump_versions(self, *names: str) -> list[str]:
+        pipeline = self.redis_client.pipeline()
+        for name in names:
+            pipeline.incr(name)
+            if self.expire:
+                pipeline.expire(name, self.expire)
+        results = pipeline.execute()
+        return [str(result) for result in results[::2 if self.expire else 1]]
+
+    def _current_versions(self, *names: str) -> tuple:
+        return tuple(str(version) if version is not None else None for version in self.redis_client.mget(list(names)))
+
+    def get_session(self, session_id: str, session_type: SessionType, user_id: Optional[str] = None, deserialize: Optional[bool] = True, **kwargs):
+        if session_type != SessionType.AGENT or not deserialize or kwargs:
+            return super().get_session(session_id=session_id, session_type=session_type, user_id=user_id, deserialize=deserialize, **kwargs)
+        key = self._session_key(session_id)
+        version_key = self._version_key("session", session_id)
+        cached = session_cache.get(key, "session")
+        if cached is not None:
+            data, version = cached
+            if version is not None and self._current_versions(version_key) == (version,):
+                if user_id is None or data.get("user_id") == user_id:
+                    return AgentSession.from_dict(data)
+            else:
+                metrics.increment("session_cache_stale", "session")
+        # The version is read first, a write landing in between only makes the next lookup reload
+        (version,) = self._current_versions(version_key)
+        session = super().get_session(session_id=session_id, session_type=session_type, user_id=user_id, deserialize=deserialize)
+        if isinstance(session, AgentSession):
+            session_cache.put(key, (session.to_dict(), version))
+        return session
+
+    def upsert_session(self, session, *args, **kwargs):
+        result = super().upsert_session(session, *args, **kwargs)
+        key = self._session_key(session.session_id)
+        session_cache.invalidate(key)
+        if result is None:
+            return result
+        (version,) = self._bump_versions(self._version_key("session", session.session_id))
+        if isinstance(result, AgentSession):
+            session_cache.put(key, (result.to_dict(), version))
+        return result
+
+    def delete_session(self, session_id: str, *args, **kwargs):
+        session_cache.invalidate(self._session_key(session_id))
+        result = super().delete_session(session_id, *args, **kwargs)
+        self._bump_versions(self._version_key("session", session_id))
+        return result
+
+    def delete_sessions(self, session_ids: list[str], *args, **kwargs):
+        for session_id in session_ids:
+            session_cache.invalidate(self._session_key(session_id))
+        result = super().delete_sessions(session_ids, *args, **kwargs)
+        if session_ids:
+            self._bump_versions(*(self._version_key("session", session_id) for session_id in session_ids))
+        return result
+
+    def rename_session(self, session_id: str, *args, **kwargs):
+        session_cache.invalidate(self._session_key(session_id))
+        result = super().rename_session(session_id, *args, **kwargs)
+        self._bump_versions(self._version_key("session", session_id))
+        return result
+
+    def _memories_version_keys(self, user_id: Optional[str]) -> tuple[str, str]:
+        # Writes without a user (clear_memories, deletes by id only) bump the agent wide counter
+        return self._version_key("memories", user_id), self._version_key("memories")
+
+    def get_user_memories(self, *args, **kwargs):
+        user_id = kwargs.get("user_id")
+        if args or set(kwargs) != {"user_id"}:
+            return super().get_user_memories(*args, **kwargs)
+        key = self._memories_key(user_id)
+        version_keys = self._memories_version_keys(user_id)
+        cached = session_cache.get(key, "memories")
+        versions = self._current_versions(*version_keys)
+        if cached is not None:
+            memories, cached_versions = cached
+            if versions[0] is not None and versions == cached_versions:
+                return [UserMemory.from_dict(memory) for memory in memories]
+            metrics.increment("session_cache_stale", "memories")
+        memories = super().get_user_memories(user_id=user_id)
+        if isinstance(memories, list):
+            session_cache.put(key, ([memory.to_dict() for memory in memories], versions))
+        return memories
+
+    def upsert_user_memory(self, memory, *args, **kwargs):
+        result = super().upsert_user_memory(memory, *args, **kwargs)
+        self._invalidate_memories(memory.user_id)
+        return result
+
+    def delete_user_memory(self, memory_id: str, *args, **kwargs):
+        result = super().delete_user_memory(memory_id, *args, **kwargs)
+        self._invalidate_memories(kwargs.get("user_id"))
+        return result
+
+    def delete_user_memories(self, memory_ids: list[str], *args, **kwargs):
+        result = super().delete_user_memories(memory_ids, *args, **kwargs)
+        self._invalidate_memories(kwargs.get("user_id"))
+        return result
+
+    def clear_memories(self, *args, **kwargs):
+        result = super().clear_memories(*args, **kwargs)
+        self._invalidate_memories(None)
+        return result
+
+    def _invalidate_memories(self, user_id: Optional[str]) -> None:
+        if user_id is not None:
+            session_cache.invalidate(self._memories_key(user_id))
+            self._bump_versions(self._version_key("memories", user_id))
+        else:
+            session_cache.invalidate_prefix(f"memories:{self.db_prefix}:")
+            self._bump_versions(self._version_key("memories"))
@@ -0,0 +1,165 @@
+import asyncio
+import functools
+import hashlib
+import importlib
+import inspect
+import json
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from agno.tools.function import Function
+from agno.tools.toolkit import Toolkit
+from config.database.cache_manager import cache_manager
+from config.database.serializer import SerializationError
+from config.monitory.metrics import metrics
+from core.agets.deadline import remaining_time
+from models.entity.tools_entity import ToolsEntity
+
+logger = logging.getLogger("ToolRegistry")
+
+# Arguments agno injects into tools, they are not part of the model's call and must not key cached results:
+# results of tools reading them are keyed by the user and session of the run instead.
+_INJECTED_ARGS = {"agent", "team", "run_context", "session_state", "dependencies", "images", "videos", "audios", "files"}
+
+AgnoTool = Union[Toolkit, Callable, Function, Dict]
+
+
+class ToolRegistry:
+    """
+    Resolves tools.function_caller strings ("package.module:attribute" or "package.module.attribute")
+    once per process. Resolved callables run with a per tool timeout, sync callables are moved to a
+    thread so calls of the same model turn can run concurrently, and results are reused for
+    result_ttl_seconds when the same tool is called again with the same arguments (and, for tools
+    reading the run context, by the same user in the same session).
+    """
+
+    def __init__(self):
+        self._tools: dict[int, ToolsEntity] = {}
+        self._resolved: dict[int, AgnoTool] = {}
+        self._invalid: dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _import(function_caller: str) -> Any:
+        module_path, _, attribute = function_caller.partition(":")
+        if not attribute:
+            module_path, _, attribute = function_caller.rpartition(".")
+        if not module_path or not attribute:
+            raise ValueError(f"function_caller '{function_caller}' must be 'module:attribute' or 'module.attribute'")
+        target = importlib.import_module(module_path)
+        for part in attribute.split("."):
+            target = getattr(target, part)
+        return target
+
+    def register(self, tools: list[ToolsEntity]) -> None:
+        for tool in tools:
+            with self._lock:
+                self._tools[tool.id] = tool
+                self._resolved.pop(tool.id, None)
+                self._invalid.pop(tool.id, None)
+            try:
+                self._resolve(tool)
+            except Exception as e:
+                self._invalid[tool.id] = str(e)
+                logger.error(f"Tool {tool.id} ({tool.name}) can't be resolved from '{tool.function_caller}': {e}")
+
+    def missing(self, tool_ids: list[int]) -> list[int]:
+        return [tool_id for tool_id in tool_ids if tool_id not in self._tools]
+
+    def invalid_tools(self) -> dict[int, str]:
+        return dict(self._invalid)
+
+    def get_tool_settings(self, tool_id: int) -> Optional[ToolsEntity]:
+        return self._tools.get(tool_id)
+
+    def build_tools(self, tool_ids: list[int]) -> List[AgnoTool]:
+        tools = []
+        for tool_id in tool_ids:
+            resolved = self._resolved.get(tool_id)
+            if resolved is None:
+                logger.warning(f"Tool {tool_id} is not registered or invalid, skipping it.")
+                continue
+            tools.append(resolved)
+        return tools
+
+    def _resolve(self, tool: ToolsEntity) -> AgnoTool:
+        target = self._import(tool.function_caller)
+        if inspect.isclass(target) and issubclass(target, Toolkit):
+            target = target()
+        if isinstance(target, Toolkit):
+            for function in getattr(target, "functions", {}).values():
+                if function.entrypoint is not None:
+                    function.entrypoint = self._wrap(function.entrypoint, tool)
+            resolved: AgnoTool = target
+        elif isinstance(target, Function):
+            if target.entrypoint is not None:
+                target.entrypoint = self._wrap(target.entrypoint, tool)
+            resolved = target
+        elif callable(target):
+            resolved = self._wrap(target, tool)
+        else:
+            raise TypeError(f"'{tool.function_caller}' is not a callable, Function or Toolkit")
+        with self._lock:
+            self._resolved[tool.id] = resolved
+        return resolved
+
+    @staticmethod
+    def _injected_args(function: Callable) -> set[str]:
+        try:
+            return set(inspect.signature(function).parameters) & _INJECTED_ARGS
+        except (TypeError, ValueError):
+            return set()
+
+    @staticmethod
+    def _result_key(tool: ToolsEntity, function_name: str, args: tuple, kwargs: dict, scoped: bool) -> str:
+        call_args = {key: value for key, value in kwargs.items() if key not in _INJECTED_ARGS}
+        scope = None
+        if scoped:
+            run_context = kwargs.get("run_context")
+            scope = [getattr(run_context, "user_id", None), getattr(run_context, "session_id", None)]
+        payload = json.dumps([args, call_args, scope], sort_keys=True, default=str)
+        return f"tool_result:{tool.id}:{function_name}:{hashlib.sha1(payload.encode()).hexdigest()}"
+
+    def _wrap(self, function: Callable, tool: ToolsEntity) -> Callable:
+        if getattr(function, "__tool_registry_wrapped__", False):
+            return function
+        tool_timeout = tool.timeout_seconds or None
+        result_ttl = tool.result_ttl_seconds or 0
+        is_coroutine = inspect.iscoroutinefunction(function)
+        injected = self._injected_args(function)
+        if result_ttl > 0 and injected and "run_context" not in injected:
+            # Its output may depend on the caller but the run's user and session are unknown to the key
+            logger.warning(f"Tool {tool.name} reads {sorted(injected)} without run_context, its results are not cached.")
+            result_ttl = 0
+
+        @functools.wraps(function)
+        async def wrapper(*args, **kwargs):
+            key = None
+            if result_ttl > 0:
+                key = self._result_key(tool, function.__name__, args, kwargs, scoped=bool(injected))
+                cached = await cache_manager.get(key)
+                if cached:
+                    metrics.increment("tool_result_cache_hits", tool.name)
+                    return cached["result"]
+            call = function(*args, **kwargs) if is_coroutine else asyncio.to_thread(function, *args, **kwargs)
+            timeout = remaining_time(tool_timeout)
+            try:
+                result = await asyncio.wait_for(call, timeout=timeout)
+            except asyncio.TimeoutError:
+                metrics.increment("tool_timeouts", tool.name)
+                metrics.increment("deadline_timeouts", "tool")
+                logger.warning(f"Tool {tool.name} timed out after {timeout}s")
+                return f"Tool {tool.name} timed out after {timeout} seconds."
+            if key is not None:
+                try:
+                    await cache_manager.set(key, {"result": result}, ttl=result_ttl)
+                except SerializationError as e:
+                    logger.warning(f"Result of tool {tool.name} can't be cached: {e}")
+            return result
+
+        wrapper.__tool_registry_wrapped__ = True
+        return wrapper
+
+
+tool_registry = ToolRegistry()
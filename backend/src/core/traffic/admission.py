@@ -0,0 +1,151 @@
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import AsyncGenerator
+
+from config.monitory.metrics import metrics
+from core.agets.deadline import Deadline
+
+
+class PriorityClass(IntEnum):
+    INTERACTIVE = 0
+    BATCH = 1
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(f"Server overloaded ({reason}), retry later")
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+@dataclass
+class AdmissionTicket:
+    priority: PriorityClass
+    weight: int
+    admitted_at: float = field(default_factory=time.monotonic)
+
+
+@dataclass
+class _Waiter:
+    weight: int
+    future: asyncio.Future
+
+
+class AdmissionController:
+    """
+    Bounds the agent executions running on this worker and the requests queued for a slot.
+    Queued requests are admitted by priority class, then in arrival order; batch requests can't use the
+    slots reserved for interactive ones. A request is shed up front (503 + Retry-After) when the queue
+    is full or when the estimated wait, from the queued work and the average execution time, wouldn't
+    fit in its deadline, instead of timing out after having waited.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int, interactive_reserved: int, initial_service_time: float):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.interactive_reserved = min(interactive_reserved, max_concurrency - 1)
+        self._service_time = initial_service_time
+        self._in_flight = 0
+        self._queues: dict[PriorityClass, deque[_Waiter]] = {priority: deque() for priority in PriorityClass}
+        metrics.register_gauge("admission", self.get_stats)
+
+    def _capacity(self, priority: PriorityClass) -> int:
+        if priority == PriorityClass.INTERACTIVE:
+            return self.max_concurrency
+        return self.max_concurrency - self.interactive_reserved
+
+    def _queued_ahead(self, priority: PriorityClass) -> list[_Waiter]:
+        return [waiter for queue_priority, queue in self._queues.items() if queue_priority <= priority for waiter in queue]
+
+    def estimated_wait(self, priority: PriorityClass, weight: int) -> float:
+        capacity = self._capacity(priority)
+        work_ahead = self._in_flight + sum(waiter.weight for waiter in self._queued_ahead(priority)) + weight
+        return max(work_ahead - capacity, 0) * self._service_time / capacity
+
+    def _shed(self, priority: PriorityClass, reason: str, retry_after: float) -> AdmissionRejected:
+        metrics.increment("admission_shed", f"{priority.name.lower()}:{reason}")
+        return AdmissionRejected(reason, retry_after)
+
+    async def acquire(self, priority: PriorityClass, deadline: Deadline, weight: int = 1) -> AdmissionTicket:
+        weight = min(max(weight, 1), self._capacity(priority))
+        if not self._queued_ahead(priority) and self._in_flight + weight <= self._capacity(priority):
+            self._in_flight += weight
+            metrics.increment("admission_admitted", priority.name.lower())
+            return AdmissionTicket(priority, weight)
+
+        estimate = self.estimated_wait(priority, weight)
+        remaining = deadline.remaining()
+        if sum(len(queue) for queue in self._queues.values()) >= self.max_queue:
+            raise self._shed(priority, "queue_full", estimate)
+        if estimate >= remaining:
+            raise self._shed(priority, "deadline", estimate)
+
+        waiter = _Waiter(weight, asyncio.get_running_loop().create_future())
+        self._queues[priority].append(waiter)
+        started_at = time.monotonic()
+        try:
+            await asyncio.wait_for(waiter.future, timeout=remaining)
+        except asyncio.TimeoutError:
+            self._discard(priority, waiter)
+            raise self._shed(priority, "queue_timeout", self.estimated_wait(priority, weight))
+        except asyncio.CancelledError:
+            self._discard(priority, waiter)
+            if waiter.future.done() and not waiter.future.cancelled():
+                self._release_slots(weight)
+            raise
+        metrics.observe("admission_queue_seconds", time.monotonic() - started_at, priority.name.lower())
+        metrics.increment("admission_admitted", priority.name.lower())
+        return AdmissionTicket(priority, weight)
+
+    def release(self, ticket: AdmissionTicket) -> None:
+        elapsed = time.monotonic() - ticket.admitted_at
+        self._service_time = 0.9 * self._service_time + 0.1 * elapsed
+        self._release_slots(ticket.weight)
+
+    @asynccontextmanager
+    async def admit(self, priority: PriorityClass, deadline: Deadline, weight: int = 1) -> AsyncGenerator[AdmissionTicket, None]:
+        ticket = await self.acquire(priority, deadline, weight)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def _discard(self, priority: PriorityClass, waiter: _Waiter) -> None:
+        try:
+            self._queues[priority].remove(waiter)
+        except ValueError:
+            pass
+
+    def _release_slots(self, weight: int) -> None:
+        self._in_flight -= weight
+        for priority in PriorityClass:
+            queue = self._queues[priority]
+            while queue and self._in_flight + queue[0].weight <= self._capacity(priority):
+                waiter = queue.popleft()
+                if waiter.future.done():
+                    continue
+                self._in_flight += waiter.weight
+                waiter.future.set_result(None)
+            if queue:
+                return
+
+    def get_stats(self) -> dict:
+        return {
+            "in_flight": self._in_flight,
+            "queued": {priority.name.lower(): len(queue) for priority, queue in self._queues.items()},
+            "service_time_seconds": round(self._service_time, 3),
+        }
+
+
+admission_controller = AdmissionController(
+    max_concurrency=int(os.getenv("ADMISSION_MAX_CONCURRENCY", 32)),
+    max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", 128)),
+    interactive_reserved=int(os.getenv("ADMISSION_INTERACTIVE_RESERVED", 8)),
+    initial_service_time=float(os.getenv("ADMISSION_INITIAL_SERVICE_TIME", 5)),
+)
@@ -0,0 +1,249 @@
+import asyncio
+import logging
+import math
+import os
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from config.database.redis_manager import redis_manager
+from config.monitory.metrics import metrics
+
+logger = logging.getLogger("RateLimiter")
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+
+# Token bucket refilled from the Redis clock, so every worker sees the same state.
+# ARGV: capacity, refill per second, tokens wanted, minimum to grant anything, unconditional debit (negative to refund).
+# Returns the tokens granted, the tokens left and the milliseconds until one token (or the minimum) is back.
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local minimum = tonumber(ARGV[4])
+local debit = tonumber(ARGV[5])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, math.min(capacity, tokens + math.max(0, now - ts) / 1000 * rate) - debit)
+local granted = 0
+if minimum > 0 and tokens >= minimum then
+    granted = math.min(requested, math.floor(tokens))
+    tokens = tokens - granted
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000) + 1000)
+local need = math.max(minimum, 1)
+local retry = 0
+if tokens < need then
+    retry = math.ceil((need - tokens) / rate * 1000)
+end
+return {granted, tostring(tokens), retry}
+"""
+
+
+@dataclass(frozen=True)
+class Budget:
+    name: str
+    capacity: float
+    refill_per_second: float
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0 and self.refill_per_second > 0
+
+
+@dataclass
+class RateLimitDecision:
+    allowed: bool
+    limit: int
+    remaining: int
+    reset_seconds: int
+    retry_after: int = 0
+
+    def headers(self) -> dict[str, str]:
+        headers = {
+            "RateLimit-Limit": str(self.limit),
+            "RateLimit-Remaining": str(self.remaining),
+            "RateLimit-Reset": str(self.reset_seconds),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(self.retry_after)
+        return headers
+
+
+class RateLimitExceeded(Exception):
+    def __init__(self, decision: RateLimitDecision):
+        super().__init__("Rate limit exceeded, retry later")
+        self.decision = decision
+
+
+@dataclass
+class _Lease:
+    tokens: float
+    shared_remaining: float
+    expires_at: float
+
+
+class RateLimiter:
+    """
+    Token buckets per user and per agent for requests per second and LLM tokens per minute, kept in Redis.
+    Request buckets are taken in leases: a worker takes a slice of the bucket in one round trip and
+    spends it locally until the lease expires, unused tokens are lost so the shared limit always holds.
+    Requests rejected after the check (admission control) get their request tokens back.
+    LLM tokens are only known after the run, so they are debited afterwards (the bucket can go negative)
+    and checked before the next run from a short lived snapshot of the bucket.
+    Redis failures let the request through: rate limiting never takes the API down.
+    """
+
+    def __init__(self):
+        self.user_requests = Budget("rps", float(os.getenv("RATE_LIMIT_USER_BURST", 10)), float(os.getenv("RATE_LIMIT_USER_RPS", 5)))
+        self.agent_requests = Budget("rps", float(os.getenv("RATE_LIMIT_AGENT_BURST", 100)), float(os.getenv("RATE_LIMIT_AGENT_RPS", 50)))
+        user_tpm = float(os.getenv("RATE_LIMIT_USER_TOKENS_PER_MINUTE", 100000))
+        agent_tpm = float(os.getenv("RATE_LIMIT_AGENT_TOKENS_PER_MINUTE", 1000000))
+        self.user_tokens = Budget("tpm", user_tpm, user_tpm / 60)
+        self.agent_tokens = Budget("tpm", agent_tpm, agent_tpm / 60)
+        self.lease_fraction = float(os.getenv("RATE_LIMIT_LEASE_FRACTION", 0.1))
+        # Floor of the lease, so small buckets (the default user burst of 10) are leased too
+        self.min_lease = float(os.getenv("RATE_LIMIT_MIN_LEASE", 2))
+        self.lease_ttl = float(os.getenv("RATE_LIMIT_LEASE_TTL", 1.0))
+        self.snapshot_ttl = float(os.getenv("RATE_LIMIT_SNAPSHOT_TTL", 1.0))
+        self._script = None
+        self._leases: dict[str, _Lease] = {}
+        self._snapshots: dict[str, tuple[float, float]] = {}
+        self._background_tasks: set[asyncio.Task] = set()
+
+    def _get_script(self):
+        if self._script is None:
+            self._script = redis_manager.get_async_redis_client().register_script(TOKEN_BUCKET_SCRIPT)
+        return self._script
+
+    @staticmethod
+    def _key(scope: str, subject, budget: Budget) -> str:
+        return f"rate_limit:{scope}:{subject}:{budget.name}"
+
+    async def _call(self, key: str, budget: Budget, requested: float, minimum: float, debit: float) -> tuple[float, float, float]:
+        granted, tokens, retry_ms = await self._get_script()(
+            keys=[key],
+            args=[budget.capacity, budget.refill_per_second, requested, minimum, debit],
+        )
+        tokens = float(tokens)
+        self._snapshots[key] = (tokens, time.monotonic())
+        return float(granted), tokens, int(retry_ms) / 1000
+
+    async def _take(self, key: str, budget: Budget, cost: float) -> RateLimitDecision:
+        cost = min(cost, budget.capacity)
+        now = time.monotonic()
+        lease = self._leases.get(key)
+        if lease is not None and lease.expires_at > now and lease.tokens >= cost:
+            lease.tokens -= cost
+            metrics.increment("rate_limit_lease_hits", budget.name)
+            return self._decision(True, budget, lease.shared_remaining + lease.tokens)
+        lease_size = max(cost, min(budget.capacity, max(self.min_lease, math.floor(budget.capacity * self.lease_fraction))))
+        granted, remaining, retry_after = await self._call(key, budget, lease_size, cost, 0)
+        if granted < cost:
+            return self._decision(False, budget, remaining, retry_after)
+        self._leases[key] = _Lease(granted - cost, remaining, now + self.lease_ttl)
+        return self._decision(True, budget, remaining + granted - cost)
+
+    async def _give_back(self, key: str, budget: Budget, cost: float) -> None:
+        cost = min(cost, budget.capacity)
+        lease = self._leases.get(key)
+        if lease is not None and lease.expires_at > time.monotonic():
+            lease.tokens += cost
+            return
+        await self._call(key, budget, 0, 0, -cost)
+
+    async def _check_tokens(self, key: str, budget: Budget) -> RateLimitDecision:
+        snapshot = self._snapshots.get(key)
+        if snapshot is not None and snapshot[0] >= 1 and time.monotonic() - snapshot[1] < self.snapshot_ttl:
+            return self._decision(True, budget, snapshot[0])
+        _, remaining, retry_after = await self._call(key, budget, 0, 0, 0)
+        return self._decision(remaining >= 1, budget, remaining, retry_after)
+
+    @staticmethod
+    def _decision(allowed: bool, budget: Budget, remaining: float, retry_after: float = 0) -> RateLimitDecision:
+        remaining = max(remaining, 0)
+        return RateLimitDecision(
+            allowed=allowed,
+            limit=int(budget.capacity),
+            remaining=int(remaining),
+            reset_seconds=math.ceil((budget.capacity - remaining) / budget.refill_per_second),
+            retry_after=max(1, math.ceil(retry_after)),
+        )
+
+    def _buckets(self, user_key: str, agent_ids: list[int]):
+        if self.user_requests.enabled:
+            yield "request", self._key("user", user_key, self.user_requests), self.user_requests, len(agent_ids)
+        if self.agent_requests.enabled:
+            for agent_id in agent_ids:
+                yield "request", self._key("agent", agent_id, self.agent_requests), self.agent_requests, 1
+        if self.user_tokens.enabled:
+            yield "tokens", self._key("user", user_key, self.user_tokens), self.user_tokens, 0
+        if self.agent_tokens.enabled:
+            for agent_id in agent_ids:
+                yield "tokens", self._key("agent", agent_id, self.agent_tokens), self.agent_tokens, 0
+
+    async def check(self, user_key: str, agent_ids: list[int]) -> Optional[RateLimitDecision]:
+        """
+        Checks every bucket of the caller and the agents, raising RateLimitExceeded when one is empty.
+        Returns the most restrictive decision, used for the rate limit headers.
+        """
+        if not RATE_LIMIT_ENABLED:
+            return None
+        try:
+            decisions = []
+            for kind, key, budget, cost in self._buckets(user_key, agent_ids):
+                decision = await (self._take(key, budget, cost) if kind == "request" else self._check_tokens(key, budget))
+                if not decision.allowed:
+                    metrics.increment("rate_limit_rejected", f"{key.split(':')[1]}:{budget.name}")
+                    raise RateLimitExceeded(decision)
+                decisions.append(decision)
+        except RateLimitExceeded:
+            raise
+        except Exception as e:
+            metrics.increment("rate_limit_errors")
+            logger.warning(f"Rate limiter unavailable, letting the request through: {e}")
+            return None
+        return min(decisions, key=lambda decision: decision.remaining / max(decision.limit, 1), default=None)
+
+    def refund(self, user_key: str, agent_ids: list[int]) -> None:
+        """Gives back the request tokens taken by check() for a request rejected afterwards, in background."""
+        if not RATE_LIMIT_ENABLED:
+            return
+        task = asyncio.create_task(self._refund(user_key, agent_ids))
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    async def _refund(self, user_key: str, agent_ids: list[int]) -> None:
+        try:
+            for kind, key, budget, cost in self._buckets(user_key, agent_ids):
+                if kind == "request":
+                    await self._give_back(key, budget, cost)
+            metrics.increment("rate_limit_refunds")
+        except Exception as e:
+            metrics.increment("rate_limit_errors")
+            logger.warning(f"Could not refund the request tokens of {user_key}: {e}")
+
+    def record_tokens(self, user_key: str, agent_id: int, tokens: int) -> None:
+        """Debits the LLM tokens used by a run, in background so it never adds latency to the response."""
+        if not RATE_LIMIT_ENABLED or not tokens:
+            return
+        task = asyncio.create_task(self._debit(user_key, agent_id, tokens))
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    async def _debit(self, user_key: str, agent_id: int, tokens: int) -> None:
+        try:
+            if self.user_tokens.enabled:
+                await self._call(self._key("user", user_key, self.user_tokens), self.user_tokens, 0, 0, tokens)
+            if self.agent_tokens.enabled:
+                await self._call(self._key("agent", agent_id, self.agent_tokens), self.agent_tokens, 0, 0, tokens)
+        except Exception as e:
+            metrics.increment("rate_limit_errors")
+            logger.warning(f"Could not debit {tokens} LLM tokens: {e}")
+
+
+rate_limiter = RateLimiter()
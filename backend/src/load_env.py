@@ -1,20 +1,21 @@
+import logging
 import os
 from dotenv import load_dotenv
 
+logger = logging.getLogger("LoadEnv")
+
 def load_env():
     if os.getenv("ENVIRONMENT") != "production":
         try:
             load_dotenv("src/.env.local")
-            print("Loaded .env.local for non-production environment.")
-            print("Environment variables:")
-            print("Database URL:", os.getenv("DATABASE_URL"))
+            logger.info("Loaded .env.local for non-production environment.")
         except RuntimeError as e:
-            print("Error loading .env.local:", e)
+            logger.error(f"Error loading .env.local: {e}")
             raise e
     else:
         try:
             load_dotenv("src/.env")
-            print("Loaded .env for production environment.")
+            logger.info("Loaded .env for production environment.")
         except RuntimeError as e:
-            print("Error loading .env:", e)
-            raise e
\ No newline at end of file
+            logger.error(f"Error loading .env: {e}")
+            raise e
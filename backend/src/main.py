@@ -1,42 +1,123 @@
+from config.monitory.logging_config import configure_logging
+configure_logging()
 from load_env import load_env
 load_env()
 
+import asyncio
 import contextlib
+import logging
+import os
 #from config.monitory.otel_config import otel_config
 from config.monitory.otel_ai_config import otel_ai_config
+from config.monitory.profiling import LOOP_LAG_MONITOR_ENABLED, loop_lag_monitor
 from fastapi import FastAPI, HTTPException, status
+from fastapi.responses import JSONResponse
 from config.database.postgres_manager import postgres_manager
-from controllers import manage_agents
+from config.database.redis_manager import redis_manager
+from config.database.redis_codec import REDIS_CODEC_READ_ENABLED
+from config.database.cache_manager import cache_manager
+from controllers import admin, manage_agents, monitory, stats
+from controllers.responses import DefaultJSONResponse
+from repository.agents_repository import AgentsRepository
+from repository.agents_usage_repository import AgentsUsageRepository
+from repository.tools_repository import ToolsRepository
+from core.tools.tool_registry import tool_registry
+from core.agets.prompt_cache import prompt_cache_manager
+from config.llm.ollama_manager import ollama_manager
+from services.manager_agents import ManagerAgentsService
+from services.warmup_agents import WarmupAgentsService
+from services.execution_log import execution_log
+from services.agent_stats import usage_rollup
+from services.agent_memory_retention import agent_memory_retention
+
+logger = logging.getLogger("Main")
+
+
+async def warmup_agents(app: FastAPI):
+    agents_usage_repository = AgentsUsageRepository()
+    warmup_service = WarmupAgentsService(
+        ManagerAgentsService(AgentsRepository(), agents_usage_repository, ToolsRepository()),
+        agents_usage_repository,
+    )
+    await warmup_service.warmup(
+        top_n=int(os.getenv("WARMUP_TOP_N_AGENTS", 20)),
+        time_budget=float(os.getenv("WARMUP_TIME_BUDGET", 30)),
+    )
+    app.state.ready = True
 
 
 @contextlib.asynccontextmanager
 async def lifespan(app: FastAPI):
-    print("Application is starting up...")
+    logger.info("Application is starting up...")
+    if LOOP_LAG_MONITOR_ENABLED:
+        loop_lag_monitor.start()
     #otel_config.initialize(app)
     otel_ai_config.initialize_langfuse()
     await postgres_manager.connect()
-    print("FastAPI startup complete.")
+    await cache_manager.connect()
+    if REDIS_CODEC_READ_ENABLED:
+        await redis_manager.load_codec_dictionary()
+    tool_registry.register(await ToolsRepository().get_all_tools())
+    if tool_registry.invalid_tools():
+        logger.warning(f"Invalid tools found on startup: {tool_registry.invalid_tools()}")
+    await ollama_manager.start()
+    await execution_log.start()
+    usage_rollup.start()
+    agent_memory_retention.start()
+    app.state.ready = False
+    warmup_task = asyncio.create_task(warmup_agents(app))
+    logger.info("FastAPI startup complete.")
     yield
-    print("Application is shutting down...")
+    logger.info("Application is shutting down...")
     #otel_config.shutdown()
+    warmup_task.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await warmup_task
+    await agent_memory_retention.close()
+    await usage_rollup.close()
+    await execution_log.close()
+    await prompt_cache_manager.close()
+    await ollama_manager.close()
     await postgres_manager.disconnect()
-    print("FastAPI shutdown complete.")
+    await cache_manager.disconnect()
+    await redis_manager.disconnect()
+    if LOOP_LAG_MONITOR_ENABLED:
+        await loop_lag_monitor.close()
+    logger.info("FastAPI shutdown complete.")
+
+app = FastAPI(lifespan=lifespan, default_response_class=DefaultJSONResponse)
+
+EXPOSED_ERROR_STATUS = {status.HTTP_502_BAD_GATEWAY, status.HTTP_503_SERVICE_UNAVAILABLE, status.HTTP_504_GATEWAY_TIMEOUT}
 
-app = FastAPI(lifespan=lifespan)
 @app.exception_handler(HTTPException)
 async def http_exception_handler(_, exc):
-    return {
-        "error": {
-            "code": exc.status_code,
-            "message": str("Unexpected error, call the system manager if it persists...")
-        }
-    }, status.HTTP_500_INTERNAL_SERVER_ERROR
+    return JSONResponse(
+        status_code=exc.status_code,
+        headers=exc.headers,
+        content={
+            "error": {
+                "code": exc.status_code,
+                "message": exc.detail if exc.status_code < 500 or exc.status_code in EXPOSED_ERROR_STATUS
+                else "Unexpected error, call the system manager if it persists..."
+            }
+        },
+    )
 
 
 app.include_router(manage_agents.router)
+app.include_router(monitory.router)
+app.include_router(stats.router)
+app.include_router(admin.router)
 
 
 
 @app.get("/health")
 async def health():
     return {"message": "health!"}
+
+
+@app.get("/ready")
+async def ready():
+    if not getattr(app.state, "ready", False):
+        return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content={"message": "warming up"})
+    return {"message": "ready!"}
@@ -1,7 +1,7 @@
 from pydantic import BaseModel
 from dataclasses import dataclass
 from enum import Enum
-from typing import Optional
+from typing import Any, Optional
 
 class ModelLLM(Enum):
     GEMINI = 1
@@ -24,6 +24,17 @@ class ModelLLM(Enum):
     
 
 
+class StorageBackend(str, Enum):
+    """Where a stateful agent keeps its sessions and memories."""
+    REDIS = "redis"
+    POSTGRES = "postgres"
+
+
+class FallbackModel(BaseModel):
+    modelLLM: ModelLLM
+    typeModel: str
+
+
 class AgentFactoryInput(BaseModel):
     id: int | None = None
     name: str
@@ -35,9 +46,13 @@ class AgentFactoryInput(BaseModel):
     instructions: Optional[str] = None
     output_parser: Optional[str] = None
     has_storage: bool = False
+    storage_backend: StorageBackend = StorageBackend.REDIS
     knowledge_collection_name: Optional[str] = None
     knowledge_description: Optional[str] = None
     knowledge_top_k: Optional[int] = 5
+    context_token_ceiling: Optional[int] = None
+    timeout_seconds: Optional[float] = None
+    fallback_models: list[FallbackModel] = []
 
     @classmethod
     def from_dict(cls, data: dict):
@@ -48,4 +63,24 @@ class AgentFactoryInput(BaseModel):
 class AgentExecuteOutput(BaseModel):
     response: str
     session_id: str
-    content_type: str
\ No newline at end of file
+    content_type: str
+    total_tokens: int = 0
+    parsed: Optional[Any] = None
+    repaired: bool = False
+
+
+class StreamEventType(str, Enum):
+    DELTA = "delta"
+    PARTIAL = "partial"
+    FINAL = "final"
+    ERROR = "error"
+
+
+class AgentStreamEvent(BaseModel):
+    type: StreamEventType
+    content: Optional[str] = None
+    data: Optional[Any] = None
+    session_id: Optional[str] = None
+    repaired: Optional[bool] = None
+    total_tokens: Optional[int] = None
+    error: Optional[str] = None
\ No newline at end of file
@@ -2,7 +2,12 @@ from .tools_entity import ToolsEntity
 from typing import Optional
 
 class AgentEntity:
-    
+    __slots__ = (
+        "id", "name", "description", "model", "type_model", "tools", "reasoning", "output_parser", "instructions",
+        "has_storage", "storage_backend", "knowledge_collection_name", "knowledge_description", "knowledge_top_k",
+        "context_token_ceiling", "timeout_seconds", "fallback_models", "created_at", "updated_at", "version"
+    )
+
     def __init__(
         self,
         id: int,
@@ -15,11 +20,16 @@ class AgentEntity:
         output_parser: Optional[str] = None,
         instructions: Optional[str] = None,
         has_storage: bool = False,
+        storage_backend: str = "redis",
         knowledge_collection_name: Optional[str] = None,
         knowledge_description: Optional[str] = None,
         knowledge_top_k: Optional[int] = 5,
+        context_token_ceiling: Optional[int] = None,
+        timeout_seconds: Optional[float] = None,
+        fallback_models: Optional[list[dict]] = None,
         created_at=None,
-        updated_at=None
+        updated_at=None,
+        version: int = 1
     ):
         self.id = id
         self.name = name
@@ -31,13 +41,19 @@ class AgentEntity:
         self.output_parser = output_parser
         self.instructions = instructions
         self.has_storage = has_storage
+        self.storage_backend = storage_backend
         self.knowledge_collection_name = knowledge_collection_name
         self.knowledge_description = knowledge_description
         self.knowledge_top_k = knowledge_top_k
+        self.context_token_ceiling = context_token_ceiling
+        self.timeout_seconds = timeout_seconds
+        self.fallback_models = fallback_models or []
         self.created_at = created_at
         self.updated_at = updated_at
+        self.version = version
 
 class AgentResumeEntity:
+    __slots__ = ("id", "name")
 
     def __init__(self, id: int, name: str):
         self.id = id
@@ -0,0 +1,32 @@
+from datetime import datetime
+from typing import Optional
+
+class AgentExecutionEntity:
+
+    COLUMNS = ("executed_at", "agent_id", "user_id", "session_id", "llm", "type_model", "status", "latency_ms", "total_tokens")
+    __slots__ = COLUMNS
+
+    def __init__(
+        self,
+        executed_at: datetime,
+        agent_id: int,
+        user_id: Optional[str],
+        session_id: Optional[str],
+        llm: int,
+        type_model: str,
+        status: str,
+        latency_ms: int,
+        total_tokens: int = 0
+    ):
+        self.executed_at = executed_at
+        self.agent_id = agent_id
+        self.user_id = user_id
+        self.session_id = session_id
+        self.llm = llm
+        self.type_model = type_model
+        self.status = status
+        self.latency_ms = latency_ms
+        self.total_tokens = total_tokens
+
+    def to_record(self) -> tuple:
+        return tuple(getattr(self, column) for column in self.COLUMNS)
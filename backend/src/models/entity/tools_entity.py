@@ -1,7 +1,22 @@
+from typing import Optional
+
 class ToolsEntity:
-    
-    def __init__(self, id: int, name: str, description: str, function_caller: str):
+    __slots__ = ("id", "name", "description", "function_caller", "timeout_seconds", "result_ttl_seconds", "has_side_effects")
+
+    def __init__(
+        self,
+        id: int,
+        name: str,
+        description: str,
+        function_caller: str,
+        timeout_seconds: Optional[float] = 30,
+        result_ttl_seconds: Optional[int] = 0,
+        has_side_effects: bool = True
+    ):
         self.id = id
         self.name = name
         self.description = description
-        self.function_caller = function_caller
\ No newline at end of file
+        self.function_caller = function_caller
+        self.timeout_seconds = timeout_seconds
+        self.result_ttl_seconds = result_ttl_seconds
+        self.has_side_effects = has_side_effects
\ No newline at end of file
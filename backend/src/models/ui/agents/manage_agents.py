@@ -1,12 +1,23 @@
 from pydantic import BaseModel
 from pydantic import BaseModel, Field, field_validator
+from enum import Enum
 from typing import Optional
-from models.dto.agents.agentLLM import ModelLLM
+from models.dto.agents.agentLLM import ModelLLM, AgentExecuteOutput, StorageBackend
 
 class GetAllAgentsResponse(BaseModel):
     id: int
     name: str
 
+class FallbackModelConfig(BaseModel):
+    model: int = Field(..., ge=1, le=7)
+    type_model: str = Field(..., min_length=1, max_length=255)
+
+    @field_validator('model')
+    @classmethod
+    def validate_model(cls, value: int) -> int:
+        ModelLLM.get_from_int(value)
+        return value
+
 class GetAgentByIdResponse(BaseModel):
     id: int
     name: str
@@ -18,9 +29,13 @@ class GetAgentByIdResponse(BaseModel):
     output_parser: Optional[str] = None
     instructions: Optional[str] = None
     has_storage: bool = False
+    storage_backend: StorageBackend = StorageBackend.REDIS
     knowledge_collection_name: Optional[str] = None
     knowledge_description: Optional[str] = None
     knowledge_top_k: Optional[int] = 5
+    context_token_ceiling: Optional[int] = None
+    timeout_seconds: Optional[float] = None
+    fallback_models: list[FallbackModelConfig] = []
 
     @classmethod
     def from_dict(cls, data: dict):
@@ -31,6 +46,43 @@ class ExecuteAgentRequest(BaseModel):
     prompt: str = Field(..., min_length=1)
     session_id: Optional[str] = None
 
+class FanoutPolicy(str, Enum):
+    ALL = "all"
+    FIRST_SUCCESS = "first_success"
+
+class FanoutStatus(str, Enum):
+    SUCCESS = "success"
+    ERROR = "error"
+    TIMEOUT = "timeout"
+    NOT_FOUND = "not_found"
+    CANCELLED = "cancelled"
+
+class FanoutExecuteRequest(BaseModel):
+    prompt: str = Field(..., min_length=1)
+    agent_ids: list[int] = Field(..., min_length=1, max_length=16)
+    session_id: Optional[str] = None
+    stream: bool = False
+    policy: FanoutPolicy = FanoutPolicy.ALL
+
+    @field_validator('agent_ids')
+    @classmethod
+    def validate_agent_ids(cls, value: list[int]) -> list[int]:
+        if any(agent_id <= 0 for agent_id in value):
+            raise ValueError("all agent IDs must be positive integers")
+        if len(value) != len(set(value)):
+            raise ValueError("agent_ids cannot contain duplicate IDs")
+        return value
+
+class FanoutAgentResult(BaseModel):
+    agent_id: int
+    status: FanoutStatus
+    result: Optional[AgentExecuteOutput] = None
+    error: Optional[str] = None
+    elapsed_seconds: float = 0
+
+class FanoutExecuteResponse(BaseModel):
+    results: list[FanoutAgentResult]
+
 class CreateAgentRequest(BaseModel):
     name: str = Field(..., min_length=1, max_length=255)
     description: str = Field(..., min_length=1)
@@ -41,9 +93,13 @@ class CreateAgentRequest(BaseModel):
     output_parser: Optional[str] = Field(default=None, max_length=255)
     instructions: Optional[str] = Field(default=None)
     has_storage: bool = Field(default=False)
+    storage_backend: StorageBackend = Field(default=StorageBackend.REDIS)
     knowledge_collection_name: Optional[str] = Field(default=None, max_length=255)
     knowledge_description: Optional[str] = Field(default=None)
     knowledge_top_k: Optional[int] = Field(default=5, ge=1)
+    context_token_ceiling: Optional[int] = Field(default=None, ge=256)
+    timeout_seconds: Optional[float] = Field(default=None, gt=0)
+    fallback_models: list[FallbackModelConfig] = Field(default_factory=list)
 
     @field_validator('model')
     @classmethod
@@ -96,6 +152,10 @@ class CreateAgentResponse(BaseModel):
     output_parser: Optional[str] = None
     instructions: Optional[str] = None
     has_storage: bool = False
+    storage_backend: StorageBackend = StorageBackend.REDIS
     knowledge_collection_name: Optional[str] = None
     knowledge_description: Optional[str] = None
-    knowledge_top_k: Optional[int] = 5
\ No newline at end of file
+    knowledge_top_k: Optional[int] = 5
+    context_token_ceiling: Optional[int] = None
+    timeout_seconds: Optional[float] = None
+    fallback_models: list[FallbackModelConfig] = []
\ No newline at end of file
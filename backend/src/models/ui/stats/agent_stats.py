@@ -0,0 +1,45 @@
+from datetime import datetime
+from enum import Enum
+from typing import Optional
+from pydantic import BaseModel
+
+class StatsGranularity(str, Enum):
+    HOUR = "hour"
+    DAY = "day"
+
+class StatsSummary(BaseModel):
+    executions: int = 0
+    errors: int = 0
+    timeouts: int = 0
+    error_rate: float = 0
+    total_tokens: int = 0
+    avg_latency_ms: Optional[float] = None
+    p50_latency_ms: Optional[float] = None
+    p95_latency_ms: Optional[float] = None
+    p99_latency_ms: Optional[float] = None
+
+class StatsBucket(StatsSummary):
+    bucket_start: datetime
+
+class ProviderStats(StatsSummary):
+    llm: int
+    type_model: str
+
+class AgentStatsSummary(StatsSummary):
+    agent_id: int
+
+class AgentStatsResponse(BaseModel):
+    agent_id: int
+    since: datetime
+    granularity: StatsGranularity
+    totals: StatsSummary
+    by_provider: list[ProviderStats]
+    series: list[StatsBucket]
+
+class StatsResponse(BaseModel):
+    since: datetime
+    granularity: StatsGranularity
+    totals: StatsSummary
+    by_agent: list[AgentStatsSummary]
+    by_provider: list[ProviderStats]
+    series: list[StatsBucket]
@@ -0,0 +1,31 @@
+from datetime import date
+from config.database.postgres_manager import postgres_manager
+from models.entity.agent_execution_entity import AgentExecutionEntity
+
+from abc import ABC, abstractmethod
+
+
+class IAgentExecutionsRepository(ABC):
+    @abstractmethod
+    async def insert_many(self, executions: list[AgentExecutionEntity]) -> None:
+        pass
+    @abstractmethod
+    async def ensure_partitions(self, months: list[date]) -> None:
+        pass
+
+
+class AgentExecutionsRepository(IAgentExecutionsRepository):
+
+    async def insert_many(self, executions: list[AgentExecutionEntity]) -> None:
+        """Writes the whole batch with a single COPY."""
+        async with postgres_manager.get_connection() as connection:
+            await connection.copy_records_to_table(
+                "agent_executions",
+                records=[execution.to_record() for execution in executions],
+                columns=AgentExecutionEntity.COLUMNS,
+            )
+
+    async def ensure_partitions(self, months: list[date]) -> None:
+        async with postgres_manager.get_connection() as connection:
+            for month in months:
+                await connection.execute("SELECT create_agent_executions_partition($1)", month)
@@ -0,0 +1,351 @@
+import json
+import time
+from datetime import date, datetime
+from typing import Optional
+from config.database.postgres_manager import postgres_manager
+
+from abc import ABC, abstractmethod
+
+
+class IAgentMemoryRepository(ABC):
+    @abstractmethod
+    async def get_session(self, agent_name: str, session_id: str, session_type: str, user_id: Optional[str] = None) -> Optional[tuple[dict, datetime]]:
+        pass
+    @abstractmethod
+    async def get_sessions(
+        self,
+        agent_name: str,
+        session_type: str,
+        user_id: Optional[str] = None,
+        component_id: Optional[str] = None,
+        session_name: Optional[str] = None,
+        start_timestamp: Optional[int] = None,
+        end_timestamp: Optional[int] = None,
+        limit: Optional[int] = None,
+        page: Optional[int] = None,
+        sort_by: Optional[str] = None,
+        sort_order: Optional[str] = None
+    ) -> tuple[list[dict], int]:
+        pass
+    @abstractmethod
+    async def get_session_version(self, agent_name: str, session_id: str) -> Optional[datetime]:
+        pass
+    @abstractmethod
+    async def upsert_session(self, agent_name: str, session_type: str, component_id: Optional[str], session: dict) -> tuple[dict, datetime]:
+        pass
+    @abstractmethod
+    async def rename_session(self, agent_name: str, session_id: str, session_type: str, session_name: str) -> Optional[dict]:
+        pass
+    @abstractmethod
+    async def delete_sessions(self, agent_name: str, session_ids: list[str]) -> int:
+        pass
+    @abstractmethod
+    async def get_memory(self, agent_name: str, memory_id: str, user_id: Optional[str] = None) -> Optional[dict]:
+        pass
+    @abstractmethod
+    async def get_memories(
+        self,
+        agent_name: str,
+        user_id: Optional[str] = None,
+        agent_id: Optional[str] = None,
+        team_id: Optional[str] = None,
+        topics: Optional[list[str]] = None,
+        search_content: Optional[str] = None,
+        limit: Optional[int] = None,
+        page: Optional[int] = None,
+        sort_by: Optional[str] = None,
+        sort_order: Optional[str] = None
+    ) -> tuple[list[dict], int]:
+        pass
+    @abstractmethod
+    async def get_memories_version(self, agent_name: str, user_id: Optional[str]) -> tuple:
+        pass
+    @abstractmethod
+    async def get_memory_topics(self, agent_name: str, user_id: Optional[str] = None) -> list[str]:
+        pass
+    @abstractmethod
+    async def get_memory_stats(self, agent_name: str, user_id: Optional[str] = None, limit: Optional[int] = None, page: Optional[int] = None) -> tuple[list[dict], int]:
+        pass
+    @abstractmethod
+    async def upsert_memory(self, agent_name: str, memory: dict) -> dict:
+        pass
+    @abstractmethod
+    async def delete_memories(self, agent_name: str, memory_ids: Optional[list[str]] = None, user_id: Optional[str] = None) -> int:
+        pass
+    @abstractmethod
+    async def ensure_partitions(self, months: list[date]) -> None:
+        pass
+    @abstractmethod
+    async def prune(self, table: str, cutoff: datetime) -> tuple[list[str], int]:
+        pass
+
+
+class AgentMemoryRepository(IAgentMemoryRepository):
+    """
+    Sessions and memories of the agents stored in Postgres, scoped by agent name. History reads filter on
+    (agent_name, user_id) ordered by updated_at, a single range of the index of the same columns.
+    """
+
+    SESSION_SORT_COLUMNS = {"created_at", "updated_at"}
+    MEMORY_SORT_COLUMNS = {"updated_at"}
+    PRUNABLE_TABLES = {"agent_sessions", "agent_memories"}
+
+    @staticmethod
+    def _page(query: str, params: list, limit: Optional[int], page: Optional[int]) -> str:
+        if limit:
+            params.append(limit)
+            query += f" LIMIT ${len(params)}"
+            if page:
+                params.append((page - 1) * limit)
+                query += f" OFFSET ${len(params)}"
+        return query
+
+    @staticmethod
+    def _order(sort_by: Optional[str], sort_order: Optional[str], columns: set[str]) -> str:
+        column = sort_by if sort_by in columns else "updated_at"
+        return f" ORDER BY {column} {'ASC' if sort_order == 'asc' else 'DESC'}"
+
+    @staticmethod
+    def _rows(rows) -> tuple[list[dict], int]:
+        return [json.loads(row['data']) for row in rows], (rows[0]['total'] if rows else 0)
+
+    async def get_session(self, agent_name: str, session_id: str, session_type: str, user_id: Optional[str] = None) -> Optional[tuple[dict, datetime]]:
+        """The session and its version (the row updated_at)."""
+        query = "SELECT data, updated_at FROM agent_sessions WHERE session_id = $1 AND agent_name = $2 AND session_type = $3"
+        params = [session_id, agent_name, session_type]
+        if user_id is not None:
+            params.append(user_id)
+            query += f" AND user_id = ${len(params)}"
+        async with postgres_manager.get_connection() as connection:
+            row = await connection.fetchrow(query + " ORDER BY updated_at DESC LIMIT 1", *params)
+        return (json.loads(row['data']), row['updated_at']) if row else None
+
+    async def get_sessions(
+        self,
+        agent_name: str,
+        session_type: str,
+        user_id: Optional[str] = None,
+        component_id: Optional[str] = None,
+        session_name: Optional[str] = None,
+        start_timestamp: Optional[int] = None,
+        end_timestamp: Optional[int] = None,
+        limit: Optional[int] = None,
+        page: Optional[int] = None,
+        sort_by: Optional[str] = None,
+        sort_order: Optional[str] = None
+    ) -> tuple[list[dict], int]:
+        query = "SELECT data, count(*) OVER () AS total FROM agent_sessions WHERE agent_name = $1 AND session_type = $2"
+        params: list = [agent_name, session_type]
+        for condition, value in (
+            ("user_id = ${}", user_id),
+            ("component_id = ${}", component_id),
+            ("session_name ILIKE ${}", f"%{session_name}%" if session_name else None),
+            ("created_at >= to_timestamp(${})", start_timestamp),
+            ("created_at <= to_timestamp(${})", end_timestamp),
+        ):
+            if value is not None:
+                params.append(value)
+                query += " AND " + condition.format(len(params))
+        query = self._page(query + self._order(sort_by, sort_order, self.SESSION_SORT_COLUMNS), params, limit, page)
+        async with postgres_manager.get_connection() as connection:
+            rows = await connection.fetch(query, *params)
+        return self._rows(rows)
+
+    async def get_session_version(self, agent_name: str, session_id: str) -> Optional[datetime]:
+        """updated_at of the session, bumped by every write, read without the session data."""
+        async with postgres_manager.get_connection() as connection:
+            return await connection.fetchval(
+                "SELECT max(updated_at) FROM agent_sessions WHERE session_id = $1 AND agent_name = $2", session_id, agent_name
+            )
+
+    async def upsert_session(self, agent_name: str, session_type: str, component_id: Optional[str], session: dict) -> tuple[dict, datetime]:
+        """
+        Updates the session in place, moving it to the partition of the current month, or inserts it.
+        The advisory lock serializes concurrent writes of a session, the id is not unique across partitions.
+        Returns the stored session and its version (the row updated_at).
+        """
+        now = int(time.time())
+        session = {**session, "created_at": session.get("created_at") or now, "updated_at": now}
+        session_name = (session.get("session_data") or {}).get("session_name")
+        data = json.dumps(session, default=str)
+        async with postgres_manager.get_connection() as connection:
+            async with connection.transaction():
+                await connection.execute("SELECT pg_advisory_xact_lock(hashtext($1))", f"agent_sessions:{agent_name}:{session['session_id']}")
+                version = await connection.fetchval(
+                    """
+                    UPDATE agent_sessions SET user_id = $3, session_type = $4, component_id = $5, session_name = $6,
+                        data = $7::jsonb, updated_at = now()
+                    WHERE session_id = $1 AND agent_name = $2
+                    RETURNING updated_at
+                    """,
+                    session['session_id'], agent_name, session.get('user_id'), session_type, component_id, session_name, data
+                )
+                if version is None:
+                    version = await connection.fetchval(
+                        """
+                        INSERT INTO agent_sessions (session_id, agent_name, user_id, session_type, component_id, session_name, data, created_at, updated_at)
+                        VALUES ($1, $2, $3, $4, $5, $6, $7::jsonb, to_timestamp($8), now())
+                        RETURNING updated_at
+                        """,
+                        session['session_id'], agent_name, session.get('user_id'), session_type, component_id, session_name, data, session['created_at']
+                    )
+        return session, version
+
+    async def rename_session(self, agent_name: str, session_id: str, session_type: str, session_name: str) -> Optional[dict]:
+        async with postgres_manager.get_connection() as connection:
+            data = await connection.fetchval(
+                """
+                UPDATE agent_sessions SET session_name = $4, updated_at = now(),
+                    data = jsonb_set(data, '{session_data}', coalesce(data->'session_data', '{}'::jsonb) || jsonb_build_object('session_name', $4::text))
+                WHERE session_id = $1 AND agent_name = $2 AND session_type = $3
+                RETURNING data
+                """,
+                session_id, agent_name, session_type, session_name
+            )
+        return json.loads(data) if data else None
+
+    async def delete_sessions(self, agent_name: str, session_ids: list[str]) -> int:
+        async with postgres_manager.get_connection() as connection:
+            result = await connection.execute(
+                "DELETE FROM agent_sessions WHERE agent_name = $1 AND session_id = ANY($2::varchar[])", agent_name, session_ids
+            )
+        return int(result.split()[-1])
+
+    async def get_memory(self, agent_name: str, memory_id: str, user_id: Optional[str] = None) -> Optional[dict]:
+        query = "SELECT data FROM agent_memories WHERE memory_id = $1 AND agent_name = $2"
+        params = [memory_id, agent_name]
+        if user_id is not None:
+            params.append(user_id)
+            query += f" AND user_id = ${len(params)}"
+        async with postgres_manager.get_connection() as connection:
+            data = await connection.fetchval(query + " ORDER BY updated_at DESC LIMIT 1", *params)
+        return json.loads(data) if data else None
+
+    async def get_memories(
+        self,
+        agent_name: str,
+        user_id: Optional[str] = None,
+        agent_id: Optional[str] = None,
+        team_id: Optional[str] = None,
+        topics: Optional[list[str]] = None,
+        search_content: Optional[str] = None,
+        limit: Optional[int] = None,
+        page: Optional[int] = None,
+        sort_by: Optional[str] = None,
+        sort_order: Optional[str] = None
+    ) -> tuple[list[dict], int]:
+        query = "SELECT data, count(*) OVER () AS total FROM agent_memories WHERE agent_name = $1"
+        params: list = [agent_name]
+        for condition, value in (
+            ("user_id = ${}", user_id),
+            ("data->>'agent_id' = ${}", agent_id),
+            ("data->>'team_id' = ${}", team_id),
+            ("topics ?| ${}::text[]", topics or None),
+            ("data->>'memory' ILIKE ${}", f"%{search_content}%" if search_content else None),
+        ):
+            if value is not None:
+                params.append(value)
+                query += " AND " + condition.format(len(params))
+        query = self._page(query + self._order(sort_by, sort_order, self.MEMORY_SORT_COLUMNS), params, limit, page)
+        async with postgres_manager.get_connection() as connection:
+            rows = await connection.fetch(query, *params)
+        return self._rows(rows)
+
+    async def get_memories_version(self, agent_name: str, user_id: Optional[str]) -> tuple:
+        """
+        Count and last updated_at of the memories of the user (of the agent when user_id is None), changed by
+        every write and read from the (agent_name, user_id, updated_at) index.
+        """
+        query = "SELECT count(*), max(updated_at) FROM agent_memories WHERE agent_name = $1"
+        params = [agent_name]
+        if user_id is not None:
+            params.append(user_id)
+            query += " AND user_id = $2"
+        async with postgres_manager.get_connection() as connection:
+            row = await connection.fetchrow(query, *params)
+        return row[0], row[1]
+
+    async def get_memory_topics(self, agent_name: str, user_id: Optional[str] = None) -> list[str]:
+        query = "SELECT DISTINCT jsonb_array_elements_text(topics) AS topic FROM agent_memories WHERE agent_name = $1"
+        params = [agent_name]
+        if user_id is not None:
+            params.append(user_id)
+            query += " AND user_id = $2"
+        async with postgres_manager.get_connection() as connection:
+            rows = await connection.fetch(query, *params)
+        return [row['topic'] for row in rows]
+
+    async def get_memory_stats(self, agent_name: str, user_id: Optional[str] = None, limit: Optional[int] = None, page: Optional[int] = None) -> tuple[list[dict], int]:
+        query = """
+            SELECT user_id, count(*) AS total_memories, extract(epoch FROM max(updated_at))::bigint AS last_memory_updated_at,
+                count(*) OVER () AS total
+            FROM agent_memories WHERE agent_name = $1 AND user_id IS NOT NULL
+        """
+        params: list = [agent_name]
+        if user_id is not None:
+            params.append(user_id)
+            query += " AND user_id = $2"
+        query = self._page(query + " GROUP BY user_id ORDER BY last_memory_updated_at DESC", params, limit, page)
+        async with postgres_manager.get_connection() as connection:
+            rows = await connection.fetch(query, *params)
+        stats = [
+            {"user_id": row['user_id'], "total_memories": row['total_memories'], "last_memory_updated_at": row['last_memory_updated_at']}
+            for row in rows
+        ]
+        return stats, (rows[0]['total'] if rows else 0)
+
+    async def upsert_memory(self, agent_name: str, memory: dict) -> dict:
+        """Same write path as upsert_session, the memory moves to the partition of the current month."""
+        data = json.dumps(memory, default=str)
+        topics = json.dumps(memory.get("topics") or [])
+        async with postgres_manager.get_connection() as connection:
+            async with connection.transaction():
+                await connection.execute("SELECT pg_advisory_xact_lock(hashtext($1))", f"agent_memories:{agent_name}:{memory['memory_id']}")
+                updated = await connection.execute(
+                    """
+                    UPDATE agent_memories SET user_id = $3, topics = $4::jsonb, data = $5::jsonb, updated_at = now()
+                    WHERE memory_id = $1 AND agent_name = $2
+                    """,
+                    memory['memory_id'], agent_name, memory.get('user_id'), topics, data
+                )
+                if updated == "UPDATE 0":
+                    await connection.execute(
+                        """
+                        INSERT INTO agent_memories (memory_id, agent_name, user_id, topics, data, updated_at)
+                        VALUES ($1, $2, $3, $4::jsonb, $5::jsonb, now())
+                        """,
+                        memory['memory_id'], agent_name, memory.get('user_id'), topics, data
+                    )
+        return memory
+
+    async def delete_memories(self, agent_name: str, memory_ids: Optional[list[str]] = None, user_id: Optional[str] = None) -> int:
+        """Deletes the given memories, or every memory of the agent when memory_ids is None."""
+        query = "DELETE FROM agent_memories WHERE agent_name = $1"
+        params: list = [agent_name]
+        if memory_ids is not None:
+            params.append(memory_ids)
+            query += " AND memory_id = ANY($2::varchar[])"
+        if user_id is not None:
+            params.append(user_id)
+            query += f" AND user_id = ${len(params)}"
+        async with postgres_manager.get_connection() as connection:
+            result = await connection.execute(query, *params)
+        return int(result.split()[-1])
+
+    async def ensure_partitions(self, months: list[date]) -> None:
+        async with postgres_manager.get_connection() as connection:
+            for month in months:
+                await connection.execute("SELECT create_agent_memory_store_partitions($1)", month)
+
+    async def prune(self, table: str, cutoff: datetime) -> tuple[list[str], int]:
+        """
+        Drops the monthly partitions of table entirely older than cutoff, then deletes the older rows left
+        in the partition containing cutoff (and the default one) with one set-based DELETE.
+        Returns the dropped partitions and the number of deleted rows.
+        """
+        if table not in self.PRUNABLE_TABLES:
+            raise ValueError(f"{table} is not an agent memory store table")
+        async with postgres_manager.get_connection() as connection:
+            dropped = [row[0] for row in await connection.fetch("SELECT drop_agent_memory_store_partitions($1, $2)", table, cutoff)]
+            result = await connection.execute(f"DELETE FROM {table} WHERE updated_at < $1", cutoff)
+        return dropped, int(result.split()[-1])
@@ -0,0 +1,106 @@
+from datetime import datetime
+from typing import Optional
+from config.database.postgres_manager import postgres_manager
+
+from abc import ABC, abstractmethod
+
+
+class IAgentStatsRepository(ABC):
+    @abstractmethod
+    async def refresh_rollups(self, lag_seconds: float, gamma: float) -> Optional[datetime]:
+        pass
+    @abstractmethod
+    async def get_rollups(self, since: datetime, granularity: str, agent_id: Optional[int] = None) -> list[dict]:
+        pass
+    @abstractmethod
+    async def get_latency_sketches(self, since: datetime, granularity: str, agent_id: Optional[int] = None) -> list[dict]:
+        pass
+
+
+class AgentStatsRepository(IAgentStatsRepository):
+
+    ROLLUP_NAME = "agent_executions_hourly"
+
+    async def refresh_rollups(self, lag_seconds: float, gamma: float) -> Optional[datetime]:
+        """
+        Folds the raw executions inserted since the watermark into the hourly rollups of their execution
+        hour and moves the watermark, all in one transaction. The watermark follows inserted_at, so
+        executions written late by the write-behind log (e.g. requeued during an outage) are still
+        rolled up; lag_seconds only has to cover the commit of an insert. A transaction advisory lock
+        keeps a single worker doing it, the others return None right away.
+        """
+        async with postgres_manager.get_connection() as connection:
+            async with connection.transaction():
+                locked = await connection.fetchval("SELECT pg_try_advisory_xact_lock(hashtext($1))", self.ROLLUP_NAME)
+                if not locked:
+                    return None
+                processed_from = await connection.fetchval(
+                    "SELECT processed_until FROM rollup_watermarks WHERE name = $1", self.ROLLUP_NAME
+                )
+                processed_until = await connection.fetchval("SELECT now() - make_interval(secs => $1)", float(lag_seconds))
+                if processed_from is None:
+                    processed_from = await connection.fetchval("SELECT min(inserted_at) FROM agent_executions") or processed_until
+                if processed_from >= processed_until:
+                    return processed_from
+
+                await connection.execute("""
+                    INSERT INTO agent_executions_hourly AS h
+                        (bucket_start, agent_id, llm, type_model, executions, errors, timeouts, total_tokens, latency_ms_sum)
+                    SELECT date_trunc('hour', executed_at), agent_id, llm, type_model,
+                        count(*),
+                        count(*) FILTER (WHERE status = 'error'),
+                        count(*) FILTER (WHERE status = 'timeout'),
+                        sum(total_tokens),
+                        sum(latency_ms)
+                    FROM agent_executions
+                    WHERE inserted_at >= $1 AND inserted_at < $2
+                    GROUP BY 1, 2, 3, 4
+                    ON CONFLICT (bucket_start, agent_id, llm, type_model) DO UPDATE SET
+                        executions = h.executions + EXCLUDED.executions,
+                        errors = h.errors + EXCLUDED.errors,
+                        timeouts = h.timeouts + EXCLUDED.timeouts,
+                        total_tokens = h.total_tokens + EXCLUDED.total_tokens,
+                        latency_ms_sum = h.latency_ms_sum + EXCLUDED.latency_ms_sum
+                """, processed_from, processed_until)
+                await connection.execute("""
+                    INSERT INTO agent_executions_latency_sketch AS s
+                        (bucket_start, agent_id, llm, type_model, sketch_index, executions)
+                    SELECT date_trunc('hour', executed_at), agent_id, llm, type_model,
+                        ceil(ln(greatest(latency_ms, 1)) / ln($3::float8))::int,
+                        count(*)
+                    FROM agent_executions
+                    WHERE inserted_at >= $1 AND inserted_at < $2
+                    GROUP BY 1, 2, 3, 4, 5
+                    ON CONFLICT (bucket_start, agent_id, llm, type_model, sketch_index) DO UPDATE SET
+                        executions = s.executions + EXCLUDED.executions
+                """, processed_from, processed_until, gamma)
+                await connection.execute("""
+                    INSERT INTO rollup_watermarks (name, processed_until) VALUES ($1, $2)
+                    ON CONFLICT (name) DO UPDATE SET processed_until = EXCLUDED.processed_until
+                """, self.ROLLUP_NAME, processed_until)
+                return processed_until
+
+    async def get_rollups(self, since: datetime, granularity: str, agent_id: Optional[int] = None) -> list[dict]:
+        query = """
+            SELECT date_trunc($1, bucket_start) AS bucket_start, agent_id, llm, type_model,
+                sum(executions)::bigint AS executions, sum(errors)::bigint AS errors, sum(timeouts)::bigint AS timeouts,
+                sum(total_tokens)::bigint AS total_tokens, sum(latency_ms_sum)::bigint AS latency_ms_sum
+            FROM agent_executions_hourly
+            WHERE bucket_start >= $2 AND ($3::int IS NULL OR agent_id = $3)
+            GROUP BY 1, 2, 3, 4
+        """
+        async with postgres_manager.get_connection(read_only=True) as connection:
+            rows = await connection.fetch(query, granularity, since, agent_id)
+        return [dict(row) for row in rows]
+
+    async def get_latency_sketches(self, since: datetime, granularity: str, agent_id: Optional[int] = None) -> list[dict]:
+        query = """
+            SELECT date_trunc($1, bucket_start) AS bucket_start, agent_id, llm, type_model, sketch_index,
+                sum(executions)::bigint AS executions
+            FROM agent_executions_latency_sketch
+            WHERE bucket_start >= $2 AND ($3::int IS NULL OR agent_id = $3)
+            GROUP BY 1, 2, 3, 4, 5
+        """
+        async with postgres_manager.get_connection(read_only=True) as connection:
+            rows = await connection.fetch(query, granularity, since, agent_id)
+        return [dict(row) for row in rows]
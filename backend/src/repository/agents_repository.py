@@ -1,7 +1,9 @@
 from models.entity.tools_entity import ToolsEntity
 from config.database.postgres_manager import postgres_manager
 from models.entity.agent_entity import AgentEntity, AgentResumeEntity
-from typing import Optional
+from typing import AsyncIterator, Optional
+from asyncpg import Record
+import json
 
 from abc import ABC, abstractmethod
 
@@ -11,9 +13,18 @@ class IAgentsRepository(ABC):
     async def get_all_agents(self, name_part: str, skip: int, limit: int) -> list[AgentResumeEntity]:
         pass
     @abstractmethod
+    def iter_all_agents(self, name_part: str, skip: int, limit: int, page_size: int = 500) -> AsyncIterator[Record]:
+        pass
+    @abstractmethod
+    async def get_agents_version(self) -> int:
+        pass
+    @abstractmethod
     async def get_agent_by_id(self, agent_id: int) -> AgentEntity | None:
         pass
     @abstractmethod
+    async def get_agents_by_ids(self, agent_ids: list[int]) -> list[AgentEntity]:
+        pass
+    @abstractmethod
     async def create_agent(
         self,
         name: str,
@@ -25,9 +36,13 @@ class IAgentsRepository(ABC):
         output_parser: Optional[str] = None,
         instructions: Optional[str] = None,
         has_storage: bool = False,
+        storage_backend: str = "redis",
         knowledge_collection_name: Optional[str] = None,
         knowledge_description: Optional[str] = None,
-        knowledge_top_k: Optional[int] = 5
+        knowledge_top_k: Optional[int] = 5,
+        context_token_ceiling: Optional[int] = None,
+        timeout_seconds: Optional[float] = None,
+        fallback_models: Optional[list[dict]] = None
     ) -> AgentEntity:
         pass
 
@@ -37,71 +52,130 @@ class AgentsRepository(IAgentsRepository):
     def __init__(self):
         pass
 
+    @staticmethod
+    def _all_agents_query(name_part: str, skip: int, limit: int, after_id: Optional[int] = None) -> tuple[str, list]:
+        conditions, params = [], []
+        if name_part:
+            params.append(f"%{name_part}%")
+            conditions.append(f"name ILIKE ${len(params)}")
+        if after_id is not None:
+            params.append(after_id)
+            conditions.append(f"id > ${len(params)}")
+        query = "SELECT id, name FROM agents" + (" WHERE " + " AND ".join(conditions) if conditions else "")
+        params += [skip, limit]
+        return query + f" ORDER BY id OFFSET ${len(params) - 1} LIMIT ${len(params)}", params
+
     async def get_all_agents(self, name_part: str, skip: int, limit: int) -> list[AgentResumeEntity]:
-        query = "SELECT id, name FROM agents"
-        params = []
+        return [AgentResumeEntity(id=row['id'], name=row['name']) async for row in self.iter_all_agents(name_part, skip, limit)]
 
-        if name_part:
-            query += " WHERE name ILIKE $1 OFFSET $2 LIMIT $3"
-            params = [f"%{name_part}%", skip, limit]
-        else:
-            query += " OFFSET $1 LIMIT $2"
-            params = [skip, limit]
+    async def iter_all_agents(self, name_part: str, skip: int, limit: int, page_size: int = 500) -> AsyncIterator[Record]:
+        """
+        Yields the (id, name) rows ordered by id, fetched page_size rows at a time after the last id seen.
+        A connection is only held while a page is fetched, never while the caller consumes the rows.
+        """
+        after_id = None
+        while limit > 0:
+            page_limit = min(page_size, limit)
+            query, params = self._all_agents_query(name_part, skip if after_id is None else 0, page_limit, after_id)
+            async with postgres_manager.get_connection(read_only=True) as connection:
+                rows = await connection.fetch(query, *params)
+            for row in rows:
+                yield row
+            if len(rows) < page_limit:
+                return
+            limit -= len(rows)
+            after_id = rows[-1]['id']
+
+    async def get_agents_version(self) -> int:
+        """Change counter of the agents table, bumped by a trigger on every write to it."""
+        async with postgres_manager.get_connection(read_only=True) as connection:
+            version = await connection.fetchval("SELECT version FROM table_versions WHERE name = 'agents'")
+        return version or 0
 
-        agents: list[AgentResumeEntity] = []
-        async with postgres_manager.get_connection() as connection:
-            async with connection.transaction():
-                async for row in connection.cursor(query, *params):
-                    agents.append(AgentResumeEntity(id=row['id'], name=row['name']))
-        return agents
-    
     async def get_agent_by_id(self, agent_id: int) -> AgentEntity | None:
-        query = """
-            SELECT 
-            a.id, a.name, a.description, a.llm as model, a.reasoning, a.type_model, a.output_parser,
-            a.instructions, a.has_storage, a.knowledge_collection_name, a.knowledge_description, a.knowledge_top_k,
-            t.id AS tool_id, t.name AS tool_name, t.description AS tool_description, t.function_caller,
-            a.created_at, a.updated_at
-            FROM agents a
-            LEFT JOIN agents_tools at ON a.id = at.agent_id
-            LEFT JOIN tools t ON at.tool_id = t.id
-            WHERE a.id = $1
-        """
+        agent = await self._get_agent_by_id(agent_id, read_only=True)
+        if agent is None and postgres_manager.has_replicas():
+            agent = await self._get_agent_by_id(agent_id, read_only=False)
+        return agent
+
+    async def get_agents_by_ids(self, agent_ids: list[int]) -> list[AgentEntity]:
+        """Loads several agents in one round trip, agents not found are left out."""
+        agents = await self._get_agents_by_ids(agent_ids, read_only=True)
+        if len(agents) < len(set(agent_ids)) and postgres_manager.has_replicas():
+            found = {agent.id for agent in agents}
+            agents += await self._get_agents_by_ids([agent_id for agent_id in agent_ids if agent_id not in found], read_only=False)
+        return agents
+
+    _SELECT_AGENTS_WITH_TOOLS = """
+        SELECT 
+        a.id, a.name, a.description, a.llm as model, a.reasoning, a.type_model, a.output_parser,
+        a.instructions, a.has_storage, a.storage_backend, a.knowledge_collection_name, a.knowledge_description, a.knowledge_top_k,
+        a.context_token_ceiling, a.timeout_seconds, a.fallback_models,
+        t.id AS tool_id, t.name AS tool_name, t.description AS tool_description, t.function_caller,
+        a.created_at, a.updated_at, a.version
+        FROM agents a
+        LEFT JOIN agents_tools at ON a.id = at.agent_id
+        LEFT JOIN tools t ON at.tool_id = t.id
+    """
+
+    async def _get_agent_by_id(self, agent_id: int, read_only: bool) -> AgentEntity | None:
+        query = self._SELECT_AGENTS_WITH_TOOLS + " WHERE a.id = $1"
         params = [agent_id]
-        async with postgres_manager.get_connection() as connection:
+        async with postgres_manager.get_connection(read_only=read_only) as connection:
             async with connection.transaction():
                 rows = await connection.fetch(query, *params)
-                if rows:
-                    first_row = rows[0]
-                    tools_entities = []
-                    for row in rows:
-                        if row['tool_id'] is not None:
-                            tools_entities.append(
-                                ToolsEntity(
-                                    id=row['tool_id'],
-                                    name=row['tool_name'],
-                                    description=row['tool_description'],
-                                    function_caller=row['function_caller']
-                                )
-                            )
-                    return AgentEntity(
-                        id=first_row['id'],
-                        name=first_row['name'],
-                        description=first_row['description'],
-                        model=first_row['model'],
-                        tools=tools_entities,
-                        reasoning=first_row['reasoning'],
-                        type_model=first_row['type_model'],
-                        output_parser=first_row['output_parser'],
-                        instructions=first_row['instructions'],
-                        has_storage=first_row['has_storage'],
-                        knowledge_collection_name=first_row['knowledge_collection_name'],
-                        knowledge_description=first_row['knowledge_description'],
-                        knowledge_top_k=first_row['knowledge_top_k'],
-                        created_at=first_row['created_at'],
-                        updated_at=first_row['updated_at']
+        agents = self._rows_to_agents(rows)
+        return agents[0] if agents else None
+
+    async def _get_agents_by_ids(self, agent_ids: list[int], read_only: bool) -> list[AgentEntity]:
+        query = self._SELECT_AGENTS_WITH_TOOLS + " WHERE a.id = ANY($1::int[]) ORDER BY a.id"
+        async with postgres_manager.get_connection(read_only=read_only) as connection:
+            async with connection.transaction():
+                rows = await connection.fetch(query, agent_ids)
+        return self._rows_to_agents(rows)
+
+    @staticmethod
+    def _rows_to_agents(rows) -> list[AgentEntity]:
+        rows_by_agent: dict[int, list] = {}
+        for row in rows:
+            rows_by_agent.setdefault(row['id'], []).append(row)
+        agents: list[AgentEntity] = []
+        for agent_rows in rows_by_agent.values():
+            first_row = agent_rows[0]
+            tools_entities = []
+            for row in agent_rows:
+                if row['tool_id'] is not None:
+                    tools_entities.append(
+                        ToolsEntity(
+                            id=row['tool_id'],
+                            name=row['tool_name'],
+                            description=row['tool_description'],
+                            function_caller=row['function_caller']
+                        )
                     )
-        return None
+            agents.append(AgentEntity(
+                id=first_row['id'],
+                name=first_row['name'],
+                description=first_row['description'],
+                model=first_row['model'],
+                tools=tools_entities,
+                reasoning=first_row['reasoning'],
+                type_model=first_row['type_model'],
+                output_parser=first_row['output_parser'],
+                instructions=first_row['instructions'],
+                has_storage=first_row['has_storage'],
+                storage_backend=first_row['storage_backend'],
+                knowledge_collection_name=first_row['knowledge_collection_name'],
+                knowledge_description=first_row['knowledge_description'],
+                knowledge_top_k=first_row['knowledge_top_k'],
+                context_token_ceiling=first_row['context_token_ceiling'],
+                timeout_seconds=first_row['timeout_seconds'],
+                fallback_models=json.loads(first_row['fallback_models']),
+                created_at=first_row['created_at'],
+                updated_at=first_row['updated_at'],
+                version=first_row['version']
+            ))
+        return agents
 
     async def create_agent(
         self,
@@ -114,16 +188,20 @@ class AgentsRepository(IAgentsRepository):
         output_parser: Optional[str] = None,
         instructions: Optional[str] = None,
         has_storage: bool = False,
+        storage_backend: str = "redis",
         knowledge_collection_name: Optional[str] = None,
         knowledge_description: Optional[str] = None,
-        knowledge_top_k: Optional[int] = 5
+        knowledge_top_k: Optional[int] = 5,
+        context_token_ceiling: Optional[int] = None,
+        timeout_seconds: Optional[float] = None,
+        fallback_models: Optional[list[dict]] = None
     ) -> AgentEntity:
         insert_agent_query = """
-            INSERT INTO agents (name, description, llm, reasoning, type_model, output_parser, instructions, has_storage, knowledge_collection_name, knowledge_description, knowledge_top_k)
-            VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11)
-            RETURNING id, name, description, llm as model, reasoning, type_model, output_parser, instructions, has_storage, knowledge_collection_name, knowledge_description, knowledge_top_k, created_at, updated_at
+            INSERT INTO agents (name, description, llm, reasoning, type_model, output_parser, instructions, has_storage, knowledge_collection_name, knowledge_description, knowledge_top_k, context_token_ceiling, timeout_seconds, fallback_models, storage_backend)
+            VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13, $14::jsonb, $15)
+            RETURNING id, name, description, llm as model, reasoning, type_model, output_parser, instructions, has_storage, storage_backend, knowledge_collection_name, knowledge_description, knowledge_top_k, context_token_ceiling, timeout_seconds, fallback_models, created_at, updated_at, version
         """
-        agent_params = [name, description, model, reasoning, type_model, output_parser, instructions, has_storage, knowledge_collection_name, knowledge_description, knowledge_top_k]
+        agent_params = [name, description, model, reasoning, type_model, output_parser, instructions, has_storage, knowledge_collection_name, knowledge_description, knowledge_top_k, context_token_ceiling, timeout_seconds, json.dumps(fallback_models or []), storage_backend]
 
         async with postgres_manager.get_connection() as connection:
             async with connection.transaction():
@@ -146,6 +224,7 @@ class AgentsRepository(IAgentsRepository):
                     WHERE at.agent_id = $1
                 """
                 tools_rows = await connection.fetch(tools_query, agent_id)
+                postgres_manager.mark_write()
                 
                 tools_entities = [
                     ToolsEntity(
@@ -168,9 +247,14 @@ class AgentsRepository(IAgentsRepository):
                     output_parser=agent_row['output_parser'],
                     instructions=agent_row['instructions'],
                     has_storage=agent_row['has_storage'],
+                    storage_backend=agent_row['storage_backend'],
                     knowledge_collection_name=agent_row['knowledge_collection_name'],
                     knowledge_description=agent_row['knowledge_description'],
                     knowledge_top_k=agent_row['knowledge_top_k'],
+                    context_token_ceiling=agent_row['context_token_ceiling'],
+                    timeout_seconds=agent_row['timeout_seconds'],
+                    fallback_models=json.loads(agent_row['fallback_models']),
                     created_at=agent_row['created_at'],
-                    updated_at=agent_row['updated_at']
+                    updated_at=agent_row['updated_at'],
+                    version=agent_row['version']
                 )
\ No newline at end of file
@@ -0,0 +1,28 @@
+from config.database.redis_manager import redis_manager
+from abc import ABC, abstractmethod
+
+
+class IAgentsUsageRepository(ABC):
+    @abstractmethod
+    async def increment_executions(self, agent_id: int) -> None:
+        pass
+    @abstractmethod
+    async def get_most_executed_agents(self, top_n: int) -> list[int]:
+        pass
+
+
+class AgentsUsageRepository(IAgentsUsageRepository):
+    """Persists the agents execution ranking in a Redis sorted set shared by every worker."""
+
+    RANKING_KEY = "agents_usage:executions"
+
+    async def increment_executions(self, agent_id: int) -> None:
+        client = redis_manager.get_async_redis_client()
+        await client.zincrby(self.RANKING_KEY, 1, str(agent_id))
+
+    async def get_most_executed_agents(self, top_n: int) -> list[int]:
+        if top_n <= 0:
+            return []
+        client = redis_manager.get_async_redis_client()
+        members = await client.zrevrange(self.RANKING_KEY, 0, top_n - 1)
+        return [int(member) for member in members]
@@ -0,0 +1,42 @@
+from models.entity.tools_entity import ToolsEntity
+from config.database.postgres_manager import postgres_manager
+
+from abc import ABC, abstractmethod
+
+
+class IToolsRepository(ABC):
+    @abstractmethod
+    async def get_all_tools(self) -> list[ToolsEntity]:
+        pass
+    @abstractmethod
+    async def get_tools_by_ids(self, tool_ids: list[int]) -> list[ToolsEntity]:
+        pass
+
+
+class ToolsRepository(IToolsRepository):
+
+    _select = "SELECT id, name, description, function_caller, timeout_seconds, result_ttl_seconds, has_side_effects FROM tools"
+
+    async def get_all_tools(self) -> list[ToolsEntity]:
+        async with postgres_manager.get_connection(read_only=True) as connection:
+            rows = await connection.fetch(self._select)
+        return [self._to_entity(row) for row in rows]
+
+    async def get_tools_by_ids(self, tool_ids: list[int]) -> list[ToolsEntity]:
+        if not tool_ids:
+            return []
+        async with postgres_manager.get_connection(read_only=True) as connection:
+            rows = await connection.fetch(f"{self._select} WHERE id = ANY($1::int[])", tool_ids)
+        return [self._to_entity(row) for row in rows]
+
+    @staticmethod
+    def _to_entity(row) -> ToolsEntity:
+        return ToolsEntity(
+            id=row['id'],
+            name=row['name'],
+            description=row['description'],
+            function_caller=row['function_caller'],
+            timeout_seconds=row['timeout_seconds'],
+            result_ttl_seconds=row['result_ttl_seconds'],
+            has_side_effects=row['has_side_effects']
+        )
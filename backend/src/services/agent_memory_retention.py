@@ -0,0 +1,70 @@
+import asyncio
+import contextlib
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from config.monitory.metrics import metrics
+from repository.agent_memory_repository import AgentMemoryRepository, IAgentMemoryRepository
+from services.execution_log import _month_start
+
+logger = logging.getLogger("AgentMemoryRetentionService")
+
+
+class AgentMemoryRetentionService:
+    """
+    Background retention of the agents stored in Postgres (storage_backend = 'postgres'). Every interval
+    seconds it creates the partitions of the current and next months, drops the monthly partitions older
+    than the retention and deletes the older rows left with one set-based DELETE per table.
+    Idempotent, so every worker may run it.
+    """
+
+    def __init__(self, repository: IAgentMemoryRepository, memory_retention_days: float, session_retention_days: float, interval: float):
+        self.repository = repository
+        self.retention_days = {"agent_memories": memory_retention_days, "agent_sessions": session_retention_days}
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._loop())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    async def _loop(self) -> None:
+        while True:
+            await self.run_once()
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self) -> None:
+        now = datetime.now(timezone.utc)
+        try:
+            await self.repository.ensure_partitions([_month_start(now.date()), _month_start(now.date(), 1)])
+        except Exception as e:
+            metrics.increment("agent_memory_retention_errors", "partitions")
+            logger.error(f"Could not create the agent memory store partitions: {e}")
+            return
+        for table, retention_days in self.retention_days.items():
+            if retention_days <= 0:
+                continue
+            try:
+                dropped, deleted = await self.repository.prune(table, now - timedelta(days=retention_days))
+            except Exception as e:
+                metrics.increment("agent_memory_retention_errors", table)
+                logger.warning(f"Could not prune {table}: {e}")
+                continue
+            metrics.increment("agent_memory_pruned_rows", table, value=deleted)
+            if dropped:
+                logger.info(f"Dropped the expired partitions {', '.join(dropped)}.")
+
+
+agent_memory_retention = AgentMemoryRetentionService(
+    AgentMemoryRepository(),
+    memory_retention_days=float(os.getenv("AGENT_MEMORY_RETENTION_DAYS", 30)),
+    session_retention_days=float(os.getenv("AGENT_SESSION_RETENTION_DAYS", 90)),
+    interval=float(os.getenv("AGENT_MEMORY_RETENTION_INTERVAL", 3600)),
+)
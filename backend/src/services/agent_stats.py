@@ -0,0 +1,162 @@
+import asyncio
+import contextlib
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Hashable, Optional
+from config.database.cache_manager import cache_manager
+from config.monitory.latency_sketch import SKETCH_GAMMA, LatencySketch
+from config.monitory.metrics import metrics
+from models.ui.stats.agent_stats import (
+    AgentStatsResponse, AgentStatsSummary, ProviderStats, StatsBucket, StatsGranularity, StatsResponse, StatsSummary
+)
+from repository.agent_stats_repository import AgentStatsRepository, IAgentStatsRepository
+
+logger = logging.getLogger("AgentStatsService")
+
+
+class _Accumulator:
+    def __init__(self):
+        self.executions = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.total_tokens = 0
+        self.latency_ms_sum = 0
+        self.sketch = LatencySketch()
+
+    def add_rollup(self, row: dict) -> None:
+        self.executions += row["executions"]
+        self.errors += row["errors"]
+        self.timeouts += row["timeouts"]
+        self.total_tokens += row["total_tokens"]
+        self.latency_ms_sum += row["latency_ms_sum"]
+
+    def summary(self) -> dict:
+        return {
+            "executions": self.executions,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "error_rate": round((self.errors + self.timeouts) / self.executions, 4) if self.executions else 0,
+            "total_tokens": self.total_tokens,
+            "avg_latency_ms": round(self.latency_ms_sum / self.executions, 2) if self.executions else None,
+            "p50_latency_ms": self.sketch.quantile(0.5),
+            "p95_latency_ms": self.sketch.quantile(0.95),
+            "p99_latency_ms": self.sketch.quantile(0.99),
+        }
+
+
+class AgentStatsService:
+    """
+    Usage statistics answered from the hourly rollups only, never from the raw executions, so the cost
+    depends on the requested window and not on the history size. Percentiles come from merging the
+    latency sketches of the requested buckets. Answers are cached for STATS_CACHE_TTL seconds.
+    """
+
+    def __init__(self, repository: IAgentStatsRepository):
+        self.repository = repository
+        self.cache = cache_manager
+        self.cache_ttl = int(os.getenv("STATS_CACHE_TTL", 30))
+
+    @staticmethod
+    def _since(hours: int, granularity: StatsGranularity) -> datetime:
+        since = datetime.now(timezone.utc) - timedelta(hours=hours)
+        if granularity == StatsGranularity.DAY:
+            return since.replace(hour=0, minute=0, second=0, microsecond=0)
+        return since.replace(minute=0, second=0, microsecond=0)
+
+    async def _load(self, since: datetime, granularity: StatsGranularity, agent_id: Optional[int]):
+        return await asyncio.gather(
+            self.repository.get_rollups(since, granularity.value, agent_id),
+            self.repository.get_latency_sketches(since, granularity.value, agent_id),
+        )
+
+    @staticmethod
+    def _group(rollups: list[dict], sketches: list[dict], key: Callable[[dict], Hashable]) -> dict[Hashable, _Accumulator]:
+        groups: dict[Hashable, _Accumulator] = {}
+        for row in rollups:
+            groups.setdefault(key(row), _Accumulator()).add_rollup(row)
+        for row in sketches:
+            groups.setdefault(key(row), _Accumulator()).sketch.add(row["sketch_index"], row["executions"])
+        return groups
+
+    def _breakdowns(self, rollups: list[dict], sketches: list[dict]) -> tuple[StatsSummary, list[ProviderStats], list[StatsBucket]]:
+        totals = self._group(rollups, sketches, lambda row: None).get(None, _Accumulator())
+        providers = self._group(rollups, sketches, lambda row: (row["llm"], row["type_model"]))
+        buckets = self._group(rollups, sketches, lambda row: row["bucket_start"])
+        return (
+            StatsSummary(**totals.summary()),
+            [ProviderStats(llm=llm, type_model=type_model, **accumulator.summary()) for (llm, type_model), accumulator in sorted(providers.items())],
+            [StatsBucket(bucket_start=bucket_start, **accumulator.summary()) for bucket_start, accumulator in sorted(buckets.items())],
+        )
+
+    async def get_agent_stats(self, agent_id: int, hours: int, granularity: StatsGranularity) -> AgentStatsResponse:
+        cache_key = f"agent_stats:{agent_id}:{hours}:{granularity.value}"
+        cached = await self.cache.get(cache_key)
+        if cached:
+            return AgentStatsResponse.model_validate(cached)
+        since = self._since(hours, granularity)
+        rollups, sketches = await self._load(since, granularity, agent_id)
+        totals, by_provider, series = self._breakdowns(rollups, sketches)
+        response = AgentStatsResponse(
+            agent_id=agent_id, since=since, granularity=granularity, totals=totals, by_provider=by_provider, series=series
+        )
+        await self.cache.set(cache_key, response.model_dump(mode="json"), ttl=self.cache_ttl)
+        return response
+
+    async def get_stats(self, hours: int, granularity: StatsGranularity) -> StatsResponse:
+        cache_key = f"stats:{hours}:{granularity.value}"
+        cached = await self.cache.get(cache_key)
+        if cached:
+            return StatsResponse.model_validate(cached)
+        since = self._since(hours, granularity)
+        rollups, sketches = await self._load(since, granularity, None)
+        totals, by_provider, series = self._breakdowns(rollups, sketches)
+        agents = self._group(rollups, sketches, lambda row: row["agent_id"])
+        response = StatsResponse(
+            since=since,
+            granularity=granularity,
+            totals=totals,
+            by_agent=[AgentStatsSummary(agent_id=agent_id, **accumulator.summary()) for agent_id, accumulator in sorted(agents.items())],
+            by_provider=by_provider,
+            series=series,
+        )
+        await self.cache.set(cache_key, response.model_dump(mode="json"), ttl=self.cache_ttl)
+        return response
+
+
+class UsageRollupService:
+    """Background job folding new executions into the rollups every interval seconds, on a single worker at a time."""
+
+    def __init__(self, repository: IAgentStatsRepository, interval: float, lag_seconds: float):
+        self.repository = repository
+        self.interval = interval
+        self.lag_seconds = lag_seconds
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._loop())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                processed_until = await self.repository.refresh_rollups(self.lag_seconds, SKETCH_GAMMA)
+                if processed_until is not None:
+                    metrics.increment("rollup_refreshes")
+            except Exception as e:
+                metrics.increment("rollup_errors")
+                logger.warning(f"Could not refresh the executions rollups: {e}")
+            await asyncio.sleep(self.interval)
+
+
+usage_rollup = UsageRollupService(
+    AgentStatsRepository(),
+    interval=float(os.getenv("ROLLUP_INTERVAL", 60)),
+    lag_seconds=float(os.getenv("ROLLUP_LAG_SECONDS", 120)),
+)
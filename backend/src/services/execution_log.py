@@ -0,0 +1,143 @@
+import asyncio
+import contextlib
+import logging
+import os
+import time
+from collections import deque
+from datetime import date, datetime, timezone
+from typing import Optional
+from models.entity.agent_execution_entity import AgentExecutionEntity
+from repository.agent_executions_repository import AgentExecutionsRepository, IAgentExecutionsRepository
+from config.monitory.metrics import metrics
+
+logger = logging.getLogger("ExecutionLogService")
+
+
+def _month_start(day: date, months_ahead: int = 0) -> date:
+    month_index = day.year * 12 + day.month - 1 + months_ahead
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+class ExecutionLogService:
+    """
+    Write-behind log of agent executions. Executions are appended to an in-process buffer, never
+    awaited by the request, and written to Postgres with COPY in batches of batch_size or every
+    flush_interval seconds. When the buffer is full new executions are dropped and counted, and
+    a failed batch is put back in the buffer while there is room for it.
+    """
+
+    def __init__(self, repository: IAgentExecutionsRepository, max_buffer: int, batch_size: int, flush_interval: float):
+        self.repository = repository
+        self.max_buffer = max_buffer
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._buffer: deque[AgentExecutionEntity] = deque()
+        self._wakeup = asyncio.Event()
+        self._stopping = asyncio.Event()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._partitions_until: Optional[date] = None
+        metrics.register_gauge("execution_log", lambda: {"buffered": len(self._buffer)})
+
+    def record(
+        self,
+        agent_id: int,
+        user_id: Optional[str],
+        session_id: Optional[str],
+        llm: int,
+        type_model: str,
+        status: str,
+        latency_seconds: float,
+        total_tokens: int = 0
+    ) -> None:
+        if len(self._buffer) >= self.max_buffer:
+            metrics.increment("execution_log_dropped")
+            return
+        self._buffer.append(AgentExecutionEntity(
+            executed_at=datetime.now(timezone.utc),
+            agent_id=agent_id,
+            user_id=user_id or None,
+            session_id=session_id,
+            llm=llm,
+            type_model=type_model,
+            status=status,
+            latency_ms=int(latency_seconds * 1000),
+            total_tokens=total_tokens
+        ))
+        if len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    async def start(self) -> None:
+        await self._ensure_partitions()
+        self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def close(self, timeout: float = 10) -> None:
+        """
+        Stops the background flush once its current batch is written, then writes what is left in the
+        buffer, both within timeout seconds. Executions still buffered after it are counted as dropped.
+        """
+        expires_at = time.monotonic() + timeout
+        try:
+            if self._flush_task is not None:
+                self._stopping.set()
+                self._wakeup.set()
+                await asyncio.wait_for(self._flush_task, timeout=timeout)
+            await asyncio.wait_for(self.flush(), timeout=max(expires_at - time.monotonic(), 0))
+        except asyncio.TimeoutError:
+            metrics.increment("execution_log_dropped", value=len(self._buffer))
+            logger.warning(f"Execution log shutdown flush timed out, {len(self._buffer)} executions lost.")
+        finally:
+            self._flush_task = None
+
+    async def _ensure_partitions(self) -> None:
+        today = datetime.now(timezone.utc).date()
+        if self._partitions_until is not None and self._partitions_until > today:
+            return
+        try:
+            await self.repository.ensure_partitions([_month_start(today), _month_start(today, 1)])
+            self._partitions_until = _month_start(today, 1)
+        except Exception as e:
+            metrics.increment("execution_log_partition_errors")
+            logger.error(f"Could not create the agent_executions partitions: {e}")
+
+    async def _flush_loop(self) -> None:
+        while not self._stopping.is_set():
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            self._wakeup.clear()
+            if self._stopping.is_set():
+                return
+            await self._ensure_partitions()
+            await self.flush()
+
+    async def flush(self) -> None:
+        while self._buffer:
+            batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+            started_at = time.perf_counter()
+            try:
+                await self.repository.insert_many(batch)
+            except Exception as e:
+                metrics.increment("execution_log_flush_errors")
+                logger.warning(f"Could not write {len(batch)} executions: {e}")
+                self._requeue(batch)
+                return
+            except BaseException:
+                # Cancelled mid-write (shutdown timeout), the batch goes back to be written or counted as lost
+                self._requeue(batch)
+                raise
+            metrics.observe("execution_log_flush_seconds", time.perf_counter() - started_at)
+            metrics.increment("execution_log_written", value=len(batch))
+
+
+    def _requeue(self, batch: list[AgentExecutionEntity]) -> None:
+        requeued = batch[:max(self.max_buffer - len(self._buffer), 0)]
+        self._buffer.extendleft(reversed(requeued))
+        if len(requeued) < len(batch):
+            metrics.increment("execution_log_dropped", value=len(batch) - len(requeued))
+
+
+execution_log = ExecutionLogService(
+    AgentExecutionsRepository(),
+    max_buffer=int(os.getenv("EXECUTION_LOG_MAX_BUFFER", 10000)),
+    batch_size=int(os.getenv("EXECUTION_LOG_BATCH_SIZE", 500)),
+    flush_interval=float(os.getenv("EXECUTION_LOG_FLUSH_INTERVAL", 2)),
+)
@@ -1,11 +1,37 @@
-from datetime import datetime
+import asyncio
+import logging
+import os
+import time
 from repository.agents_repository import IAgentsRepository
-from models.ui.agents.manage_agents import GetAgentByIdResponse, GetAllAgentsResponse, CreateAgentRequest, CreateAgentResponse
-from models.dto.agents.agentLLM import AgentFactoryInput, ModelLLM, AgentExecuteOutput
+from repository.agents_usage_repository import IAgentsUsageRepository
+from repository.tools_repository import IToolsRepository
+from models.ui.agents.manage_agents import GetAgentByIdResponse, GetAllAgentsResponse, CreateAgentRequest, CreateAgentResponse, FallbackModelConfig
+from models.ui.agents.manage_agents import FanoutAgentResult, FanoutPolicy, FanoutStatus
+from models.entity.agent_entity import AgentEntity
+from models.dto.agents.agentLLM import AgentFactoryInput, ModelLLM, AgentExecuteOutput, AgentStreamEvent, FallbackModel, StreamEventType
 import abc
 from config.database.cache_manager import cache_manager
-from core.agets.execute_agent import ExecuteAgent
-from typing import Optional
+from services.execution_log import execution_log
+from core.agets.execute_agent import ExecuteAgent, PreparedRun
+from core.agets.output_schema import OutputValidationError
+from core.agets.factory_agent import FactoryAgent
+from core.agets.deadline import Deadline, DeadlineExceeded, current_deadline, run_stage, start_in_deadline
+from core.agets.guardrails import AgentGuardrails
+from core.tools.tool_registry import tool_registry
+from typing import AsyncIterator, Optional
+
+logger = logging.getLogger("ManagerAgentsService")
+
+AGENTS_LIST_VERSION_KEY = "agents_list_version"
+AGENTS_LIST_VERSION_TTL = float(os.getenv("AGENTS_LIST_VERSION_TTL", 5))
+
+_background_tasks: set[asyncio.Task] = set()
+
+
+def _on_background_task_done(task: asyncio.Task) -> None:
+    _background_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning(f"Background task failed: {task.exception()}")
 
 
 class IManagerAgentsService(abc.ABC):
@@ -15,9 +41,17 @@ class IManagerAgentsService(abc.ABC):
 
 class ManagerAgentsService(IManagerAgentsService):
 
-    def __init__(self, agents_repository: IAgentsRepository):
+    def __init__(
+        self,
+        agents_repository: IAgentsRepository,
+        agents_usage_repository: IAgentsUsageRepository,
+        tools_repository: IToolsRepository
+    ):
         self.agents_repository = agents_repository
+        self.agents_usage_repository = agents_usage_repository
+        self.tools_repository = tools_repository
         self.cache = cache_manager
+        self.execution_log = execution_log
         self.period_to_prune_memory_agent = 86400  # 24 hours
 
     async def get_all_agents(self, name_part: str, skip: int, limit: int):
@@ -28,101 +62,327 @@ class ManagerAgentsService(IManagerAgentsService):
         if (limit is None):
             limit = 100
         agents_resume_entity_list = await self.agents_repository.get_all_agents(name_part, skip, limit)
-        agents_response: list[GetAllAgentsResponse] = list(map(lambda agent_resume_entity: GetAllAgentsResponse(id=agent_resume_entity.id, name=agent_resume_entity.name), agents_resume_entity_list))
+        agents_response: list[GetAllAgentsResponse] = list(map(lambda agent_resume_entity: GetAllAgentsResponse.model_construct(id=agent_resume_entity.id, name=agent_resume_entity.name), agents_resume_entity_list))
         return agents_response
+
+    async def stream_all_agents(self, name_part: Optional[str], skip: int, limit: int) -> AsyncIterator[dict]:
+        """Maps each fetched row straight to its response item, without entity or model in between."""
+        async for row in self.agents_repository.iter_all_agents(name_part or "", skip, limit):
+            yield {"id": row['id'], "name": row['name']}
     
-    async def get_agent_by_id(self, agent_id: int):
-        json_data = await self.cache.get(f"get_agent_by_id:{agent_id}")
-        if json_data:
-            return GetAgentByIdResponse(**json_data)
+    async def get_agents_list_etag(self) -> str:
+        """
+        ETag of the agents listings, from the table change counter. The counter is cached for
+        AGENTS_LIST_VERSION_TTL seconds, so writes made by other processes are seen within that window.
+        """
+        cached = await self.cache.get(AGENTS_LIST_VERSION_KEY)
+        if cached:
+            version = cached["version"]
+        else:
+            version = await self.agents_repository.get_agents_version()
+            await self.cache.set(AGENTS_LIST_VERSION_KEY, {"version": version}, ttl=AGENTS_LIST_VERSION_TTL)
+        return f'"agents-{version}"'
+
+    async def get_agent_definition(self, agent_id: int) -> Optional[dict]:
+        """Cached response data of the agent, with its ETag under "etag"."""
+        agent_data = await self.cache.get(f"get_agent_by_id:{agent_id}")
+        if agent_data and "etag" in agent_data:
+            return agent_data
 
         agent_entity = await self.agents_repository.get_agent_by_id(agent_id)
         if agent_entity is None:
             return None
-        tools_list = []
-        for tool in agent_entity.tools:
-            tools_list.append({
-                "id": tool.id,
-                "name": tool.name,
-                "description": tool.description
-            })
-        agent_response = GetAgentByIdResponse(
-            id=agent_entity.id,
-            name=agent_entity.name,
-            description=agent_entity.description,
-            model=agent_entity.model,
-            tools=tools_list,
-            reasoning=agent_entity.reasoning,
-            type_model=agent_entity.type_model,
-            output_parser=agent_entity.output_parser,
-            instructions=agent_entity.instructions,
-            has_storage=agent_entity.has_storage,
-            knowledge_collection_name=agent_entity.knowledge_collection_name,
-            knowledge_description=agent_entity.knowledge_description,
-            knowledge_top_k=agent_entity.knowledge_top_k
-        )
-        await self.cache.set(f"get_agent_by_id:{agent_id}", agent_response.model_dump(), ttl=300)
-        return agent_response
+        agent_data = self._agent_response_data(agent_entity)
+        await self.cache.set(f"get_agent_by_id:{agent_id}", agent_data, ttl=300)
+        return agent_data
+
+    async def get_agent_by_id(self, agent_id: int):
+        agent_data = await self.get_agent_definition(agent_id)
+        if agent_data is None:
+            return None
+        return self._trusted_agent_response(agent_data)
+
+    async def get_agents_by_ids(self, agent_ids: list[int]) -> dict[int, GetAgentByIdResponse]:
+        """Cache hits are served from the cache, every miss is loaded in a single repository call."""
+        cached = await asyncio.gather(*(self.cache.get(f"get_agent_by_id:{agent_id}") for agent_id in agent_ids))
+        agents = {agent_id: self._trusted_agent_response(data) for agent_id, data in zip(agent_ids, cached) if data}
+        missing = [agent_id for agent_id in agent_ids if agent_id not in agents]
+        if missing:
+            for agent_entity in await self.agents_repository.get_agents_by_ids(missing):
+                agent_data = self._agent_response_data(agent_entity)
+                await self.cache.set(f"get_agent_by_id:{agent_entity.id}", agent_data, ttl=300)
+                agents[agent_entity.id] = self._trusted_agent_response(agent_data)
+        return agents
+
+    @staticmethod
+    def _agent_response_data(agent_entity: AgentEntity) -> dict:
+        """
+        Response fields of an agent read from the database, which only holds validated definitions.
+        The same dict is the cache entry and the source of the response, so it is built only once.
+        The strong ETag derives from the definition version, bumped by the database on every change.
+        """
+        return {
+            "etag": f'"agent-{agent_entity.id}-{agent_entity.version}"',
+            "id": agent_entity.id,
+            "name": agent_entity.name,
+            "description": agent_entity.description,
+            "model": agent_entity.model,
+            "tools": [{"id": tool.id, "name": tool.name, "description": tool.description} for tool in agent_entity.tools],
+            "reasoning": agent_entity.reasoning,
+            "type_model": agent_entity.type_model,
+            "output_parser": agent_entity.output_parser,
+            "instructions": agent_entity.instructions,
+            "has_storage": agent_entity.has_storage,
+            "storage_backend": agent_entity.storage_backend,
+            "knowledge_collection_name": agent_entity.knowledge_collection_name,
+            "knowledge_description": agent_entity.knowledge_description,
+            "knowledge_top_k": agent_entity.knowledge_top_k,
+            "context_token_ceiling": agent_entity.context_token_ceiling,
+            "timeout_seconds": agent_entity.timeout_seconds,
+            "fallback_models": agent_entity.fallback_models,
+        }
+
+    @staticmethod
+    def _trusted_agent_response(data: dict) -> GetAgentByIdResponse:
+        """Cached entries were validated before being stored, so they are rebuilt without validation."""
+        return GetAgentByIdResponse.model_construct(**{
+            **data,
+            "fallback_models": [FallbackModelConfig.model_construct(**fallback) for fallback in data.get("fallback_models", [])]
+        })
 
     async def execute_agent_action(self, agent_id: int, prompt: str, user_id: str, session_id: Optional[str]) -> Optional[AgentExecuteOutput]:
-        agent_factory_input = await self._recover_agent_factory_input(agent_id)
+        agent_factory_input = await run_stage("definition_load", self._recover_agent_factory_input(agent_id))
         if agent_factory_input is None:
             return None
-        prune_memory = await self._check_if_necessary_prune_memory_agent(agent_id, user_id)
-        result = await ExecuteAgent.run_agent(agent_factory_input, prompt, session_id, user_id, prune_memory=prune_memory)
-        return result
+        deadline = current_deadline()
+        if deadline is not None:
+            deadline.apply_agent_timeout(agent_factory_input.timeout_seconds)
+        return await self._run_agent(agent_factory_input, prompt, user_id, session_id)
+
+    async def _run_agent(
+        self,
+        agent: AgentFactoryInput,
+        prompt: str,
+        user_id: str,
+        session_id: Optional[str],
+        check_guardrails: bool = True
+    ) -> AgentExecuteOutput:
+        """Runs the agent and records the execution in the write-behind log, whatever its outcome."""
+        self._record_usage(agent.id)
+        started_at = time.perf_counter()
+        status = "error"
+        output: Optional[AgentExecuteOutput] = None
+        try:
+            prune_memory = await self._check_if_necessary_prune_memory_agent(agent.id, user_id)
+            output = await ExecuteAgent.run_agent(agent, prompt, session_id, user_id, prune_memory=prune_memory, check_guardrails=check_guardrails)
+            status = "success"
+            return output
+        except DeadlineExceeded:
+            status = "timeout"
+            raise
+        except asyncio.CancelledError:
+            status = "cancelled"
+            raise
+        finally:
+            self.execution_log.record(
+                agent_id=agent.id,
+                user_id=user_id,
+                session_id=output.session_id if output else session_id,
+                llm=agent.modelLLM.value,
+                type_model=agent.typeModel,
+                status=status,
+                latency_seconds=time.perf_counter() - started_at,
+                total_tokens=output.total_tokens if output else 0
+            )
     
-    async def _check_if_necessary_prune_memory_agent(self, agent_id: int, user_id: str) -> bool:
-        
-        datetime_last_prune = await self.cache.get(f"agent_memory_prune:{agent_id}:{user_id}")
-        if datetime_last_prune is None:
-            await self.cache.set(f"agent_memory_prune:{agent_id}:{user_id}", datetime.now(), ttl=self.period_to_prune_memory_agent)  # 24 hours
-            return True
-        if (datetime.now() - datetime_last_prune).total_seconds() > self.period_to_prune_memory_agent:  # 24 hours
-            await self.cache.set(f"agent_memory_prune:{agent_id}:{user_id}", datetime.now(), ttl=self.period_to_prune_memory_agent)  # 24 hours
-            return True
-        return False
+    async def stream_agent_action(
+        self,
+        agent_id: int,
+        prompt: str,
+        user_id: str,
+        session_id: Optional[str],
+        deadline: Deadline
+    ) -> Optional[AsyncIterator[AgentStreamEvent]]:
+        """
+        Prepares the execution (definition, guardrails, memory) and returns an iterator streaming its output.
+        Must be awaited inside the deadline scope, the returned iterator can be consumed outside of it.
+        """
+        agent = await run_stage("definition_load", self._recover_agent_factory_input(agent_id))
+        if agent is None:
+            return None
+        deadline.apply_agent_timeout(agent.timeout_seconds)
+        self._record_usage(agent.id)
+        prune_memory = await self._check_if_necessary_prune_memory_agent(agent.id, user_id)
+        run = await ExecuteAgent.prepare_run(agent, prompt, session_id, user_id, prune_memory=prune_memory)
+        return self._stream_run(run, deadline)
 
-    async def _recover_agent_factory_input(self, agent_id: int) -> AgentFactoryInput | None:
-        cached_data = await self.cache.get(f"get_agent_by_id:{agent_id}")
-        if cached_data:
-            return AgentFactoryInput(
-               id=cached_data['id'],
-               name=cached_data['name'],
-               description=cached_data['description'],
-               modelLLM=ModelLLM.get_from_int(cached_data['model']),
-               typeModel=cached_data['type_model'],
-               tools=[tool['id'] for tool in cached_data['tools']],
-               reasoning=cached_data['reasoning'],
-               output_parser=cached_data.get('output_parser'),
-               instructions=cached_data.get('instructions'),
-               has_storage=cached_data.get('has_storage', False),
-               knowledge_collection_name=cached_data.get('knowledge_collection_name'),
-               knowledge_description=cached_data.get('knowledge_description'),
-               knowledge_top_k=cached_data.get('knowledge_top_k', 5)
+    async def _stream_run(self, run: PreparedRun, deadline: Deadline) -> AsyncIterator[AgentStreamEvent]:
+        """Errors after the stream started are sent as a last error event, the execution is logged like _run_agent."""
+        started_at = time.perf_counter()
+        status = "error"
+        total_tokens = 0
+        try:
+            async for event in ExecuteAgent.stream_agent(run, deadline):
+                if event.type == StreamEventType.FINAL:
+                    status = "success"
+                    total_tokens = event.total_tokens or 0
+                yield event
+        except DeadlineExceeded as e:
+            status = "timeout"
+            yield AgentStreamEvent(type=StreamEventType.ERROR, session_id=run.session_id, error=str(e))
+        except OutputValidationError as e:
+            yield AgentStreamEvent(type=StreamEventType.ERROR, session_id=run.session_id, error=str(e))
+        except (asyncio.CancelledError, GeneratorExit):
+            status = "cancelled"
+            raise
+        except Exception as e:
+            logger.warning(f"Streamed execution of agent {run.agent.id} failed: {e}")
+            yield AgentStreamEvent(type=StreamEventType.ERROR, session_id=run.session_id, error="Agent execution failed")
+        finally:
+            self.execution_log.record(
+                agent_id=run.agent.id,
+                user_id=run.user_id,
+                session_id=run.session_id,
+                llm=run.agent.modelLLM.value,
+                type_model=run.agent.typeModel,
+                status=status,
+                latency_seconds=time.perf_counter() - started_at,
+                total_tokens=total_tokens
             )
+    
+    async def _check_if_necessary_prune_memory_agent(self, agent_id: int, user_id: str) -> bool:
+        key = f"agent_memory_prune:{agent_id}:{user_id}"
+        last_prune = await self.cache.get(key)
+        now = time.time()
+        if last_prune and now - last_prune.get("pruned_at", 0) < self.period_to_prune_memory_agent:
+            return False
+        await self.cache.set(key, {"pruned_at": now}, ttl=self.period_to_prune_memory_agent)
+        return True
 
-        agent_entity = await self.agents_repository.get_agent_by_id(agent_id)
-        if agent_entity is None:
+    async def execute_agents_fanout(
+        self,
+        agent_ids: list[int],
+        prompt: str,
+        user_id: str,
+        session_id: Optional[str],
+        policy: FanoutPolicy,
+        deadline: Deadline
+    ) -> AsyncIterator[FanoutAgentResult]:
+        """
+        Loads every definition at once and checks the guardrails a single time, then returns an iterator
+        running the agents concurrently under the shared deadline and yielding results as they finish.
+        Must be awaited inside the deadline scope, the returned iterator can be consumed outside of it.
+        """
+        agents = await run_stage("definition_load", self.get_agents_by_ids(agent_ids))
+        await self._ensure_tools_registered([tool['id'] for agent in agents.values() for tool in agent.tools])
+        agent_inputs = {
+            agent_id: self._to_agent_factory_input(agents[agent_id]) if agent_id in agents else None
+            for agent_id in agent_ids
+        }
+        deadline.apply_agent_timeout(max((agent.timeout_seconds or 0 for agent in agent_inputs.values() if agent), default=0))
+        await run_stage("guardrails", AgentGuardrails.check(prompt))
+        return self._run_fanout(agent_inputs, prompt, user_id, session_id, policy, deadline)
+
+    async def _run_fanout(
+        self,
+        agent_inputs: dict[int, Optional[AgentFactoryInput]],
+        prompt: str,
+        user_id: str,
+        session_id: Optional[str],
+        policy: FanoutPolicy,
+        deadline: Deadline
+    ) -> AsyncIterator[FanoutAgentResult]:
+        tasks = [
+            start_in_deadline(self._execute_fanout_agent(agent_id, agent, prompt, user_id, session_id), deadline)
+            for agent_id, agent in agent_inputs.items()
+        ]
+        pending = set(agent_inputs)
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                result = await next_result
+                pending.discard(result.agent_id)
+                yield result
+                if policy == FanoutPolicy.FIRST_SUCCESS and result.status == FanoutStatus.SUCCESS:
+                    break
+            for agent_id in pending:
+                yield FanoutAgentResult(agent_id=agent_id, status=FanoutStatus.CANCELLED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _execute_fanout_agent(
+        self,
+        agent_id: int,
+        agent: Optional[AgentFactoryInput],
+        prompt: str,
+        user_id: str,
+        session_id: Optional[str]
+    ) -> FanoutAgentResult:
+        if agent is None:
+            return FanoutAgentResult(agent_id=agent_id, status=FanoutStatus.NOT_FOUND, error="Agent not found")
+        started_at = time.perf_counter()
+        try:
+            output = await self._run_agent(agent, prompt, user_id, f"{session_id}:{agent_id}" if session_id else None, check_guardrails=False)
+            return FanoutAgentResult(agent_id=agent_id, status=FanoutStatus.SUCCESS, result=output, elapsed_seconds=time.perf_counter() - started_at)
+        except DeadlineExceeded as e:
+            return FanoutAgentResult(agent_id=agent_id, status=FanoutStatus.TIMEOUT, error=str(e), elapsed_seconds=time.perf_counter() - started_at)
+        except OutputValidationError as e:
+            return FanoutAgentResult(agent_id=agent_id, status=FanoutStatus.ERROR, error=str(e), elapsed_seconds=time.perf_counter() - started_at)
+        except Exception as e:
+            logger.warning(f"Fan-out execution of agent {agent_id} failed: {e}")
+            return FanoutAgentResult(agent_id=agent_id, status=FanoutStatus.ERROR, error="Agent execution failed", elapsed_seconds=time.perf_counter() - started_at)
+
+    async def _recover_agent_factory_input(self, agent_id: int) -> AgentFactoryInput | None:
+        agent_response = await self.get_agent_by_id(agent_id)
+        if agent_response is None:
             return None
-        agent_factory_input = AgentFactoryInput(
-            id=agent_entity.id,
-            modelLLM=ModelLLM.get_from_int(agent_entity.model),
-            typeModel=agent_entity.type_model,
-            name=agent_entity.name,
-            tools=[tool.id for tool in agent_entity.tools],
-            reasoning=agent_entity.reasoning,
-            description=agent_entity.description,
-            output_parser=agent_entity.output_parser,
-            instructions=agent_entity.instructions,
-            has_storage=agent_entity.has_storage,
-            knowledge_collection_name=agent_entity.knowledge_collection_name,
-            knowledge_description=agent_entity.knowledge_description,
-            knowledge_top_k=agent_entity.knowledge_top_k
+        await self._ensure_tools_registered([tool['id'] for tool in agent_response.tools])
+        return self._to_agent_factory_input(agent_response)
+
+    async def _ensure_tools_registered(self, tool_ids: list[int]) -> None:
+        missing_tools = tool_registry.missing(list(set(tool_ids)))
+        if missing_tools:
+            tool_registry.register(await self.tools_repository.get_tools_by_ids(missing_tools))
+
+    @staticmethod
+    def _to_agent_factory_input(agent_response: GetAgentByIdResponse) -> AgentFactoryInput:
+        return AgentFactoryInput(
+            id=agent_response.id,
+            name=agent_response.name,
+            description=agent_response.description,
+            modelLLM=ModelLLM.get_from_int(agent_response.model),
+            typeModel=agent_response.type_model,
+            tools=[tool['id'] for tool in agent_response.tools],
+            reasoning=agent_response.reasoning,
+            output_parser=agent_response.output_parser,
+            instructions=agent_response.instructions,
+            has_storage=agent_response.has_storage,
+            storage_backend=agent_response.storage_backend,
+            knowledge_collection_name=agent_response.knowledge_collection_name,
+            knowledge_description=agent_response.knowledge_description,
+            knowledge_top_k=agent_response.knowledge_top_k,
+            context_token_ceiling=agent_response.context_token_ceiling,
+            timeout_seconds=agent_response.timeout_seconds,
+            fallback_models=[
+                FallbackModel(modelLLM=ModelLLM.get_from_int(fallback.model), typeModel=fallback.type_model)
+                for fallback in agent_response.fallback_models
+            ]
         )
-        await self.cache.set(f"get_agent_by_id:{agent_id}", agent_factory_input.model_dump(), ttl=300)
-        return agent_factory_input
-    
+
+    async def warmup_agent(self, agent_id: int) -> bool:
+        agent_factory_input = await self._recover_agent_factory_input(agent_id)
+        if agent_factory_input is None:
+            return False
+        agent = FactoryAgent.get_or_build_agent(agent_factory_input)
+        FactoryAgent.open_model_connections(agent)
+        return True
+
+    def _record_usage(self, agent_id: int) -> None:
+        task = asyncio.create_task(self.agents_usage_repository.increment_executions(agent_id))
+        _background_tasks.add(task)
+        task.add_done_callback(_on_background_task_done)
+
     async def create_agent(self, request: CreateAgentRequest) -> CreateAgentResponse:
         agent_entity = await self.agents_repository.create_agent(
             name=request.name,
@@ -134,11 +394,16 @@ class ManagerAgentsService(IManagerAgentsService):
             output_parser=request.output_parser,
             instructions=request.instructions,
             has_storage=request.has_storage,
+            storage_backend=request.storage_backend.value,
             knowledge_collection_name=request.knowledge_collection_name,
             knowledge_description=request.knowledge_description,
-            knowledge_top_k=request.knowledge_top_k
+            knowledge_top_k=request.knowledge_top_k,
+            context_token_ceiling=request.context_token_ceiling,
+            timeout_seconds=request.timeout_seconds,
+            fallback_models=[fallback.model_dump() for fallback in request.fallback_models]
         )
-        
+        await self.cache.delete(AGENTS_LIST_VERSION_KEY)
+
         return CreateAgentResponse(
             id=agent_entity.id,
             name=agent_entity.name,
@@ -150,7 +415,11 @@ class ManagerAgentsService(IManagerAgentsService):
             output_parser=agent_entity.output_parser,
             instructions=agent_entity.instructions,
             has_storage=agent_entity.has_storage,
+            storage_backend=agent_entity.storage_backend,
             knowledge_collection_name=agent_entity.knowledge_collection_name,
             knowledge_description=agent_entity.knowledge_description,
-            knowledge_top_k=agent_entity.knowledge_top_k
+            knowledge_top_k=agent_entity.knowledge_top_k,
+            context_token_ceiling=agent_entity.context_token_ceiling,
+            timeout_seconds=agent_entity.timeout_seconds,
+            fallback_models=agent_entity.fallback_models
         )
\ No newline at end of file
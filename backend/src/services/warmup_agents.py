@@ -0,0 +1,43 @@
+import asyncio
+import logging
+import time
+from repository.agents_usage_repository import IAgentsUsageRepository
+from services.manager_agents import ManagerAgentsService
+
+logger = logging.getLogger("WarmupAgentsService")
+
+
+class WarmupAgentsService:
+    """
+    Preloads the most executed agents into the definition cache and the built agent cache
+    so the first requests after a deploy don't pay the Postgres load and the agent build.
+    """
+
+    def __init__(self, manager_agents_service: ManagerAgentsService, agents_usage_repository: IAgentsUsageRepository):
+        self.manager_agents_service = manager_agents_service
+        self.agents_usage_repository = agents_usage_repository
+
+    async def warmup(self, top_n: int, time_budget: float) -> bool:
+        """Returns True when every hot agent was warmed before the time budget expired."""
+        started_at = time.monotonic()
+        try:
+            await asyncio.wait_for(self._warmup_agents(top_n), timeout=time_budget)
+        except asyncio.TimeoutError:
+            logger.warning(f"Agents warm-up exceeded the time budget of {time_budget}s.")
+            return False
+        except Exception as e:
+            logger.exception(f"Agents warm-up failed: {e}")
+            return False
+        logger.info(f"Agents warm-up complete in {time.monotonic() - started_at:.2f}s.")
+        return True
+
+    async def _warmup_agents(self, top_n: int) -> None:
+        agent_ids = await self.agents_usage_repository.get_most_executed_agents(top_n)
+        logger.info(f"Warming up {len(agent_ids)} agents: {agent_ids}")
+        results = await asyncio.gather(
+            *(self.manager_agents_service.warmup_agent(agent_id) for agent_id in agent_ids),
+            return_exceptions=True,
+        )
+        for agent_id, result in zip(agent_ids, results):
+            if isinstance(result, Exception):
+                logger.warning(f"Could not warm up agent {agent_id}: {result}")
@@ -0,0 +1,63 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from agno.db.schemas.memory import UserMemory
+from agno.session import AgentSession
+from core.agets.context_budget import ContextBudgeter
+from core.agets.factory_agent import FactoryAgent
+from models.dto.agents.agentLLM import AgentFactoryInput, ModelLLM, StorageBackend
+
+
+def _storage_agent_input() -> AgentFactoryInput:
+    return AgentFactoryInput(
+        name="budgeted",
+        description="Answers questions",
+        modelLLM=ModelLLM.OPEANAI,
+        typeModel="gpt-4o-mini",
+        tools=None,
+        has_storage=True,
+        storage_backend=StorageBackend.POSTGRES,
+    )
+
+
+class ContextBudgetMemoriesTest(unittest.TestCase):
+
+    def test_storage_agent_has_memory_manager(self):
+        agent = FactoryAgent.build_agent(_storage_agent_input())
+        self.assertIsNotNone(agent.memory_manager)
+
+    def test_run_only_sees_memories_within_the_ceiling(self):
+        agent = FactoryAgent.build_agent(_storage_agent_input())
+        old_memory = UserMemory(memory="old " + "x" * 400, memory_id="old", updated_at=1)
+        recent_memory = UserMemory(memory="recent " + "y" * 400, memory_id="recent", updated_at=2)
+        agent.db.get_session = AsyncMock(return_value=None)
+        agent.db.get_user_memories = AsyncMock(return_value=[old_memory, recent_memory])
+        budgeter = ContextBudgeter()
+
+        async def run():
+            with patch.object(budgeter, "_get_summary", AsyncMock(return_value={})):
+                plan = await budgeter.plan(agent, "session", "user", token_ceiling=150)
+            run_agent = budgeter.apply(agent, plan)
+            # As arun does before building the messages
+            run_agent.initialize_agent()
+            return plan, await run_agent.aget_system_message(AgentSession(session_id="session"), user_id="user")
+
+        plan, system_message = asyncio.run(run())
+        self.assertEqual([memory.memory_id for memory in plan.memories], ["recent"])
+        self.assertIn(recent_memory.memory, system_message.content)
+        self.assertNotIn(old_memory.memory, system_message.content)
+
+    def test_shared_agent_memories_untouched(self):
+        agent = FactoryAgent.build_agent(_storage_agent_input())
+        memory_manager = agent.memory_manager
+        plan_memories = [UserMemory(memory="kept", memory_id="kept")]
+        budgeter = ContextBudgeter()
+        plan = type("Plan", (), {"num_history_runs": 0, "summary": None, "memories": plan_memories})()
+        run_agent = budgeter.apply(agent, plan)
+        self.assertIs(agent.memory_manager, memory_manager)
+        self.assertEqual(asyncio.run(run_agent.memory_manager.aget_user_memories("user")), plan_memories)
+
+
+if __name__ == "__main__":
+    unittest.main()
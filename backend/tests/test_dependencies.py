@@ -0,0 +1,41 @@
+import asyncio
+import ipaddress
+import unittest
+from unittest.mock import patch
+
+from starlette.requests import Request
+from controllers import dependencies
+
+
+def _request(host: str, headers: dict[str, str]) -> Request:
+    return Request({
+        "type": "http",
+        "client": (host, 50000),
+        "headers": [(name.lower().encode(), value.encode()) for name, value in headers.items()],
+    })
+
+
+@patch.object(dependencies, "GATEWAY_IDENTITY_HEADER", "x-authenticated-user")
+@patch.object(dependencies, "GATEWAY_TRUSTED_NETWORKS", [ipaddress.ip_network("10.0.0.0/8")])
+@patch.object(dependencies, "RATE_LIMIT_API_KEYS", {"registered-key"})
+class CallerIdentityTest(unittest.TestCase):
+
+    def test_user_id_header_is_ignored(self):
+        request = _request("203.0.113.7", {"X-User-Id": "someone-else"})
+        self.assertEqual(asyncio.run(dependencies.request_user_id(request, None)), "ip:203.0.113.7")
+        self.assertEqual(asyncio.run(dependencies.rate_limit_subject(request, None)), "ip:203.0.113.7")
+
+    def test_gateway_identity_only_from_trusted_networks(self):
+        headers = {"X-Authenticated-User": "alice"}
+        self.assertEqual(asyncio.run(dependencies.request_user_id(_request("10.1.2.3", headers), None)), "alice")
+        self.assertEqual(asyncio.run(dependencies.rate_limit_subject(_request("10.1.2.3", headers), None)), "id:alice")
+        self.assertEqual(asyncio.run(dependencies.request_user_id(_request("203.0.113.7", headers), None)), "ip:203.0.113.7")
+
+    def test_only_registered_api_keys_identify_the_caller(self):
+        request = _request("203.0.113.7", {})
+        self.assertTrue(asyncio.run(dependencies.request_user_id(request, "registered-key")).startswith("key:"))
+        self.assertEqual(asyncio.run(dependencies.request_user_id(request, "made-up-key")), "ip:203.0.113.7")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,26 @@
+import unittest
+
+from core.agets.factory_agent import FactoryAgent
+from core.agets.session_cache import CachedRedisDb
+from models.dto.agents.agentLLM import AgentFactoryInput, ModelLLM, StorageBackend
+
+
+class FactoryAgentStorageTest(unittest.TestCase):
+
+    def test_redis_storage_agent_gets_cached_redis_db(self):
+        agent = FactoryAgent.build_agent(AgentFactoryInput(
+            name="stateful",
+            description="Remembers the conversation",
+            modelLLM=ModelLLM.OPEANAI,
+            typeModel="gpt-4o-mini",
+            tools=None,
+            has_storage=True,
+            storage_backend=StorageBackend.REDIS,
+        ))
+        self.assertIsInstance(agent.db, CachedRedisDb)
+        self.assertEqual(agent.db.db_prefix, "stateful")
+        self.assertIs(agent.memory_manager.db, agent.db)
+
+
+if __name__ == "__main__":
+    unittest.main()
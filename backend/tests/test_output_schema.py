@@ -0,0 +1,60 @@
+import unittest
+from unittest.mock import patch
+
+from pydantic import BaseModel
+from core.agets import output_schema
+from core.agets.output_schema import OutputSchema, OutputSchemaRegistry, PartialOutput
+
+
+class Answer(BaseModel):
+    text: str
+
+
+class Listing(BaseModel):
+    items: list[int]
+
+
+class OutputSchemaRegistryTest(unittest.TestCase):
+
+    def test_paths_outside_the_allowed_packages_are_never_imported(self):
+        registry = OutputSchemaRegistry()
+        with patch.object(output_schema.importlib, "import_module") as import_module:
+            self.assertIsNone(registry.resolve("os:system"))
+            self.assertIsNotNone(registry.validation_error("antigravity.Model"))
+        import_module.assert_not_called()
+
+    def test_registered_names_resolve(self):
+        registry = OutputSchemaRegistry()
+        registry.register("answer", Answer)
+        self.assertIsNone(registry.validation_error("answer"))
+        self.assertIs(registry.resolve("answer").model, Answer)
+
+    def test_models_in_allowed_packages_resolve(self):
+        registry = OutputSchemaRegistry()
+        with patch.object(output_schema, "OUTPUT_SCHEMA_PACKAGES", ("tests",)):
+            self.assertIsNone(registry.validation_error("tests.test_output_schema:Answer"))
+            self.assertIsNotNone(registry.validation_error("tests.test_output_schema:Missing"))
+
+
+class PartialOutputTest(unittest.TestCase):
+
+    def test_parses_grow_geometrically_with_the_output(self):
+        schema = OutputSchema("listing", Listing)
+        output = PartialOutput(schema, min_bytes=16)
+        chunks = ['{"items": ['] + [f"{number}, " for number in range(5000)] + ["0]}"]
+        with patch.object(schema, "parse_partial", wraps=schema.parse_partial) as parse_partial:
+            partials = [partial for partial in (output.feed(chunk) for chunk in chunks) if partial is not None]
+        self.assertLess(parse_partial.call_count, 50)
+        parsed_bytes = sum(len(call.args[0]) for call in parse_partial.call_args_list)
+        self.assertLess(parsed_bytes, 6 * len(output.text()))
+        self.assertEqual(partials[-1]["items"][:3], [0, 1, 2])
+        self.assertEqual(schema.parse(output.text())[0].items[-1], 0)
+
+    def test_no_parse_without_schema(self):
+        output = PartialOutput(None)
+        self.assertIsNone(output.feed('{"text": "a"}'))
+        self.assertEqual(output.text(), '{"text": "a"}')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+
+from agno.run.base import RunContext
+from core.tools import tool_registry as tool_registry_module
+from core.tools.tool_registry import ToolRegistry
+from models.entity.tools_entity import ToolsEntity
+
+
+class _MemoryCache:
+    def __init__(self):
+        self.entries = {}
+
+    async def get(self, key):
+        return self.entries.get(key)
+
+    async def set(self, key, value, ttl=None):
+        self.entries[key] = value
+
+
+def _cached_tool(name: str) -> ToolsEntity:
+    return ToolsEntity(id=1, name=name, description=name, function_caller=f"tests:{name}", result_ttl_seconds=60, has_side_effects=False)
+
+
+class ToolResultCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = _MemoryCache()
+        patcher = patch.object(tool_registry_module, "cache_manager", self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.calls = 0
+
+    def test_results_of_context_tools_are_kept_per_user(self):
+        def whoami(run_context: RunContext) -> str:
+            self.calls += 1
+            return run_context.user_id
+
+        wrapped = ToolRegistry()._wrap(whoami, _cached_tool("whoami"))
+        alice = RunContext(run_id="1", session_id="s", user_id="alice")
+        bob = RunContext(run_id="2", session_id="s", user_id="bob")
+        self.assertEqual(asyncio.run(wrapped(run_context=alice)), "alice")
+        self.assertEqual(asyncio.run(wrapped(run_context=bob)), "bob")
+        self.assertEqual(asyncio.run(wrapped(run_context=alice)), "alice")
+        self.assertEqual(self.calls, 2)
+
+    def test_tools_reading_state_without_run_context_are_not_cached(self):
+        def counter(session_state: dict) -> int:
+            self.calls += 1
+            return session_state["count"]
+
+        wrapped = ToolRegistry()._wrap(counter, _cached_tool("counter"))
+        self.assertEqual(asyncio.run(wrapped(session_state={"count": 1})), 1)
+        self.assertEqual(asyncio.run(wrapped(session_state={"count": 2})), 2)
+        self.assertEqual(self.cache.entries, {})
+
+    def test_plain_tools_share_results(self):
+        def square(value: int) -> int:
+            self.calls += 1
+            return value * value
+
+        wrapped = ToolRegistry()._wrap(square, _cached_tool("square"))
+        self.assertEqual(asyncio.run(wrapped(value=3)), 9)
+        self.assertEqual(asyncio.run(wrapped(value=3)), 9)
+        self.assertEqual(self.calls, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()